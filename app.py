@@ -1,65 +1,29 @@
+import os
 import dash
 from dash import html, dcc, Input, Output, callback
 import dash_bootstrap_components as dbc
-from layouts.table_component import table_layout
+from layouts.table_component import table_layout, catalogue_rows, catalogue_index, EXPORT_DATASET
 from layouts.process_flow import process_flow_layout
-from layouts.report_generation import report_generation_layout
-from layouts.analytics import analytics_layout
-
-app = dash.Dash(
-    __name__, 
-    external_stylesheets=[dbc.themes.BOOTSTRAP],
-    suppress_callback_exceptions=True
-)
+from layouts.report_generation import report_generation_layout, load_report_data, register_report_routes
+from layouts.analytics import create_analytics_layout, create_impact_pie, create_kpi_trend, store_version, mock_results_path
+from utils.flowsheet_io import register_flowsheet_routes
+from utils.kpi_stream import register_kpi_stream_routes
+from utils.grid_export import register_export_routes
+from utils.profiling import register_profiling_routes
+from utils.callback_memo import memoize_callback
+from utils.preload import preload_shared_data, warm_up, freeze_heap
 
 # Create the tab content components
 tab_process_flow = html.Div(process_flow_layout)
 tab_table = html.Div(table_layout)
 tab_report = html.Div(report_generation_layout)
-tab_analytics = html.Div(analytics_layout)
-
-app.layout = html.Div([
-    dbc.NavbarSimple(
-        brand="Process First LLC",
-        brand_href="#",
-        color="primary",
-        dark=True,
-    ),
-    dbc.Container([
-        html.H1("Process Flow Analytics Dashboard", className="my-4"),
-        html.Div([
-            dcc.Tabs(
-                id='tabs',
-                value='tab-process-flow',
-                children=[
-                    dcc.Tab(
-                        label='Process Flow',
-                        value='tab-process-flow'
-                    ),
-                    dcc.Tab(
-                        label='Chemical Components',
-                        value='tab-table'
-                    ),
-                    dcc.Tab(
-                        label='Report Generation',
-                        value='tab-report'
-                    ),
-                    dcc.Tab(
-                        label='Analytics',
-                        value='tab-analytics'
-                    ),
-                ],
-                className="mb-4"
-            ),
-            html.Div(id='tab-content')
-        ])
-    ], fluid=True)
-])
+TAB_VALUES = ('tab-process-flow', 'tab-table', 'tab-report', 'tab-analytics')
 
 @callback(
     Output('tab-content', 'children'),
     Input('tabs', 'value')
 )
+@memoize_callback(version=store_version, by_trigger=False)
 def render_content(tab):
     if tab == 'tab-process-flow':
         return tab_process_flow
@@ -68,8 +32,75 @@ def render_content(tab):
     elif tab == 'tab-report':
         return tab_report
     elif tab == 'tab-analytics':
-        return tab_analytics
+        return html.Div(create_analytics_layout())
     return tab_process_flow  # Default tab
 
+def create_app(preload=False):
+    """
+    Dash app with its routes registered. With preload, the shared read-only data
+    is loaded, layouts and figures are built and the heap is frozen, so a
+    pre-forking server (gunicorn --preload) shares them with every worker.
+    """
+    app = dash.Dash(
+        __name__, 
+        external_stylesheets=[dbc.themes.BOOTSTRAP],
+        suppress_callback_exceptions=True
+    )
+    register_flowsheet_routes(app.server)
+    register_kpi_stream_routes(app.server)
+    register_export_routes(app.server, {EXPORT_DATASET: catalogue_rows})
+    register_report_routes(app.server)
+    register_profiling_routes(app.server)
+
+    app.layout = html.Div([
+        dbc.NavbarSimple(
+            brand="Process First LLC",
+            brand_href="#",
+            color="primary",
+            dark=True,
+        ),
+        dbc.Container([
+            html.H1("Process Flow Analytics Dashboard", className="my-4"),
+            html.Div([
+                dcc.Tabs(
+                    id='tabs',
+                    value='tab-process-flow',
+                    children=[
+                        dcc.Tab(
+                            label='Process Flow',
+                            value='tab-process-flow'
+                        ),
+                        dcc.Tab(
+                            label='Chemical Components',
+                            value='tab-table'
+                        ),
+                        dcc.Tab(
+                            label='Report Generation',
+                            value='tab-report'
+                        ),
+                        dcc.Tab(
+                            label='Analytics',
+                            value='tab-analytics'
+                        ),
+                    ],
+                    className="mb-4"
+                ),
+                html.Div(id='tab-content')
+            ])
+        ], fluid=True)
+    ])
+
+    if preload:
+        timings = preload_shared_data(catalogue_index, mock_results_path)
+        builders = {tab: (lambda tab=tab: render_content(tab)) for tab in TAB_VALUES}
+        builders.update(impact_pie=create_impact_pie, kpi_trend=create_kpi_trend, report_data=load_report_data)
+        timings.update(warm_up(builders))
+        app.server.config['PRELOAD_TIMINGS'] = timings
+        freeze_heap()
+    return app
+
+app = create_app(preload=os.getenv('PRELOAD_DATA', '0') == '1')
+server = app.server
+
 if __name__ == '__main__':
     app.run_server(debug=True, port=8050)
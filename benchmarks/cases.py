@@ -0,0 +1,165 @@
+import os
+import uuid
+
+import pandas as pd
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+
+import layouts.report_generation as report_generation
+from layouts.analytics import create_kpi_trend, mock_results_path
+from layouts.process_flow import get_next_id, update_graph
+from utils.composition import CompositionIndex
+from utils.flowsheet_diff import FlowsheetRevision, diff_revisions
+from utils.preload import compact_frame
+from utils.results_store import get_results_store
+
+from benchmarks.synthetic import make_flowsheet, make_results, write_catalogue
+
+CATALOGUE_QUERY = "C between 10 and 20 and contains O and not N and mw < 400 and hazard = Flammable"
+
+
+class Case:
+    """
+    A benchmarked path: setup(size, workdir) prepares the inputs outside the timing
+    and returns the function that is timed. sizes run by default, quick_sizes with
+    --quick and full_sizes are added by --full.
+    """
+
+    def __init__(self, name, setup, sizes, quick_sizes=None, full_sizes=()):
+        self.name = name
+        self.setup = setup
+        self.sizes = tuple(sizes)
+        self.quick_sizes = tuple(quick_sizes or sizes[:2])
+        self.full_sizes = self.sizes + tuple(full_sizes)
+
+
+CASES = []
+
+
+def case(name, sizes, quick_sizes=None, full_sizes=()):
+    def decorator(setup):
+        CASES.append(Case(name, setup, sizes, quick_sizes, full_sizes))
+        return setup
+    return decorator
+
+
+def trigger(prop_id=None):
+    """Callback context as Dash sets it when prop_id fires (None for the initial call)"""
+    context_value.set(AttributeDict(
+        triggered_inputs=[{"prop_id": prop_id, "value": 1}] if prop_id else [],
+        inputs_list=[], states_list=[], outputs_list=[],
+    ))
+
+
+def call_update_graph(nodes, edges, token, prop_id=None, transaction=None):
+    trigger(prop_id)
+    return update_graph(None, None, None, None, None, None, transaction, nodes, edges,
+                        None, None, {"token": token}, None, "none", None, 1.0)
+
+
+class FakeLLM:
+    """Stands in for cohere.Client: returns a fixed analysis without a network call"""
+
+    def __init__(self, api_key=None):
+        pass
+
+    def generate(self, prompt, max_tokens, **kwargs):
+        text = "1. KEY VARIABLE ANALYSIS\n" + "   • Synthetic insight line\n" * (max_tokens // 20)
+        return AttributeDict(generations=[AttributeDict(text=text)])
+
+
+def _results_store(size):
+    # The app's store, holding the baseline plus exactly size synthetic rows
+    store = get_results_store(mock_results_path)
+    store.clear()
+    equipment, names, X, kpi, scenarios = make_results(size)
+    store.append(equipment, names, X, kpi, scenarios=scenarios)
+    return store
+
+
+# Process flow editor
+@case("update_graph_initial", sizes=(100, 1000, 10000, 100000))
+def setup_update_graph_initial(size, workdir):
+    nodes, edges = make_flowsheet(size)
+    # A fresh topology token each call, so the topology is built from the rows
+    return lambda: call_update_graph(nodes, edges, uuid.uuid4().hex)
+
+
+@case("update_graph_add_node", sizes=(100, 1000, 10000, 100000))
+def setup_update_graph_add_node(size, workdir):
+    nodes, edges = make_flowsheet(size)
+    token = uuid.uuid4().hex
+    call_update_graph(nodes, edges, token)
+    added = iter(range(10 ** 9))
+
+    def run():
+        node_id = f"X{next(added)}"
+        transaction = {"add": {"nodes": [{"id": node_id, "name": f"Unit {node_id}", "type": "type1"}]}}
+        call_update_graph(nodes, edges, token, "graph-transaction.data", transaction)
+    return run
+
+
+@case("get_next_id", sizes=(100, 1000, 10000, 100000))
+def setup_get_next_id(size, workdir):
+    nodes, _ = make_flowsheet(size, extra_edges=0)
+    existing = [{"data": {"id": node["id"]}} for node in nodes]
+    return lambda: get_next_id(existing)
+
+
+@case("flowsheet_diff", sizes=(1000, 10000, 100000))
+def setup_flowsheet_diff(size, workdir):
+    nodes, edges = make_flowsheet(size)
+    base = FlowsheetRevision(nodes, edges)
+    # The current flowsheet: one unit renamed, one added and one stream removed
+    edited = [dict(node) for node in nodes] + [{"id": "X0", "name": "Unit X0", "type": "type1"}]
+    edited[size // 2]["name"] = "Renamed"
+    # Hashed from the grid rows and compared, as the Compare button does
+    return lambda: diff_revisions(base, FlowsheetRevision(edited, edges[1:]))
+
+
+# Chemical catalogue
+def _catalogue(size, workdir):
+    path = os.path.join(workdir, f"catalogue_{size}.csv")
+    if not os.path.exists(path):
+        write_catalogue(path, size)
+    return path
+
+
+@case("catalogue_load", sizes=(1000, 10000, 100000, 1000000), full_sizes=(10000000,))
+def setup_catalogue_load(size, workdir):
+    path = _catalogue(size, workdir)
+    return lambda: CompositionIndex.from_frame(compact_frame(pd.read_csv(path)))
+
+
+@case("catalogue_query", sizes=(1000, 10000, 100000, 1000000), full_sizes=(10000000,))
+def setup_catalogue_query(size, workdir):
+    index = CompositionIndex.from_frame(compact_frame(pd.read_csv(_catalogue(size, workdir))))
+
+    def run():
+        # Cold: every predicate mask is recomputed
+        index.clear_masks()
+        return index.select(CATALOGUE_QUERY, limit=10000)
+    return run
+
+
+# Results
+@case("create_kpi_trend", sizes=(1000, 10000, 100000, 1000000))
+def setup_create_kpi_trend(size, workdir):
+    _results_store(size)
+    # The undecorated builder, so the memo cache does not answer repeats
+    return lambda: create_kpi_trend.__wrapped__()
+
+
+@case("render_pdf_report", sizes=(100, 1000, 10000, 100000))
+def setup_render_pdf_report(size, workdir):
+    # With a key set the insights are generated through the fake client, and the
+    # cache is bypassed so every run times the generation rather than a cache hit
+    report_generation.cohere.Client = FakeLLM
+    report_generation.COHERE_API_KEY = "benchmark"
+    report_generation.generate_insights = getattr(report_generation.generate_insights, "__wrapped__",
+                                                  report_generation.generate_insights)
+    store = _results_store(size)
+    data = report_generation.load_report_data()
+    # The report streams to a file, as the download route renders it
+    path = os.path.join(workdir, f"report_{size}.pdf")
+    return lambda: report_generation.render_pdf_report(data, path, True, store.iter_records(), len(store))
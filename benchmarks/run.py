@@ -0,0 +1,127 @@
+"""
+Benchmarks of the hot paths over synthetic inputs of growing size.
+
+Each case is timed (best and median of several runs) and its peak traced memory
+recorded in a separate run. Results are compared with a JSON baseline and the
+run fails when a case is slower or larger than the baseline by more than the
+threshold. Baselines are machine-specific: save one with --save on the
+machine that runs the comparison.
+
+    python -m benchmarks.run                  # compare with benchmarks/baseline.json
+    python -m benchmarks.run --save           # record a new baseline
+    python -m benchmarks.run --quick --only catalogue_query,get_next_id
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+# Runs per case, stopping early once a case has used this much time
+MAX_REPEATS = 5
+MIN_TOTAL_SECONDS = 1.0
+# Differences below these are noise, whatever the ratio
+MIN_DELTA_SECONDS = 0.002
+MIN_DELTA_MB = 1.0
+
+
+def measure(run):
+    """Best and median seconds over up to MAX_REPEATS runs, then the peak traced memory of one more"""
+    times = []
+    while len(times) < MAX_REPEATS and (not times or sum(times) < MIN_TOTAL_SECONDS):
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "median_seconds": statistics.median(times),
+            "repeats": len(times), "peak_mb": peak / 1024 / 1024}
+
+
+def compare(results, baseline, threshold):
+    """(key, metric, baseline value, new value) for every regression beyond threshold"""
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        for metric, min_delta in (("seconds", MIN_DELTA_SECONDS), ("peak_mb", MIN_DELTA_MB)):
+            old, new = reference[metric], result[metric]
+            if new > old * (1 + threshold) and new - old > min_delta:
+                regressions.append((key, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sizes = parser.add_mutually_exclusive_group()
+    sizes.add_argument("--quick", action="store_true", help="only the two smallest sizes of each case")
+    sizes.add_argument("--full", action="store_true", help="add the largest sizes (10^7-row catalogues)")
+    parser.add_argument("--only", help="comma-separated case names")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown or memory growth as a fraction (default 0.25)")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="process_first_bench_")
+    # Keep the shared cache and appended results away from the app's own
+    os.environ["CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["RESULTS_DIR"] = os.path.join(workdir, "results")
+    from benchmarks.cases import CASES
+
+    only = set(args.only.split(",")) if args.only else None
+    results = {}
+    print(f"{'case':<36} {'best s':>10} {'median s':>10} {'runs':>5} {'peak MB':>10}")
+    for case in CASES:
+        if only and case.name not in only:
+            continue
+        case_sizes = case.quick_sizes if args.quick else case.full_sizes if args.full else case.sizes
+        for size in case_sizes:
+            key = f"{case.name}[{size}]"
+            result = measure(case.setup(size, workdir))
+            results[key] = dict(result, case=case.name, size=size)
+            print(f"{key:<36} {result['seconds']:>10.4f} {result['median_seconds']:>10.4f} "
+                  f"{result['repeats']:>5} {result['peak_mb']:>10.1f}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved {len(results)} results to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save to record one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for key, metric, old, new in regressions:
+        print(f"REGRESSION {key} {metric}: {old:.4g} -> {new:.4g} ({(new / old - 1) * 100:+.0f}%)")
+    if regressions:
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import csv
+import string
+
+import numpy as np
+
+# Unit ids the editor hands out (A..Z, AA..ZZ) before synthetic ones take over
+LETTER_IDS = list(string.ascii_uppercase) + [a + b for a in string.ascii_uppercase for b in string.ascii_uppercase]
+UNIT_TYPES = ("type1", "type2", "type3")
+HAZARDS = ("Flammable", "Non-Hazardous", "Toxic", "Corrosive")
+CATALOGUE_ELEMENTS = ("C", "H", "O", "N", "S", "Cl")
+ATOMIC_WEIGHTS = {"C": 12.011, "H": 1.008, "O": 15.999, "N": 14.007, "S": 32.06, "Cl": 35.45}
+CSV_BATCH_ROWS = 100000
+
+
+def unit_id(i):
+    return LETTER_IDS[i] if i < len(LETTER_IDS) else f"N{i}"
+
+
+def make_flowsheet(n_nodes, extra_edges=0.5, seed=0):
+    """
+    Acyclic flowsheet in node-table/edge-table row format: every unit is fed by
+    a random earlier unit, plus extra_edges * n_nodes further forward streams.
+    """
+    rng = np.random.default_rng(seed)
+    nodes = [{"id": unit_id(i), "name": f"Unit {unit_id(i)}", "type": UNIT_TYPES[i % len(UNIT_TYPES)]}
+             for i in range(n_nodes)]
+    targets = np.arange(1, n_nodes)
+    sources = (rng.random(n_nodes - 1) * targets).astype(int)
+    n_extra = int(extra_edges * n_nodes) if n_nodes > 2 else 0
+    extra_targets = rng.integers(2, n_nodes, n_extra) if n_extra else np.empty(0, dtype=int)
+    extra_sources = (rng.random(n_extra) * extra_targets).astype(int)
+    edges = []
+    seen = set()
+    for source, target in zip(np.concatenate([sources, extra_sources]).tolist(),
+                              np.concatenate([targets, extra_targets]).tolist()):
+        edge_id = f"{unit_id(source)}-{unit_id(target)}"
+        if edge_id not in seen:
+            seen.add(edge_id)
+            edges.append({"id": edge_id, "source": unit_id(source), "target": unit_id(target)})
+    return nodes, edges
+
+
+def write_catalogue(path, n_rows, seed=0):
+    """Catalogue CSV in the chemical_components.csv format, written in batches"""
+    rng = np.random.default_rng(seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "formula", "molecular_weight", "hazard"])
+        for start in range(0, n_rows, CSV_BATCH_ROWS):
+            count = min(CSV_BATCH_ROWS, n_rows - start)
+            counts = {"C": rng.integers(1, 60, count), "H": rng.integers(1, 120, count),
+                      "O": rng.integers(0, 5, count), "N": rng.integers(0, 3, count),
+                      "S": rng.integers(0, 2, count) * rng.integers(0, 2, count),
+                      "Cl": rng.integers(0, 3, count) * (rng.random(count) < 0.1)}
+            weights = sum(counts[element] * ATOMIC_WEIGHTS[element] for element in CATALOGUE_ELEMENTS)
+            hazards = rng.integers(0, len(HAZARDS), count)
+            formulas = [
+                "".join(f"{element}{n if n > 1 else ''}" for element, n in zip(CATALOGUE_ELEMENTS, row) if n)
+                for row in np.column_stack([counts[element] for element in CATALOGUE_ELEMENTS]).tolist()
+            ]
+            writer.writerows(
+                (start + i + 1, f"Chemical {start + i + 1}", formula, round(weight, 2), HAZARDS[hazard])
+                for i, (formula, weight, hazard) in enumerate(zip(formulas, weights.tolist(), hazards.tolist()))
+            )
+
+
+def make_results(n_rows, n_variables=3, units=("Reactor A", "Separator B", "Heat Exchanger C"), seed=0):
+    """(equipment, names, X, kpi, scenarios) for ResultsStore.append: one row per unit and scenario"""
+    rng = np.random.default_rng(seed)
+    names = ["Temperature", "Pressure", "Flow Rate", "Concentration", "Residence Time"][:n_variables]
+    equipment = np.resize(np.array(units), n_rows)
+    X = rng.normal(size=(n_rows, len(names))) * 10 + 50
+    kpi = X @ rng.normal(size=len(names)) + rng.normal(size=n_rows)
+    scenarios = np.arange(n_rows) // len(units)
+    return equipment, names, X, kpi, scenarios
@@ -0,0 +1,158 @@
+"""
+Startup time and per-worker memory of the preforked production server.
+
+Each mode imports the app in a fresh master process (with PRELOAD_DATA on or
+off), forks workers the way gunicorn --preload does, has every worker serve the
+same requests and reads their RSS, PSS and shared memory from /proc while all
+of them are alive. Linux only.
+
+    python benchmarks/wsgi_startup.py --workers 4 [--output startup.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import traceback
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ("lazy", "preload")
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def read_memory(pid):
+    """Memory figures (MB) of a process from /proc/<pid>/smaps_rollup"""
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in SMAPS_FIELDS:
+                memory[name.lower()] = int(value.split()[0]) / 1024
+    return memory
+
+
+def serve_requests():
+    """The requests every worker handles before it is measured"""
+    import app
+    from layouts.table_component import run_composition_query
+    from layouts.report_generation import update_report_content
+
+    client = app.server.test_client()
+    client.get("/")
+    client.get("/_dash-layout")
+    for tab in app.TAB_VALUES:
+        app.render_content(tab)
+    run_composition_query("C between 10 and 20 and contains O")
+    update_report_content(1, "7", "all", "full", ["temperature", "pressure"], None, None)
+
+
+def run_worker(ready_write, release_read):
+    """
+    Child side of one worker: serve the requests, send the timings (or the error)
+    to the master and wait to be measured; returns the exit status
+    """
+    try:
+        started = time.perf_counter()
+        serve_requests()
+        report = {"first_requests_s": time.perf_counter() - started}
+    except BaseException:
+        report = {"error": traceback.format_exc()}
+    with os.fdopen(ready_write, "wb") as f:
+        f.write(json.dumps(report).encode())
+    if "error" in report:
+        return 1
+    # Stay alive until every sibling has been measured
+    os.read(release_read, 1)
+    return 0
+
+
+def run_mode(mode, workers):
+    """Master side of one mode: import, fork, measure; returns the results dict"""
+    os.environ["PRELOAD_DATA"] = "1" if mode == "preload" else "0"
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import app
+    startup = time.perf_counter() - started
+    master = read_memory(os.getpid())
+
+    children = []
+    for _ in range(workers):
+        ready_read, ready_write = os.pipe()
+        release_read, release_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # The child never returns into the master's code, whatever happens
+            status = 1
+            try:
+                os.close(ready_read)
+                os.close(release_write)
+                status = run_worker(ready_write, release_read)
+            finally:
+                os._exit(status)
+        os.close(ready_write)
+        os.close(release_read)
+        children.append((pid, ready_read, release_write))
+
+    results = []
+    for pid, ready_read, _ in children:
+        with os.fdopen(ready_read, "rb") as f:
+            output = f.read()
+        report = json.loads(output) if output else {"error": "the worker exited without a report"}
+        results.append((pid, report))
+    errors = [report["error"] for _, report in results if "error" in report]
+    per_worker = [] if errors else [dict(report, **read_memory(pid)) for pid, report in results]
+    for (pid, _, release_write), (_, report) in zip(children, results):
+        if "error" not in report:
+            os.write(release_write, b"x")
+        os.close(release_write)
+        os.waitpid(pid, 0)
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {workers} workers failed:\n{errors[0]}")
+
+    return {
+        "mode": mode,
+        "startup_s": startup,
+        "preload_timings_s": app.server.config.get("PRELOAD_TIMINGS", {}),
+        "master": master,
+        "workers": per_worker,
+        "total_pss_mb": master["pss"] + sum(worker["pss"] for worker in per_worker),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.workers)))
+        return
+
+    # Every mode gets a fresh interpreter, so imports and caches start cold
+    runs = []
+    for mode in MODES:
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--mode", mode,
+                                    "--workers", str(args.workers)],
+                                   capture_output=True, text=True, cwd=ROOT)
+        if completed.returncode:
+            sys.exit(f"{mode} run failed:\n{completed.stderr}")
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print(f"{'mode':<8} {'startup s':>10} {'first req s':>12} {'worker RSS MB':>14} "
+          f"{'worker PSS MB':>14} {'shared MB':>10} {'total PSS MB':>13}")
+    for run in runs:
+        workers = run["workers"]
+        mean = lambda key: sum(worker[key] for worker in workers) / len(workers)
+        print(f"{run['mode']:<8} {run['startup_s']:>10.2f} {mean('first_requests_s'):>12.3f} "
+              f"{mean('rss'):>14.1f} {mean('pss'):>14.1f} "
+              f"{mean('shared_clean') + mean('shared_dirty'):>10.1f} {run['total_pss_mb']:>13.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(runs, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
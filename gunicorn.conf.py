@@ -0,0 +1,29 @@
+import multiprocessing
+import os
+
+# Production server: gunicorn -c gunicorn.conf.py
+# The app is imported once in the master (preload_app) with PRELOAD_DATA set, so
+# the catalogue, results and prebuilt layouts are loaded and the heap frozen
+# before the workers fork and share those pages copy-on-write.
+os.environ.setdefault("PRELOAD_DATA", "1")
+
+wsgi_app = "app:server"
+preload_app = True
+bind = os.getenv("BIND", "0.0.0.0:8050")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 1))
+# PDF downloads render inside the request, waiting on the LLM for up to ~30 seconds;
+# keep this above the slowest report or the worker is killed mid-download
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+
+
+def when_ready(server):
+    from app import server as flask_server
+    timings = flask_server.config.get("PRELOAD_TIMINGS", {})
+    server.log.info("Preloaded before fork: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+
+
+def post_fork(server, worker):
+    # Threads do not survive the fork, so each worker starts its own CPU profile sampler
+    from utils.profiling import start_sampler
+    start_sampler()
@@ -1,19 +1,46 @@
-from dash import html, dcc
+from dash import html, dcc, callback, callback_context, Input, Output, State, no_update
 import dash_bootstrap_components as dbc
 import plotly.express as px
 import plotly.graph_objects as go
 import json
 import pandas as pd
 import os
+from utils.shared_cache import get_cache, file_version
+from utils.impact_analysis import derive_impact, analyze_arrays
+from utils.results_store import get_results_store
+from utils.kpi_stream import get_kpi_stream, ALL_SERIES, ROLLING_WINDOW
+from utils.callback_memo import memoize_callback
+
+cache = get_cache()
 
 # Load mock results using absolute path
 mock_results_path = os.path.join(os.path.dirname(__file__), '..', 'mock_results.json')
-with open(mock_results_path, 'r') as f:
-    mock_data = json.load(f)
 
-# Create sample visualizations
+def results_version():
+    return file_version(mock_results_path)
+
+@cache.cached('results', version=results_version)
+def load_mock_data():
+    with open(mock_results_path, 'r') as f:
+        return json.load(f)
+
+mock_data = load_mock_data()
+
+# How often the live KPI trend polls for new results (ms)
+KPI_STREAM_INTERVAL = 2000
+
+def store_version():
+    # Changes whenever a scenario sweep appends results in any worker
+    return get_results_store(mock_results_path).token()
+
+# Create sample visualizations (built once per results version and shared by all workers)
+@memoize_callback(version=store_version, by_trigger=False)
+@cache.cached('figures', version=store_version)
 def create_impact_pie():
-    data = mock_data['top_impact']
+    # Derived from the stored scenarios when there are enough of them, else the stored summary
+    names, X, y, _, _, _ = get_results_store(mock_results_path).arrays()
+    analysis = analyze_arrays(names, X, y)
+    data = (analysis or derive_impact(mock_data))['top_impact']
     fig = px.pie(
         values=list(data.values()),
         names=list(data.keys()),
@@ -21,33 +48,92 @@ def create_impact_pie():
     )
     return fig
 
-def create_kpi_trend():
-    data = mock_data['simulated_summary']['simulated_data']
-    df = pd.DataFrame(data)
-    fig = px.line(
-        df, 
-        x='scenario', 
-        y='kpi_value',
-        title="KPI Trend Across Scenarios"
+def kpi_stream():
+    return get_kpi_stream(get_results_store(mock_results_path))
+
+# The stream is fed only by the store, so its buffers change with the store version
+@memoize_callback(version=store_version, by_trigger=False)
+def create_kpi_trend(series=ALL_SERIES):
+    """Trend figure and stream cursor, built from the series' ring buffer"""
+    rows, cursor, _ = kpi_stream().poll(series)
+    fig = go.Figure([
+        go.Scatter(x=rows[:, 0], y=rows[:, 1], mode='lines', name='KPI'),
+        go.Scatter(x=rows[:, 0], y=rows[:, 2], mode='lines', name=f'Rolling mean ({ROLLING_WINDOW})')
+    ])
+    fig.update_layout(
+        title="KPI Trend Across Scenarios",
+        xaxis_title='scenario',
+        yaxis_title='kpi_value'
     )
-    return fig
+    return fig, cursor
 
-analytics_layout = html.Div([
-    html.H2("Analytics Dashboard", className="mb-4"),
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    dcc.Graph(figure=create_impact_pie())
+def describe_stream(stats):
+    if not stats['count']:
+        return "No scenario results yet."
+    return (f"{stats['count']} scenarios - mean {stats['mean']:.2f}, std {stats['std']:.2f}, "
+            f"min {stats['min']:.2f}, max {stats['max']:.2f}")
+
+# Built on each tab render so new scenario results show up
+def create_analytics_layout():
+    trend, cursor = create_kpi_trend()
+    stats = kpi_stream().poll(ALL_SERIES, cursor)[2]
+    return html.Div([
+        html.H2("Analytics Dashboard", className="mb-4"),
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        dcc.Graph(figure=create_impact_pie())
+                    ])
                 ])
-            ])
-        ], width=6),
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    dcc.Graph(figure=create_kpi_trend())
+            ], width=6),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        dcc.Dropdown(
+                            id='kpi-series',
+                            options=kpi_stream().series_names(),
+                            value=ALL_SERIES,
+                            clearable=False
+                        ),
+                        dcc.Graph(id='kpi-trend', figure=trend),
+                        html.Div(describe_stream(stats), id='kpi-stream-stats', className="small text-muted")
+                    ])
                 ])
-            ])
-        ], width=6)
+            ], width=6)
+        ]),
+        # Live results: each tick ships only the points after the cursor (chunk and scenario of the last point)
+        dcc.Interval(id='kpi-stream-interval', interval=KPI_STREAM_INTERVAL),
+        dcc.Store(id='kpi-stream-cursor', data={"series": ALL_SERIES, "cursor": cursor})
     ])
-])
+
+analytics_layout = create_analytics_layout()
+
+@callback(
+    [Output('kpi-trend', 'extendData'),
+     Output('kpi-trend', 'figure'),
+     Output('kpi-stream-cursor', 'data'),
+     Output('kpi-stream-stats', 'children'),
+     Output('kpi-series', 'options')],
+    [Input('kpi-stream-interval', 'n_intervals'),
+     Input('kpi-series', 'value')],
+    [State('kpi-stream-cursor', 'data'),
+     State('kpi-series', 'options')],
+    prevent_initial_call=True
+)
+def stream_kpi_trend(n_intervals, series, cursor, options):
+    stream = kpi_stream()
+    names = stream.series_names()
+    options = names if len(names) != len(options or []) else no_update
+    trigger_id = callback_context.triggered[0]['prop_id'].split('.')[0] if callback_context.triggered else None
+    if trigger_id == 'kpi-series' or (cursor or {}).get('series') != series:
+        # A different series needs its whole buffer; polls only send the new points
+        fig, position = create_kpi_trend(series)
+        stats = stream.poll(series, position)[2]
+        return no_update, fig, {"series": series, "cursor": position}, describe_stream(stats), options
+    rows, position, stats = stream.poll(series, cursor.get('cursor'))
+    if not len(rows):
+        return no_update, no_update, no_update, no_update, options
+    x = rows[:, 0].tolist()
+    extend = [{"x": [x, x], "y": [rows[:, 1].tolist(), rows[:, 2].tolist()]}, [0, 1], stream.capacity(series)]
+    return extend, no_update, {"series": series, "cursor": position}, describe_stream(stats), options
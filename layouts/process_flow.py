@@ -1,8 +1,25 @@
-from dash import html, dcc, Input, Output, State, callback_context, ALL, callback, exceptions
+from dash import html, dcc, Input, Output, State, callback_context, ALL, callback, exceptions, no_update
 import dash_bootstrap_components as dbc
 import dash_cytoscape as cyto
 import dash_ag_grid as dag
+import os
 import string
+import uuid
+from datetime import datetime
+from utils.topology import get_topology, drop_topology
+from utils.flowsheet_io import import_flowsheet, save_snapshot
+from utils.graph_transactions import apply_transaction
+from utils.flowsheet_diff import (
+    FlowsheetRevision, diff_revisions, diff_counts, overlay_elements, save_revision, get_revision, list_revisions
+)
+from utils.scenario_sweep import run_sweep, DEFAULT_SETPOINTS, MAX_SCENARIOS
+from utils.results_store import get_results_store
+from utils.level_of_detail import (
+    CANVAS_WIDTH, CANVAS_HEIGHT, assign_groups, build_lod_elements, layer_ranks, viewport_pan
+)
+
+# Results file the sweep store is seeded from (shared with the Analytics and Report tabs)
+results_path = os.path.join(os.path.dirname(__file__), '..', 'mock_results.json')
 
 # Load and register the dagre layout
 cyto.load_extra_layouts()
@@ -31,6 +48,73 @@ def get_next_id(existing_nodes):
                 return id_str
     return None
 
+def iter_cell_changes(changes):
+    """Yield (row_id, field, new_value, old_value) for each edited cell"""
+    if not changes:
+        return
+    if isinstance(changes, dict):
+        changes = [changes]
+    for change in changes:
+        field = change["colId"]
+        row_id = change["oldValue"] if field == "id" else change["data"]["id"]
+        yield row_id, field, change["newValue"], change["oldValue"]
+
+def create_elements(node_rows, edge_rows):
+    """Build Cytoscape elements from the node and edge tables"""
+    elements = [{"data": {"id": row["id"], "name": row["name"], "type": row["type"]}} for row in node_rows]
+    for row in edge_rows:
+        element = {"data": {"id": row["id"], "source": row["source"], "target": row["target"]}}
+        if row.get("status"):
+            element["classes"] = "invalid"
+        elements.append(element)
+    return elements
+
+def session_topology(token_data, node_rows, edge_rows):
+    """(token, topology) for the topology-token store, rebuilt if its signature no longer matches"""
+    token_data = token_data or {}
+    token = token_data.get("token") or uuid.uuid4().hex
+    return token, get_topology(token, node_rows, edge_rows, token_data.get("signature"))
+
+def topology_store(token, topology):
+    return {"token": token, "signature": topology.signature}
+
+_rank_cache = {}
+# Community detection is the slow grouping; its result only changes with the graph structure
+_community_cache = {}
+
+def render_canvas(node_rows, edge_rows, topology, topology_token, grouping, lod_state, zoom):
+    """Return (elements, center, info) for the canvas, grouped when level of detail is on"""
+    if not grouping or grouping == 'none':
+        return create_elements(node_rows, edge_rows), None, None
+    # Layer ranks only change with the graph structure
+    cached = _rank_cache.get(topology_token)
+    if cached is None or cached[0] is not topology or cached[1] != topology.version:
+        cached = (topology, topology.version, layer_ranks(topology))
+        _rank_cache[topology_token] = cached
+        while len(_rank_cache) > 64:
+            _rank_cache.pop(next(iter(_rank_cache)))
+    if grouping == 'community':
+        groups = _community_cache.get(topology_token)
+        if groups is None or groups[0] != topology.signature:
+            groups = (topology.signature, assign_groups(node_rows, edge_rows, grouping))
+            _community_cache[topology_token] = groups
+            while len(_community_cache) > 64:
+                _community_cache.pop(next(iter(_community_cache)))
+        groups = groups[1]
+    else:
+        groups = assign_groups(node_rows, edge_rows, grouping)
+    lod_state = lod_state or {}
+    center = tuple(lod_state["center"]) if lod_state.get("center") else None
+    return build_lod_elements(node_rows, edge_rows, groups, cached[2],
+                              lod_state.get("expanded", []), center, zoom or 1.0)
+
+def describe_lod(info):
+    text = (f"{info['groups']} groups, {info['expanded']} expanded; "
+            f"showing {info['nodes_sent']} nodes and {info['edges_sent']} edges in view.")
+    if info["too_dense"]:
+        text += f" Zoom in to expand: {', '.join(info['too_dense'][:5])}."
+    return text
+
 def get_edge_columns(nodes):
     return [
         {"field": "id", "headerName": "ID", "hide": True},
@@ -47,11 +131,44 @@ def get_edge_columns(nodes):
             "editable": True,
             "cellEditor": "agSelectCellEditor",
             "cellEditorParams": {"values": [node["data"]["id"] for node in nodes]}
-        }
+        },
+        {"field": "status", "headerName": "Status"}
     ]
 
-def create_edge_id(source, target):
-    return f"{source}-{target}"
+def create_edge_id(source, target, existing_ids=()):
+    edge_id = f"{source}-{target}"
+    suffix = 2
+    while edge_id in existing_ids:
+        edge_id = f"{source}-{target}-{suffix}"
+        suffix += 1
+    return edge_id
+
+def describe_topology(topology):
+    rejected = topology.rejected
+    summary = f"{topology.node_count} units, {topology.edge_count} streams. "
+    if not rejected:
+        return summary + "No recycle loops; feed-to-product order is valid."
+    return summary + f"{len(rejected)} stream(s) flagged: " + ", ".join(
+        f"{edge_id} ({reason})" for edge_id, reason in list(rejected.items())[:10]
+    )
+
+def revision_options(scope):
+    options = []
+    for revision_id, summary in reversed(list_revisions(scope)):
+        saved = datetime.fromtimestamp(summary["created"]).strftime("%H:%M:%S")
+        options.append({"label": f"{summary['label'] or 'Revision'} ({saved}, {summary['nodes']} units, "
+                                 f"{summary['edges']} streams)", "value": revision_id})
+    return options
+
+def describe_diff(diff):
+    counts = diff_counts(diff)
+    if not any(any(change.values()) for change in counts.values()):
+        return "No differences."
+    text = "; ".join(
+        f"{label}: {counts[kind]['added']} added, {counts[kind]['removed']} removed, {counts[kind]['modified']} modified"
+        for kind, label in (("nodes", "Units"), ("edges", "Streams"))
+    )
+    return text + f" ({diff['regions']['compared']} of {diff['regions']['total']} regions compared)."
 
 process_flow_layout = html.Div([
     html.H2("Process Flow Visualization", className="mb-4"),
@@ -80,6 +197,7 @@ process_flow_layout = html.Div([
                             "name": node["data"]["name"],
                             "type": node["data"]["type"]
                         } for node in initial_nodes],
+                        getRowId="params.data.id",
                         columnSize="sizeToFit",
                         defaultColDef={
                             "resizable": True
@@ -104,10 +222,17 @@ process_flow_layout = html.Div([
                             "source": edge["data"]["source"],
                             "target": edge["data"]["target"]
                         } for edge in initial_edges],
+                        getRowId="params.data.id",
                         columnSize="sizeToFit",
                         defaultColDef={
                             "resizable": True
                         },
+                        getRowStyle={
+                            "styleConditions": [{
+                                "condition": "params.data.status",
+                                "style": {"backgroundColor": "#f8d7da"}
+                            }]
+                        },
                         dashGridOptions={
                             "rowSelection": "multiple",
                             "enableCellTextSelection": True,
@@ -120,6 +245,105 @@ process_flow_layout = html.Div([
                 dbc.Button("Add Node", id="add-node-btn", color="primary", className="me-2"),
                 dbc.Button("Add Edge", id="add-edge-btn", color="success", className="me-2"),
                 dbc.Button("Delete Selected", id="delete-selected-btn", color="danger")
+            ], className="mt-3"),
+            dbc.Row([
+                dbc.Col([
+                    dcc.Upload(
+                        id="flowsheet-upload",
+                        children=html.Div("Drop or select a flowsheet to import (JSON, CSV, GraphML)"),
+                        style={
+                            "borderWidth": "1px",
+                            "borderStyle": "dashed",
+                            "borderRadius": "5px",
+                            "textAlign": "center",
+                            "padding": "10px"
+                        }
+                    )
+                ], width=7),
+                dbc.Col([
+                    dcc.Dropdown(
+                        id="export-format",
+                        options=[
+                            {"label": "JSON", "value": "json"},
+                            {"label": "CSV", "value": "csv"},
+                            {"label": "GraphML", "value": "graphml"}
+                        ],
+                        value="json",
+                        clearable=False
+                    )
+                ], width=2),
+                dbc.Col([
+                    dbc.Button("Export", id="export-btn", color="secondary", className="me-2"),
+                    html.A(id="export-link", target="_blank")
+                ], width=3)
+            ], className="mt-3 align-items-center"),
+            html.Div(id="topology-status", className="mt-3 small text-muted"),
+            html.Div(id="topology-query", className="mt-1 small"),
+            dbc.Card([
+                dbc.CardHeader("Scenario Sweep"),
+                dbc.CardBody([
+                    dbc.Row([
+                        dbc.Col([
+                            dcc.Dropdown(
+                                id="sweep-design",
+                                options=[
+                                    {"label": "Grid", "value": "grid"},
+                                    {"label": "Latin hypercube", "value": "latin_hypercube"},
+                                    {"label": "Sobol", "value": "sobol"}
+                                ],
+                                value="latin_hypercube",
+                                clearable=False
+                            )
+                        ], width=5),
+                        dbc.Col([
+                            dbc.Input(id="sweep-scenarios", type="number", min=1, max=MAX_SCENARIOS,
+                                      step=1, value=1000)
+                        ], width=4),
+                        dbc.Col([
+                            dbc.Button("Run Sweep", id="run-sweep-btn", color="primary")
+                        ], width=3)
+                    ], className="align-items-center"),
+                    html.Div(
+                        "Sweeps " + ", ".join(
+                            f"{s['name']} {s['low']:g}-{s['high']:g}" for s in DEFAULT_SETPOINTS
+                        ) + " over every unit; results feed the Analytics and Report tabs.",
+                        className="small text-muted mt-2"
+                    ),
+                    dcc.Loading(html.Div(id="sweep-status", className="small mt-2"))
+                ])
+            ], className="mt-3"),
+            dbc.Card([
+                dbc.CardHeader("Revisions"),
+                dbc.CardBody([
+                    dbc.Row([
+                        dbc.Col([
+                            dbc.Input(id="revision-label", placeholder="Revision name", type="text")
+                        ], width=8),
+                        dbc.Col([
+                            dbc.Button("Save Revision", id="save-revision-btn", color="primary")
+                        ], width=4)
+                    ], className="align-items-center mb-2"),
+                    dbc.Row([
+                        dbc.Col([
+                            dcc.Dropdown(id="revision-base", placeholder="Compare from revision")
+                        ], width=5),
+                        dbc.Col([
+                            dcc.Dropdown(
+                                id="revision-target",
+                                options=[{"label": "Current flowsheet", "value": "current"}],
+                                value="current",
+                                clearable=False
+                            )
+                        ], width=4),
+                        dbc.Col([
+                            dbc.ButtonGroup([
+                                dbc.Button("Compare", id="compare-revisions-btn", color="secondary"),
+                                dbc.Button("Clear", id="clear-diff-btn", color="secondary", outline=True)
+                            ])
+                        ], width=3)
+                    ], className="align-items-center"),
+                    html.Div(id="revision-status", className="small mt-2")
+                ])
             ], className="mt-3")
         ], width=6),
         
@@ -127,6 +351,35 @@ process_flow_layout = html.Div([
             dbc.Card([
                 dbc.CardHeader("Process Flow Canvas"),
                 dbc.CardBody([
+                    dbc.Row([
+                        dbc.Col([
+                            dcc.Dropdown(
+                                id='lod-grouping',
+                                options=[
+                                    {'label': 'All units', 'value': 'none'},
+                                    {'label': 'Group by type', 'value': 'type'},
+                                    {'label': 'Group by area', 'value': 'area'},
+                                    {'label': 'Group by community', 'value': 'community'}
+                                ],
+                                value='none',
+                                clearable=False
+                            )
+                        ], width=4),
+                        dbc.Col([
+                            dcc.Slider(id='lod-zoom', min=0.1, max=2, step=0.1, value=1,
+                                       marks={0.1: '0.1x', 1: '1x', 2: '2x'})
+                        ], width=4),
+                        dbc.Col([
+                            dbc.ButtonGroup([
+                                dbc.Button("\u2190", id="lod-pan-left", size="sm", outline=True),
+                                dbc.Button("\u2192", id="lod-pan-right", size="sm", outline=True),
+                                dbc.Button("\u2191", id="lod-pan-up", size="sm", outline=True),
+                                dbc.Button("\u2193", id="lod-pan-down", size="sm", outline=True),
+                                dbc.Button("Collapse", id="lod-collapse-btn", size="sm", outline=True)
+                            ])
+                        ], width=4)
+                    ], className="mb-2 align-items-center"),
+                    html.Div(id='lod-info', className="small text-muted mb-2"),
                     cyto.Cytoscape(
                         id='process-flow-canvas',
                         layout={'name': 'dagre', 'rankDir': 'LR'},
@@ -154,6 +407,65 @@ process_flow_layout = html.Div([
                                     'target-arrow-color': '#495057',
                                     'width': 2
                                 }
+                            },
+                            {
+                                'selector': '.invalid',
+                                'style': {
+                                    'line-color': '#dc3545',
+                                    'target-arrow-color': '#dc3545',
+                                    'line-style': 'dashed'
+                                }
+                            },
+                            {
+                                'selector': 'node.diff-added',
+                                'style': {'background-color': '#198754', 'border-width': 3, 'border-color': '#0f5132'}
+                            },
+                            {
+                                'selector': 'node.diff-modified',
+                                'style': {'background-color': '#fd7e14', 'border-width': 3, 'border-color': '#984c0c'}
+                            },
+                            {
+                                'selector': 'node.diff-removed',
+                                'style': {'background-color': '#dc3545', 'opacity': 0.4, 'border-style': 'dashed',
+                                          'border-width': 2, 'border-color': '#dc3545'}
+                            },
+                            {
+                                'selector': 'edge.diff-added',
+                                'style': {'line-color': '#198754', 'target-arrow-color': '#198754', 'width': 4}
+                            },
+                            {
+                                'selector': 'edge.diff-modified',
+                                'style': {'line-color': '#fd7e14', 'target-arrow-color': '#fd7e14', 'width': 4}
+                            },
+                            {
+                                'selector': 'edge.diff-removed',
+                                'style': {'line-color': '#dc3545', 'target-arrow-color': '#dc3545',
+                                          'line-style': 'dashed', 'opacity': 0.4}
+                            },
+                            {
+                                'selector': '.summary',
+                                'style': {
+                                    'shape': 'round-rectangle',
+                                    'background-color': '#0d6efd',
+                                    'color': '#ffffff',
+                                    'width': '160px',
+                                    'height': '50px'
+                                }
+                            },
+                            {
+                                'selector': '.group',
+                                'style': {
+                                    'background-color': '#e9ecef',
+                                    'text-valign': 'top',
+                                    'shape': 'round-rectangle'
+                                }
+                            },
+                            {
+                                'selector': '.aggregate',
+                                'style': {
+                                    'label': 'data(name)',
+                                    'width': 'mapData(weight, 1, 100, 2, 10)'
+                                }
                             }
                         ]
                     )
@@ -161,76 +473,298 @@ process_flow_layout = html.Div([
             ])
         ], width=6)
     ]),
-    dcc.Store(id='nodes-store', data=initial_nodes),
-    dcc.Store(id='edges-store', data=initial_edges)
+    # Session topology id and the signature of the graph last returned, checked by every worker
+    dcc.Store(id='topology-token'),
+    # Level-of-detail view: expanded groups and viewport center in model coordinates
+    dcc.Store(id='lod-state', data={"expanded": [], "center": None}),
+    # Batched {"add", "update", "remove"} edits applied to both grids in one round trip
+    dcc.Store(id='graph-transaction')
 ])
 
 # Combined callback for node and edge updates
 @callback(
     [Output('node-table', 'rowData'),
      Output('edge-table', 'rowData'),
-     Output('process-flow-canvas', 'elements')],
+     Output('node-table', 'rowTransaction'),
+     Output('edge-table', 'rowTransaction'),
+     Output('process-flow-canvas', 'elements'),
+     Output('topology-token', 'data'),
+     Output('topology-status', 'children')],
     [Input('add-node-btn', 'n_clicks'),
      Input('add-edge-btn', 'n_clicks'),
+     Input('delete-selected-btn', 'n_clicks'),
      Input('node-table', 'cellValueChanged'),
-     Input('edge-table', 'cellValueChanged')],
+     Input('edge-table', 'cellValueChanged'),
+     Input('flowsheet-upload', 'contents'),
+     Input('graph-transaction', 'data')],
     [State('node-table', 'rowData'),
      State('edge-table', 'rowData'),
-     State('nodes-store', 'data'),
-     State('edges-store', 'data')]
+     State('node-table', 'selectedRows'),
+     State('edge-table', 'selectedRows'),
+     State('topology-token', 'data'),
+     State('flowsheet-upload', 'filename'),
+     State('lod-grouping', 'value'),
+     State('lod-state', 'data'),
+     State('lod-zoom', 'value')]
 )
-def update_graph(add_node_clicks, add_edge_clicks, node_cell_changed, edge_cell_changed,
-                current_nodes, current_edges, nodes_data, edges_data):
+def update_graph(add_node_clicks, add_edge_clicks, delete_clicks, node_cell_changed, edge_cell_changed,
+                upload_contents, graph_transaction, current_nodes, current_edges,
+                selected_nodes, selected_edges, topology_token, upload_filename,
+                grouping, lod_state, zoom):
     ctx = callback_context
-    if not ctx.triggered:
-        return current_nodes, current_edges, nodes_data + edges_data
+    signature = (topology_token or {}).get("signature")
+    topology_token = (topology_token or {}).get("token") or uuid.uuid4().hex
+    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else None
+    import_message = ""
+    transaction = None
     
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+    if trigger_id == 'flowsheet-upload' and upload_contents:
+        try:
+            current_nodes, current_edges, errors, renamed = import_flowsheet(upload_contents, upload_filename)
+            drop_topology(topology_token)
+            import_message = f"Imported {upload_filename}. " + (
+                f"{len(errors)} record(s) skipped: {'; '.join(errors[:5])}. " if errors else ""
+            ) + (
+                f"{len(renamed)} duplicate edge id(s) renamed: {'; '.join(renamed[:5])}. " if renamed else ""
+            )
+        except Exception as e:
+            print(f"Import Error: {str(e)}")
+            import_message = f"Could not import {upload_filename}: {str(e)}. "
+    
+    topology = get_topology(topology_token, current_nodes, current_edges, signature)
     
     if trigger_id == 'add-node-btn':
         next_id = get_next_id([{"data": {"id": row["id"]}} for row in current_nodes])
         if next_id:
             new_node = {"id": next_id, "name": f"Node {next_id}", "type": "type1"}
-            current_nodes.append(new_node)
-            nodes_data.append({"data": {"id": next_id, "name": f"Node {next_id}", "type": "type1"}})
+            transaction = {"add": {"nodes": [new_node]}}
     
     elif trigger_id == 'add-edge-btn':
         if len(current_nodes) >= 2:
             source = current_nodes[0]["id"]
             target = current_nodes[1]["id"]
-            edge_id = create_edge_id(source, target)
+            edge_id = create_edge_id(source, target, {edge["id"] for edge in current_edges})
             new_edge = {"id": edge_id, "source": source, "target": target}
-            current_edges.append(new_edge)
-            edges_data.append({"data": {"id": edge_id, "source": source, "target": target}})
+            transaction = {"add": {"edges": [new_edge]}}
+    
+    elif trigger_id == 'delete-selected-btn':
+        if selected_nodes or selected_edges:
+            transaction = {"remove": {"nodes": selected_nodes or [], "edges": selected_edges or []}}
     
     elif trigger_id == 'node-table' and node_cell_changed:
-        changed_id = node_cell_changed["id"]
-        changed_field = node_cell_changed["field"]
-        new_value = node_cell_changed["value"]
-        
-        for node in nodes_data:
-            if node["data"]["id"] == changed_id:
-                node["data"][changed_field] = new_value
-                break
-        
-        for node in current_nodes:
-            if node["id"] == changed_id:
-                node[changed_field] = new_value
-                break
+        # Grid rowData already holds the edited values; renaming a node changes its identity
+        if any(field == "id" for _, field, _, _ in iter_cell_changes(node_cell_changed)):
+            drop_topology(topology_token)
+            topology = get_topology(topology_token, current_nodes, current_edges)
+        else:
+            transaction = {}
     
     elif trigger_id == 'edge-table' and edge_cell_changed:
-        changed_id = edge_cell_changed["id"]
-        changed_field = edge_cell_changed["field"]
-        new_value = edge_cell_changed["value"]
-        
-        for edge in edges_data:
-            if edge["data"]["id"] == changed_id:
-                edge["data"][changed_field] = new_value
-                break
-        
+        # A multi-cell paste arrives as one list of changes
+        changed_ids = {changed_id for changed_id, _, _, _ in iter_cell_changes(edge_cell_changed)}
+        transaction = {"update": {"edges": [
+            {"id": edge["id"], "source": edge["source"], "target": edge["target"]}
+            for edge in current_edges if edge["id"] in changed_ids
+        ]}}
+    
+    elif trigger_id == 'graph-transaction' and graph_transaction:
+        transaction = graph_transaction
+    
+    if transaction is not None:
+        current_nodes, current_edges, node_transaction, edge_transaction = apply_transaction(
+            topology, current_nodes, current_edges, transaction
+        )
+        node_rows, edge_rows = no_update, no_update
+    else:
         for edge in current_edges:
-            if edge["id"] == changed_id:
-                edge[changed_field] = new_value
-                break
+            edge["status"] = topology.edge_status(edge["id"])
+        node_rows, edge_rows = current_nodes, current_edges
+        node_transaction, edge_transaction = no_update, no_update
+    
+    elements, _, _ = render_canvas(current_nodes, current_edges, topology, topology_token,
+                                   grouping, lod_state, zoom)
+    return (node_rows, edge_rows, node_transaction, edge_transaction, elements,
+            topology_store(topology_token, topology), import_message + describe_topology(topology))
+
+@callback(
+    [Output('process-flow-canvas', 'elements', allow_duplicate=True),
+     Output('process-flow-canvas', 'layout'),
+     Output('process-flow-canvas', 'pan'),
+     Output('process-flow-canvas', 'zoom'),
+     Output('process-flow-canvas', 'userPanningEnabled'),
+     Output('process-flow-canvas', 'userZoomingEnabled'),
+     Output('lod-state', 'data'),
+     Output('lod-info', 'children')],
+    [Input('lod-grouping', 'value'),
+     Input('lod-zoom', 'value'),
+     Input('process-flow-canvas', 'tapNodeData'),
+     Input('lod-pan-left', 'n_clicks'),
+     Input('lod-pan-right', 'n_clicks'),
+     Input('lod-pan-up', 'n_clicks'),
+     Input('lod-pan-down', 'n_clicks'),
+     Input('lod-collapse-btn', 'n_clicks')],
+    [State('node-table', 'rowData'),
+     State('edge-table', 'rowData'),
+     State('topology-token', 'data'),
+     State('lod-state', 'data')],
+    prevent_initial_call=True
+)
+def update_level_of_detail(grouping, zoom, tapped, left, right, up, down, collapse,
+                           current_nodes, current_edges, topology_token, lod_state):
+    ctx = callback_context
+    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else None
+    topology_token, topology = session_topology(topology_token, current_nodes, current_edges)
+    zoom = zoom or 1.0
+    lod_state = dict(lod_state or {"expanded": [], "center": None})
+    
+    if grouping == 'none':
+        return (create_elements(current_nodes, current_edges), {'name': 'dagre', 'rankDir': 'LR'},
+                no_update, 1, True, True, {"expanded": [], "center": None}, "")
+    
+    if trigger_id in ('lod-grouping', 'lod-collapse-btn'):
+        lod_state = {"expanded": [], "center": None}
+    elif trigger_id == 'process-flow-canvas':
+        # Tapping a summary node expands its group; tapping an expanded group collapses it
+        group = (tapped or {}).get("group")
+        if group is None:
+            raise exceptions.PreventUpdate
+        expanded = set(lod_state.get("expanded", []))
+        expanded ^= {group}
+        lod_state["expanded"] = sorted(expanded)
+    elif trigger_id and trigger_id.startswith('lod-pan-') and lod_state.get("center"):
+        x, y = lod_state["center"]
+        step_x, step_y = CANVAS_WIDTH / 2 / zoom, CANVAS_HEIGHT / 2 / zoom
+        x += {'lod-pan-left': -step_x, 'lod-pan-right': step_x}.get(trigger_id, 0)
+        y += {'lod-pan-up': -step_y, 'lod-pan-down': step_y}.get(trigger_id, 0)
+        lod_state["center"] = [x, y]
     
-    return current_nodes, current_edges, nodes_data + edges_data
+    elements, center, info = render_canvas(current_nodes, current_edges, topology, topology_token,
+                                           grouping, lod_state, zoom)
+    lod_state["center"] = list(center)
+    return (elements, {'name': 'preset'}, viewport_pan(center, zoom), zoom, False, False,
+            lod_state, describe_lod(info) + " Use the arrows and zoom slider to move; tap a group to expand it.")
+
+@callback(
+    [Output('export-link', 'href'),
+     Output('export-link', 'children')],
+    Input('export-btn', 'n_clicks'),
+    [State('export-format', 'value'),
+     State('node-table', 'rowData'),
+     State('edge-table', 'rowData')],
+    prevent_initial_call=True
+)
+def prepare_export(n_clicks, export_format, current_nodes, current_edges):
+    snapshot_id = save_snapshot(current_nodes or [], current_edges or [])
+    return f"/flowsheet/export/{snapshot_id}.{export_format}", f"Download flowsheet.{export_format}"
+
+@callback(
+    Output('topology-query', 'children'),
+    Input('process-flow-canvas', 'tapNodeData'),
+    [State('topology-token', 'data'),
+     State('node-table', 'rowData'),
+     State('edge-table', 'rowData')],
+    prevent_initial_call=True
+)
+def show_reachability(node_data, topology_token, current_nodes, current_edges):
+    if not node_data or not topology_token:
+        raise exceptions.PreventUpdate
+    _, topology = session_topology(topology_token, current_nodes, current_edges)
+    node_id = node_data["id"]
+    
+    def summarize(nodes, limit=20):
+        ordered = sorted(nodes)
+        text = ", ".join(ordered[:limit]) or "none"
+        return text + (f" (+{len(ordered) - limit} more)" if len(ordered) > limit else "")
+    
+    return html.Div([
+        html.Div(f"Upstream of {node_id}: {summarize(topology.upstream(node_id))}"),
+        html.Div(f"Downstream of {node_id}: {summarize(topology.downstream(node_id))}")
+    ])
+
+@callback(
+    [Output('revision-base', 'options'),
+     Output('revision-target', 'options'),
+     Output('revision-base', 'value'),
+     Output('revision-status', 'children')],
+    Input('save-revision-btn', 'n_clicks'),
+    [State('revision-label', 'value'),
+     State('node-table', 'rowData'),
+     State('edge-table', 'rowData'),
+     State('topology-token', 'data')],
+    prevent_initial_call=True
+)
+def save_flowsheet_revision(n_clicks, label, current_nodes, current_edges, topology_token):
+    # Revisions belong to the session's flowsheet, identified by its topology token
+    scope = (topology_token or {}).get("token")
+    if not scope:
+        raise exceptions.PreventUpdate
+    revision_id = save_revision(scope, current_nodes or [], current_edges or [], label or None)
+    options = revision_options(scope)
+    return (options, [{"label": "Current flowsheet", "value": "current"}] + options, revision_id,
+            f"Saved {label or 'revision'} ({len(current_nodes or [])} units, {len(current_edges or [])} streams).")
+
+@callback(
+    [Output('process-flow-canvas', 'elements', allow_duplicate=True),
+     Output('revision-status', 'children', allow_duplicate=True)],
+    [Input('compare-revisions-btn', 'n_clicks'),
+     Input('clear-diff-btn', 'n_clicks')],
+    [State('revision-base', 'value'),
+     State('revision-target', 'value'),
+     State('node-table', 'rowData'),
+     State('edge-table', 'rowData'),
+     State('topology-token', 'data'),
+     State('lod-grouping', 'value'),
+     State('lod-state', 'data'),
+     State('lod-zoom', 'value')],
+    prevent_initial_call=True
+)
+def compare_flowsheet_revisions(compare_clicks, clear_clicks, base_id, target_id, current_nodes, current_edges,
+                                topology_token, grouping, lod_state, zoom):
+    ctx = callback_context
+    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else None
+    current_nodes, current_edges = current_nodes or [], current_edges or []
+    
+    if trigger_id == 'clear-diff-btn':
+        topology_token, topology = session_topology(topology_token, current_nodes, current_edges)
+        elements, _, _ = render_canvas(current_nodes, current_edges, topology, topology_token,
+                                       grouping, lod_state, zoom)
+        return elements, ""
+    
+    scope = (topology_token or {}).get("token")
+    base = get_revision(scope, base_id) if base_id and scope else None
+    if base is None:
+        return no_update, "Save a revision and select it to compare from."
+    target = (FlowsheetRevision(current_nodes, current_edges) if target_id in (None, 'current')
+              else get_revision(scope, target_id))
+    if target is None:
+        return no_update, "The selected revision is no longer available; save it again."
+    
+    diff = diff_revisions(base, target)
+    # Grouped views show summary nodes, so the overlay needs every unit on the canvas
+    if grouping and grouping != 'none':
+        return no_update, describe_diff(diff) + " Switch the canvas to All units to see the changes highlighted."
+    return overlay_elements(base, target, diff), describe_diff(diff) + (
+        " Green: added, orange: modified, faded red: removed."
+    )
+
+@callback(
+    Output('sweep-status', 'children'),
+    Input('run-sweep-btn', 'n_clicks'),
+    [State('sweep-design', 'value'),
+     State('sweep-scenarios', 'value'),
+     State('node-table', 'rowData'),
+     State('edge-table', 'rowData')],
+    prevent_initial_call=True
+)
+def run_scenario_sweep(n_clicks, design, n_scenarios, current_nodes, current_edges):
+    if not current_nodes:
+        return "Add at least one unit before running a sweep."
+    try:
+        summary = run_sweep(current_nodes, current_edges or [], design=design,
+                            n_scenarios=n_scenarios or 1, store=get_results_store(results_path))
+    except Exception as e:
+        print(f"Sweep Error: {str(e)}")
+        return dbc.Alert(f"Sweep failed: {str(e)}", color="danger")
+    best = ", ".join(f"{name} {value:g}" for name, value in summary["best_setpoints"].items())
+    return (f"Evaluated {summary['scenarios']} scenarios x {summary['units']} units "
+            f"({summary['rows']} results). Best mean KPI {summary['best_kpi']} at {best}.")
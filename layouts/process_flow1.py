@@ -3,6 +3,8 @@ import dash_bootstrap_components as dbc
 import dash_cytoscape as cyto
 import dash_ag_grid as dag
 from dash import Dash
+from utils.topology import build_topology
+from utils.graph_transactions import apply_transaction
 #from utils import create_elements  # Import the helper function
 
 # Load and register the dagre layout
@@ -11,24 +13,31 @@ cyto.load_extra_layouts()
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 
 # Initial sample data
+# Nodes are identified by id (names may repeat); edges reference node ids
 initial_nodes = [
-    {"name": "Raw Materials", "type": "type1"},
-    {"name": "Processing Unit", "type": "type2"},
-    {"name": "Quality Control", "type": "type3"}
+    {"id": "N1", "name": "Raw Materials", "type": "type1"},
+    {"id": "N2", "name": "Processing Unit", "type": "type2"},
+    {"id": "N3", "name": "Quality Control", "type": "type3"}
 ]
 
 initial_edges = [
-    {"upstream": "Raw Materials", "downstream": "Processing Unit"},
-    {"upstream": "Processing Unit", "downstream": "Quality Control"}
+    {"id": "E1", "upstream": "N1", "downstream": "N2"},
+    {"id": "E2", "upstream": "N2", "downstream": "N3"}
 ]
 
+def next_id(prefix, rows):
+    """Next unused id of the form <prefix><n>"""
+    numbers = [int(row["id"][len(prefix):]) for row in rows
+               if row["id"].startswith(prefix) and row["id"][len(prefix):].isdigit()]
+    return f"{prefix}{max(numbers, default=0) + 1}"
+
 def create_elements(nodes, edges):
     """
     Helper function to create Cytoscape elements from nodes and edges.
     """
-    elements = [{"data": {"id": node["name"], "label": node["name"]}} for node in nodes]
+    elements = [{"data": {"id": node["id"], "label": node["name"]}} for node in nodes]
     elements += [
-        {"data": {"source": edge["upstream"], "target": edge["downstream"]}}
+        {"data": {"id": edge["id"], "source": edge["upstream"], "target": edge["downstream"]}}
         for edge in edges
     ]
     return elements
@@ -45,6 +54,7 @@ process_flow_layout = html.Div([
                     dag.AgGrid(
                         id='node-table',
                         columnDefs=[
+                            {"field": "id", "headerName": "ID"},
                             {"field": "name", "headerName": "Name", "editable": True},
                             {
                                 "field": "type",
@@ -57,6 +67,8 @@ process_flow_layout = html.Div([
                             }
                         ],
                         rowData=initial_nodes,
+                        getRowId="params.data.id",
+                        dashGridOptions={"rowSelection": "multiple"},
                         defaultColDef={"resizable": True},
                         columnSize="sizeToFit"
                     )
@@ -71,10 +83,13 @@ process_flow_layout = html.Div([
                     dag.AgGrid(
                         id='edge-table',
                         columnDefs=[
+                            {"field": "id", "headerName": "ID", "hide": True},
                             {"field": "upstream", "headerName": "Upstream Node", "editable": True},
                             {"field": "downstream", "headerName": "Downstream Node", "editable": True}
                         ],
                         rowData=initial_edges,
+                        getRowId="params.data.id",
+                        dashGridOptions={"rowSelection": "multiple"},
                         defaultColDef={"resizable": True},
                         columnSize="sizeToFit"
                     )
@@ -109,22 +124,32 @@ process_flow_layout = html.Div([
     prevent_initial_call=True
 )
 def add_node(n_clicks, nodes):
-    new_node = {"name": f"Node {len(nodes) + 1}", "type": "type1"}
+    node_id = next_id("N", nodes)
+    new_node = {"id": node_id, "name": f"Node {node_id}", "type": "type1"}
     nodes.append(new_node)
     return nodes
 
-# Callback to delete a node
+# Callback to delete the selected nodes and every edge connected to them
 @app.callback(
-    Output('nodes-store', 'data'),
+    Output('nodes-store', 'data', allow_duplicate=True),
+    Output('edges-store', 'data', allow_duplicate=True),
     Input('delete-node-btn', 'n_clicks'),
     State('node-table', 'selectedRows'),
     State('nodes-store', 'data'),
+    State('edges-store', 'data'),
     prevent_initial_call=True
 )
-def delete_node(n_clicks, selected_rows, nodes):
-    if selected_rows:
-        nodes = [node for node in nodes if node not in selected_rows]
-    return nodes
+def delete_node(n_clicks, selected_rows, nodes, edges):
+    if not selected_rows:
+        return nodes, edges
+    # Same cascading delete as the main editor: removed by id, incident edges found by the topology
+    edge_rows = [{"id": edge["id"], "source": edge["upstream"], "target": edge["downstream"]} for edge in edges]
+    topology = build_topology(nodes, edge_rows)
+    nodes, edge_rows, _, _ = apply_transaction(
+        topology, nodes, edge_rows, {"remove": {"nodes": [row["id"] for row in selected_rows]}}
+    )
+    kept = {row["id"] for row in edge_rows}
+    return nodes, [edge for edge in edges if edge["id"] in kept]
 
 # Callback to add a new edge
 @app.callback(
@@ -136,12 +161,12 @@ def delete_node(n_clicks, selected_rows, nodes):
 )
 def add_edge(n_clicks, edges, nodes):
     if len(nodes) >= 2:
-        edges.append({"upstream": nodes[0]["name"], "downstream": nodes[1]["name"]})
+        edges.append({"id": next_id("E", edges), "upstream": nodes[0]["id"], "downstream": nodes[1]["id"]})
     return edges
 
 # Callback to delete an edge
 @app.callback(
-    Output('edges-store', 'data'),
+    Output('edges-store', 'data', allow_duplicate=True),
     Input('delete-edge-btn', 'n_clicks'),
     State('edge-table', 'selectedRows'),
     State('edges-store', 'data'),
@@ -149,7 +174,8 @@ def add_edge(n_clicks, edges, nodes):
 )
 def delete_edge(n_clicks, selected_rows, edges):
     if selected_rows:
-        edges = [edge for edge in edges if edge not in selected_rows]
+        selected_ids = {row["id"] for row in selected_rows}
+        edges = [edge for edge in edges if edge["id"] not in selected_ids]
     return edges
 
 # Callback to update canvas
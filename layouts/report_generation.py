@@ -1,8 +1,8 @@
-import io
+import itertools
 import json
+import tempfile
 import traceback
 import cohere
-from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from dotenv import load_dotenv
 import os
@@ -11,264 +11,383 @@ from dash import html, dcc, callback, Input, Output, State
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import re
-from datetime import datetime
-import base64
+import uuid
+from datetime import datetime, timedelta
+from flask import abort, send_file
+from utils.shared_cache import get_cache, file_version, make_key
+from utils.impact_analysis import derive_impact, analyze_arrays
+from utils.results_store import get_results_store
+from utils.rollups import get_rollups, KPI_COLUMN
+from utils.pdf_tables import CompressingCanvas, FixedWidthTable
+from utils.prompt_builder import build_insights_prompt, DEFAULT_PROMPT_TOKENS, DEFAULT_DETAILED_VARIABLES
+from utils.callback_memo import memoize_callback
+from utils.report_pipeline import ReportPipeline, Prefetcher
 
 # Load environment variables
 load_dotenv()
 COHERE_API_KEY = os.getenv('COHERE_API_KEY')
+# Generated insights are reused by every worker for this long (seconds)
+INSIGHTS_CACHE_TTL = float(os.getenv('INSIGHTS_CACHE_TTL', 24 * 3600))
+# Prompt budget (estimated tokens) and the most variables analysed individually
+INSIGHTS_PROMPT_TOKENS = int(os.getenv('INSIGHTS_PROMPT_TOKENS', DEFAULT_PROMPT_TOKENS))
+INSIGHTS_DETAILED_VARIABLES = int(os.getenv('INSIGHTS_DETAILED_VARIABLES', DEFAULT_DETAILED_VARIABLES))
+# Most scenario rows drawn in the PDF's results table
+REPORT_MAX_SCENARIO_ROWS = int(os.getenv('REPORT_MAX_SCENARIO_ROWS', 100000))
+# Seconds a preview is reused; relative time ranges end at the current time
+REPORT_PREVIEW_TTL = 60
+# Report selections handed from the Download button to the download route (seconds kept)
+REPORT_DOWNLOAD_TTL = 3600
+REPORT_DOWNLOAD_NAMESPACE = "report_downloads"
+# Time Range used when the dropdown is cleared (days)
+DEFAULT_TIME_RANGE = '1'
 
 if not COHERE_API_KEY:
     print("Warning: No Cohere API key found in .env file")
 
-def get_ai_insights(data):
-    try:
-        co = cohere.Client(COHERE_API_KEY)
-        
-        # Create a detailed prompt
-        prompt = f"""
-Analyze this industrial process data and provide a structured, comprehensive technical report in a clean and uniform format.
-
-**Key Requirements:**
-- Use consistent indentation and bullet points throughout
-- Use bold text sparingly and only for main section headers
-- Maintain consistent formatting across all sections
-- Focus on actionable insights and clear data presentation
-
-**Input Data:**
-• Process Variables: {json.dumps(data.get('top_variables', {}), indent=2)}
-• Impact Analysis: {json.dumps(data.get('top_impact', {}), indent=2)}
-• Setpoint Analysis: {json.dumps(data.get('setpoint_impact_summary', {}), indent=2)}
-
-**Required Format:**
-
-1. KEY VARIABLE ANALYSIS
-   • Temperature (Impact: X%)
-      - Current Value: [value] [unit]
-      - Confidence Level: [percentage]
-      - Critical Range: [range]
-      - Impact Level: [level]
-
-   • Pressure (Impact: X%)
-      - Current Value: [value] [unit]
-      - Confidence Level: [percentage]
-      - Critical Range: [range]
-      - Impact Level: [level]
-
-   • Flow Rate (Impact: X%)
-      - Current Value: [value] [unit]
-      - Confidence Level: [percentage]
-      - Critical Range: [range]
-      - Impact Level: [level]
-
-2. OPTIMIZATION PRIORITIES
-   • Primary Targets
-      - [Target 1]
-      - [Target 2]
-      - [Target 3]
-
-   • Expected Improvements
-      - Efficiency: [X]% improvement
-      - Quality: [specific improvements]
-      - Cost: [estimated savings]
-
-3. TECHNICAL RECOMMENDATIONS
-   • Immediate Actions
-      - [Action 1]
-      - [Action 2]
-      - [Action 3]
-
-   • Long-term Strategy
-      - [Strategy 1]
-      - [Strategy 2]
-      - [Strategy 3]
-
-4. RISK ASSESSMENT
-   • Critical Thresholds
-      - Temperature: [range]
-      - Pressure: [range]
-      - Flow Rate: [range]
-
-   • Safety Protocols
-      - [Protocol 1]
-      - [Protocol 2]
-      - [Protocol 3]
-
-Use consistent bullet points and maintain proper indentation. Replace placeholders with specific numerical values and technical details."""
-
-        response = co.generate(
-            model='command',
-            prompt=prompt,
-            max_tokens=800,
-            temperature=0.7,
-            num_generations=1
-        )
+cache = get_cache()
+# Insights generated while the user looks at the preview
+insights_prefetcher = Prefetcher()
+results_path = os.path.join(os.path.dirname(__file__), '..', 'mock_results.json')
 
-        # Get the response text
-        insights = response.generations[0].text
+@cache.cached('results', version=lambda: file_version(results_path))
+def load_results():
+    with open(results_path, 'r') as f:
+        return json.load(f)
 
-        # Clean up the response - remove any ### or ** markers
-        insights = re.sub(r'#{1,3}\s*', '', insights)  # Remove hashtags
-        insights = re.sub(r'\*\*', '', insights)  # Remove asterisks
+def results_store():
+    return get_results_store(results_path)
 
-        return insights
+@cache.cached('impact', version=lambda: results_store().token())
+def load_impact():
+    # Scenario sweeps append to the store, so the analysis covers them too
+    names, X, y, _, _, _ = results_store().arrays()
+    return analyze_arrays(names, X, y) or derive_impact(load_results())
+
+def iter_scenarios(equipment, start=None, end=None):
+    """Stored scenario records for one piece of equipment, read lazily from the results store"""
+    return results_store().iter_records(equipment=equipment, start=start, end=end)
+
+def resolve_window(time_range, start_date, end_date):
+    """
+    (start, end) epoch seconds for the Time Range selection (DEFAULT_TIME_RANGE when
+    cleared); custom ranges include the end date
+    """
+    now = datetime.now()
+    time_range = time_range or DEFAULT_TIME_RANGE
+    if time_range == 'custom':
+        start = datetime.fromisoformat(start_date[:10]) if start_date else now.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = datetime.fromisoformat(end_date[:10]) if end_date else start
+        return start.timestamp(), (end + timedelta(days=1)).timestamp()
+    return (now - timedelta(days=int(time_range))).timestamp(), now.timestamp()
+
+def filter_report_data(data, equipment, variables, start, end):
+    """Report data restricted to the selected variables, equipment and time window"""
+    filtered_data = {
+        'top_variables': {},
+        'top_impact': {},
+        'setpoint_impact_summary': {}
+    }
+    
+    # Only include selected variables
+    titles = [var.replace('_', ' ').title() for var in variables]
+    for var_title in titles:
+        if var_title in data['top_variables']:
+            filtered_data['top_variables'][var_title] = data['top_variables'][var_title]
+        if var_title in data['top_impact']:
+            filtered_data['top_impact'][var_title] = data['top_impact'][var_title]
+        if var_title in data['setpoint_impact_summary']:
+            filtered_data['setpoint_impact_summary'][var_title] = data['setpoint_impact_summary'][var_title]
+    
+    # Window statistics come from the hourly/daily rollups, not a scan of the results
+    # (only the statistics are kept, so cached insights stay valid while the window slides)
+    summary = get_rollups(results_store()).summarize(start, end, equipment)
+    filtered_data['window_summary'] = {
+        'columns': {name: stats for name, stats in summary['columns'].items()
+                    if name == KPI_COLUMN or name in titles}
+    }
+    return filtered_data
+
+def format_window_stats(name, stats):
+    if not stats['count']:
+        return f"{name}: no results"
+    return (f"{name}: n={stats['count']}, mean={stats['mean']:.2f}, "
+            f"min={stats['min']:.2f}, max={stats['max']:.2f}")
 
+def describe_prompt(plan):
+    return (f"AI analysis prompt: ~{plan['prompt_tokens']} tokens ({len(plan['detailed'])} variables in detail, "
+            f"{plan['summarized'] + plan['omitted']} summarized), up to {plan['max_tokens']} output tokens")
+
+def load_report_data():
+    """Results with the impact analysis derived from the scenario data"""
+    data = load_results()
+    impact = load_impact()
+    data['top_impact'] = impact['top_impact']
+    data['setpoint_impact_summary'] = impact['setpoint_impact_summary']
+    return data
+
+def get_ai_insights(data):
+    try:
+        return generate_insights(data)
     except Exception as e:
         print(f"AI Error: {str(e)}")
         print(traceback.format_exc())
         return ""
 
-def create_pdf_report(data, include_ai=True):
+def build_report_prompt(data):
+    return build_insights_prompt(data, INSIGHTS_PROMPT_TOKENS, INSIGHTS_DETAILED_VARIABLES)
+
+# Only successful generations are cached; failures raise and are retried next time
+@cache.cached('insights', ttl=INSIGHTS_CACHE_TTL)
+def generate_insights(data):
+    co = cohere.Client(COHERE_API_KEY)
+    
+    # Prompt sized to the token budget, however many variables are selected
+    plan = build_report_prompt(data)
+    print(f"Insights prompt: ~{plan['prompt_tokens']} tokens, {len(plan['detailed'])} variables detailed, "
+          f"{plan['summarized']} summarized, {plan['omitted']} omitted, max_tokens={plan['max_tokens']}")
+
+    response = co.generate(
+        model='command',
+        prompt=plan['prompt'],
+        max_tokens=plan['max_tokens'],
+        temperature=0.7,
+        num_generations=1
+    )
+
+    # Get the response text
+    insights = response.generations[0].text
+
+    # Clean up the response - remove any ### or ** markers
+    insights = re.sub(r'#{1,3}\s*', '', insights)  # Remove hashtags
+    insights = re.sub(r'\*\*', '', insights)  # Remove asterisks
+
+    return insights
+
+def scenario_rows(records, names):
+    """Table rows (scenario, equipment, KPI, variables...) from simulated_data style records"""
+    for record in records:
+        variables = record.get('variables', {})
+        yield ([record['scenario'], record['equipment'], format_cell(record.get('kpi_value'))]
+               + [format_cell(variables.get(name)) for name in names])
+
+def format_cell(value):
+    if value is None:
+        return "-"
+    return f"{value:.6g}" if isinstance(value, float) else value
+
+class ReportCanvas:
+    """PDF canvas and the current y position, starting a new page when space runs out"""
+
+    def __init__(self, path):
+        # Pages are compressed as they are finished and written to path on save
+        self.pdf = CompressingCanvas(path, pagesize=letter)
+        self.width, self.height = letter
+        self.top = self.height - 50
+        self.y = self.top
+
+    def check_page_break(self, needed_space=100):
+        """Start a new page if less than needed_space is left; returns whether it did"""
+        if self.y < needed_space:
+            self.pdf.showPage()
+            self.pdf.setFont("Helvetica-Bold", 12)  # Reset font after new page
+            self.y = self.top
+            return True
+        return False
+
+    def heading(self, text, space_before=20):
+        self.y -= space_before
+        self.check_page_break()
+        self.pdf.setFont("Helvetica-Bold", 12)
+        self.pdf.drawString(72, self.y, text)
+        self.y -= 25
+        self.pdf.setFont("Helvetica", 10)
+
+    def line(self, text):
+        self.check_page_break()
+        self.pdf.drawString(72, self.y, text)
+        self.y -= 20
+
+    def insights(self, text):
+        """Draw LLM output, with bold section headers and bullets indented by their leading spaces"""
+        pdf = self.pdf
+        current_font, current_size = "Helvetica", 10
+        pdf.setFont(current_font, current_size)
+        for line in text.split('\n'):
+            if self.check_page_break():
+                pdf.setFont(current_font, current_size)  # Restore font settings
+
+            # Skip empty lines
+            if not line.strip():
+                self.y -= 10
+                continue
+
+            # Set fonts based on line content
+            if re.match(r'^\d+\.\s+[A-Z\s]+$', line.strip()):  # Main section headers
+                current_font, current_size = "Helvetica-Bold", 12
+            else:
+                current_font, current_size = "Helvetica", 10
+            pdf.setFont(current_font, current_size)
+
+            # 20 points per indentation level
+            indent_points = (len(line) - len(line.lstrip())) // 2 * 20
+            text = line.strip()
+            if len(text) > 80:
+                # Split long lines
+                current_line = ""
+                for word in text.split():
+                    if len(current_line + " " + word) < 80:
+                        current_line += " " + word
+                    else:
+                        pdf.drawString(72 + indent_points, self.y, current_line.strip())
+                        self.y -= 15
+                        if self.check_page_break():
+                            pdf.setFont(current_font, current_size)  # Restore font
+                        current_line = word
+                if current_line:
+                    pdf.drawString(72 + indent_points, self.y, current_line.strip())
+                    self.y -= 15
+            else:
+                pdf.drawString(72 + indent_points, self.y, text)
+                self.y -= 15
+        self.y -= 15
+        self.check_page_break(150)
+
+# Report sections, the values they need and the sections of each report type
+report_pipeline = ReportPipeline()
+
+REPORT_TITLES = {
+    'full': "Process Optimization Report",
+    'summary': "Process Summary Report",
+    'technical': "Process Technical Report",
+    'safety': "Process Safety Overview",
+}
+
+@report_pipeline.value('insights', depends=('data', 'include_ai'))
+def report_insights(data, include_ai):
+    if not include_ai or not COHERE_API_KEY:
+        return ""
+    return get_ai_insights(data)
+
+def risk_assessment(insights):
+    """The RISK ASSESSMENT part of the insights, or all of them if it has no such section"""
+    lines = insights.split('\n')
+    start = next((i for i, line in enumerate(lines) if re.match(r'^\s*\d+\.\s+RISK ASSESSMENT', line)), None)
+    if start is None:
+        print("Insights have no RISK ASSESSMENT section (possibly cut off); using them in full")
+        return insights
+    end = next((i for i in range(start + 1, len(lines)) if re.match(r'^\d+\.\s+[A-Z\s]+$', lines[i].strip())),
+               len(lines))
+    return '\n'.join(lines[start:end])
+
+@report_pipeline.section('analysis', requires=('insights',))
+def analysis_section(canvas, insights):
+    if insights:
+        canvas.heading("Technical Analysis:", space_before=0)
+        canvas.insights(insights)
+
+@report_pipeline.section('risk', requires=('insights',))
+def risk_section(canvas, insights):
+    if insights:
+        canvas.heading("Risk Assessment:", space_before=0)
+        canvas.insights(risk_assessment(insights))
+
+@report_pipeline.section('variables', requires=('data',))
+def variables_section(canvas, data):
+    if data.get('top_variables'):
+        canvas.heading("Key Process Variables:", space_before=0)
+        for var, details in data['top_variables'].items():
+            canvas.line(f"{var}: {details['value']} {details['unit']}")
+
+@report_pipeline.section('impacts', requires=('data',))
+def impacts_section(canvas, data):
+    if data.get('top_impact'):
+        canvas.heading("Variable Impacts on Process:")
+        for var, impact in data['top_impact'].items():
+            canvas.line(f"{var}: {impact*100:.1f}% impact")
+
+@report_pipeline.section('window', requires=('data',))
+def window_section(canvas, data):
+    if data.get('window_summary'):
+        canvas.heading("Results in Selected Window:")
+        for name, stats in data['window_summary']['columns'].items():
+            canvas.line(format_window_stats(name, stats))
+
+@report_pipeline.section('scenarios', requires=('data', 'scenarios', 'scenario_count'))
+def scenarios_section(canvas, data, scenarios, scenario_count):
+    if scenarios is None and data.get('simulated_summary') and data['simulated_summary'].get('simulated_data'):
+        scenarios = data['simulated_summary']['simulated_data']
+        scenario_count = len(scenarios)
+    if scenarios is None:
+        return
+    canvas.heading("Simulation Results:")
+
+    # One fixed-width layout for every page; variable columns that do not fit are dropped
+    names = list(data.get('top_variables', {})) or list(data.get('top_impact', {}))
+    table = FixedWidthTable(
+        [("Scenario", 8, "right"), ("Equipment", 18, "left"), ("KPI", 10, "right")]
+        + [(name, max(10, min(len(name), 16)), "right") for name in names],
+        max_width=canvas.width - 144
+    )
+    rows = scenario_rows(itertools.islice(scenarios, REPORT_MAX_SCENARIO_ROWS), names)
+    canvas.y = table.draw(canvas.pdf, rows, 72, canvas.y, canvas.top, 50, canvas.pdf.showPage)
+    if scenario_count is not None and scenario_count > REPORT_MAX_SCENARIO_ROWS:
+        canvas.y -= 15
+        canvas.check_page_break(50)
+        canvas.pdf.setFont("Helvetica-Oblique", 9)
+        canvas.pdf.drawString(72, canvas.y, f"First {REPORT_MAX_SCENARIO_ROWS} of {scenario_count} scenarios shown.")
+
+REPORT_SECTIONS = {
+    'full': ('analysis', 'variables', 'impacts', 'window', 'scenarios'),
+    'summary': ('variables', 'impacts', 'window'),
+    'technical': ('analysis', 'variables', 'window', 'scenarios'),
+    'safety': ('risk', 'variables', 'window'),
+}
+for report_type, sections in REPORT_SECTIONS.items():
+    report_pipeline.report_type(report_type, sections)
+
+def render_pdf_report(data, path, include_ai=True, scenarios=None, scenario_count=None, report_type='full'):
+    """
+    Write the PDF report to path (a file name or an open binary file), drawing
+    only the sections of report_type.
+
+    scenarios is an iterable of simulated_data records (for example a results
+    store iterator); it is consumed lazily, and at most REPORT_MAX_SCENARIO_ROWS
+    rows are drawn, falling back to data['simulated_summary'] when not given.
+    The AI insights are generated only for report types with an AI section.
+    """
+    if report_type not in REPORT_SECTIONS:
+        report_type = 'full'
     try:
-        # Create PDF buffer and canvas
-        buffer = io.BytesIO()
-        pdf = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-        
-        # Function to check if we need a new page
-        def check_page_break(y_pos, needed_space=100):
-            if y_pos < needed_space:
-                pdf.showPage()  # Start new page
-                pdf.setFont("Helvetica-Bold", 12)  # Reset font after new page
-                return height - 50  # Reset y position
-            return y_pos
-
-        y = height - 50  # Start 50 points from top
-        
+        canvas = ReportCanvas(path)
+
         # Add title
-        pdf.setFont("Helvetica-Bold", 16)
-        pdf.drawString(72, y, "Process Optimization Report")
-        y -= 40
-        
-        # Try to add AI insights if requested
-        if include_ai and COHERE_API_KEY:
-            try:
-                # Get AI insights
-                insights = get_ai_insights(data)
-                
-                # Add insights to PDF
-                pdf.setFont("Helvetica-Bold", 12)
-                pdf.drawString(72, y, "Technical Analysis:")
-                y -= 25
-                
-                # Format bullet points with proper indentation
-                pdf.setFont("Helvetica", 10)
-                current_font = "Helvetica"
-                current_size = 10
-                
-                for line in insights.split('\n'):
-                    # Check if we need a new page
-                    y = check_page_break(y)
-                    if y == height - 50:  # If we started a new page
-                        pdf.setFont(current_font, current_size)  # Restore font settings
-                    
-                    # Skip empty lines
-                    if not line.strip():
-                        y -= 10
-                        continue
-                    
-                    # Set fonts based on line content
-                    if re.match(r'^\d+\.\s+[A-Z\s]+$', line.strip()):  # Main section headers
-                        current_font = "Helvetica-Bold"
-                        current_size = 12
-                        pdf.setFont(current_font, current_size)
-                    else:
-                        current_font = "Helvetica"
-                        current_size = 10
-                        pdf.setFont(current_font, current_size)
-                    
-                    # Calculate indentation level
-                    indent = len(line) - len(line.lstrip())
-                    indent_points = indent // 2 * 20  # 20 points per indentation level
-                    
-                    # Draw the line with proper indentation
-                    text = line.strip()
-                    if text:  # Only draw non-empty lines
-                        # Split long lines
-                        if len(text) > 80:  # If line is too long
-                            words = text.split()
-                            current_line = ""
-                            for word in words:
-                                if len(current_line + " " + word) < 80:
-                                    current_line += " " + word
-                                else:
-                                    pdf.drawString(72 + indent_points, y, current_line.strip())
-                                    y -= 15
-                                    y = check_page_break(y)
-                                    if y == height - 50:  # If we started a new page
-                                        pdf.setFont(current_font, current_size)  # Restore font
-                                    current_line = word
-                            if current_line:
-                                pdf.drawString(72 + indent_points, y, current_line.strip())
-                                y -= 15
-                        else:
-                            pdf.drawString(72 + indent_points, y, text)
-                            y -= 15
-                
-                y -= 15
-                y = check_page_break(y, 150)  # Check before starting variables section
-                
-            except Exception as e:
-                print(f"AI Error: {str(e)}")
-                print(traceback.format_exc())
-        
-        # Add variables section if present
-        if data.get('top_variables'):
-            y = check_page_break(y)
-            pdf.setFont("Helvetica-Bold", 12)
-            pdf.drawString(72, y, "Key Process Variables:")
-            y -= 25
-            
-            pdf.setFont("Helvetica", 10)
-            for var, details in data['top_variables'].items():
-                y = check_page_break(y)
-                pdf.drawString(72, y, f"{var}: {details['value']} {details['unit']}")
-                y -= 20
-        
-        # Add impacts section if present
-        if data.get('top_impact'):
-            y -= 20
-            y = check_page_break(y)
-            pdf.setFont("Helvetica-Bold", 12)
-            pdf.drawString(72, y, "Variable Impacts on Process:")
-            y -= 25
-            
-            pdf.setFont("Helvetica", 10)
-            for var, impact in data['top_impact'].items():
-                y = check_page_break(y)
-                pdf.drawString(72, y, f"{var}: {impact*100:.1f}% impact")
-                y -= 20
-        
-        # Add simulation results if present
-        if data.get('simulated_summary') and data['simulated_summary'].get('simulated_data'):
-            y -= 20
-            y = check_page_break(y)
-            pdf.setFont("Helvetica-Bold", 12)
-            pdf.drawString(72, y, "Simulation Results:")
-            y -= 25
-            
-            pdf.setFont("Helvetica", 10)
-            for scenario in data['simulated_summary']['simulated_data']:
-                y = check_page_break(y)
-                pdf.drawString(72, y, f"Scenario {scenario['scenario']}: Equipment = {scenario['equipment']}")
-                y -= 20
-        
+        canvas.pdf.setFont("Helvetica-Bold", 16)
+        canvas.pdf.drawString(72, canvas.y, REPORT_TITLES[report_type])
+        canvas.y -= 40
+
+        report_pipeline.render(report_type, canvas, data=data, include_ai=include_ai,
+                               scenarios=scenarios, scenario_count=scenario_count)
+
         # Add footer to current page
-        pdf.setFont("Helvetica-Oblique", 8)
-        pdf.drawString(72, 30, "Generated by Process First LLC - Process Optimization Report")
-        
-        # Save and get PDF data
-        pdf.save()
-        pdf_data = buffer.getvalue()
-        buffer.close()
-        
-        return base64.b64encode(pdf_data).decode('utf-8')
-        
+        canvas.pdf.setFont("Helvetica-Oblique", 8)
+        canvas.pdf.drawString(72, 30, f"Generated by Process First LLC - {REPORT_TITLES[report_type]}")
+
+        canvas.pdf.save()
+        return path
+
     except Exception as e:
         print(f"PDF Error: {str(e)}")
         print(traceback.format_exc())
         raise
 
+def needs_insights(report_type):
+    return report_type in REPORT_SECTIONS and report_pipeline.needs(report_type, 'insights')
+
+def prefetch_insights(data):
+    """Start generating insights in the background so a later download finds them cached"""
+    if COHERE_API_KEY:
+        insights_prefetcher.submit(make_key(data), generate_insights, data)
+
 def layout():
     return dbc.Container([
         dbc.Row([
@@ -287,7 +406,7 @@ def layout():
                                         {'label': 'Last 30 Days', 'value': '30'},
                                         {'label': 'Custom Range', 'value': 'custom'}
                                     ],
-                                    value='1',
+                                    value=DEFAULT_TIME_RANGE,
                                     className="mb-3"
                                 ),
                                 html.Div(id='custom-date-range', style={'display': 'none'}, children=[
@@ -307,7 +426,7 @@ def layout():
                                         {'label': 'All Equipment', 'value': 'all'},
                                         {'label': 'Reactor A', 'value': 'reactor_a'},
                                         {'label': 'Reactor B', 'value': 'reactor_b'},
-                                        {'label': 'Distillation Unit', 'value': 'distillation'}
+                                        {'label': 'Distillation Unit', 'value': 'distillation_unit'}
                                     ],
                                     value='all',
                                     className="mb-3"
@@ -358,7 +477,7 @@ def layout():
                                     color="secondary",
                                     className="me-2"
                                 ),
-                                dcc.Download(id="download-pdf")
+                                html.A(id="download-pdf-link", target="_blank")
                             ])
                         ])
                     ])
@@ -379,6 +498,7 @@ report_generation_layout = layout()
     Output('custom-date-range', 'style'),
     Input('time-range', 'value')
 )
+@memoize_callback()
 def toggle_custom_date_range(time_range):
     if time_range == 'custom':
         return {'display': 'block'}
@@ -395,40 +515,23 @@ def toggle_custom_date_range(time_range):
      State("date-range", "end_date")],
     prevent_initial_call=True
 )
+@memoize_callback(version=lambda: results_store().token(), ttl=REPORT_PREVIEW_TTL, ignore=('n_clicks',))
 def update_report_content(n_clicks, time_range, equipment, report_type, variables, start_date, end_date):
     if n_clicks is None:
         raise PreventUpdate
     
     try:
         # Load data
-        with open('mock_results.json', 'r') as f:
-            data = json.load(f)
+        data = load_report_data()
         
-        # Filter data based on selections
-        filtered_data = {
-            'top_variables': {},
-            'top_impact': {},
-            'setpoint_impact_summary': {}
-        }
+        start, end = resolve_window(time_range, start_date, end_date)
+        filtered_data = filter_report_data(data, equipment, variables, start, end)
         
-        # Only include selected variables
-        for var in variables:
-            var_title = var.replace('_', ' ').title()
-            if var_title in data['top_variables']:
-                filtered_data['top_variables'][var_title] = data['top_variables'][var_title]
-            if var_title in data['top_impact']:
-                filtered_data['top_impact'][var_title] = data['top_impact'][var_title]
-            if var_title in data['setpoint_impact_summary']:
-                filtered_data['setpoint_impact_summary'][var_title] = data['setpoint_impact_summary'][var_title]
-        
-        # Filter equipment if needed
-        if equipment != 'all' and 'simulated_summary' in data:
-            filtered_data['simulated_summary'] = {
-                'simulated_data': [
-                    scenario for scenario in data['simulated_summary']['simulated_data']
-                    if scenario['equipment'].lower() == equipment
-                ]
-            }
+        # The download usually follows the preview, so its AI insights start generating now
+        with_ai = needs_insights(report_type) and bool(COHERE_API_KEY)
+        if with_ai:
+            prefetch_insights(filtered_data)
+        sections = REPORT_SECTIONS.get(report_type, REPORT_SECTIONS['full'])
         
         # Generate report preview
         return dbc.Alert([
@@ -437,7 +540,15 @@ def update_report_content(n_clicks, time_range, equipment, report_type, variable
             html.P(f"Time Range: {time_range} days" if time_range != 'custom' else f"Custom Range: {start_date} to {end_date}"),
             html.P(f"Equipment: {equipment.replace('_', ' ').title()}"),
             html.P(f"Report Type: {report_type.replace('_', ' ').title()}"),
-            html.P(f"Variables: {', '.join(var.replace('_', ' ').title() for var in variables)}")
+            html.P(f"Variables: {', '.join(var.replace('_', ' ').title() for var in variables)}"),
+            html.P(f"Sections: {', '.join(section.title() for section in sections)}"),
+            html.P(describe_prompt(build_report_prompt(filtered_data)) if with_ai else "AI analysis: not included"),
+            html.Hr(),
+            html.H5("Results in Window"),
+            html.Ul([
+                html.Li(format_window_stats(name, stats))
+                for name, stats in filtered_data['window_summary']['columns'].items()
+            ])
         ], color="info")
             
     except Exception as e:
@@ -445,8 +556,22 @@ def update_report_content(n_clicks, time_range, equipment, report_type, variable
         print(traceback.format_exc())
         return dbc.Alert(f"Error generating report preview: {str(e)}", color="danger")
 
+def render_report_file(spec, path):
+    """Render the PDF for a saved download selection into path (a file name or binary file)"""
+    data = load_report_data()
+    start, end = resolve_window(spec['time_range'], spec['start_date'], spec['end_date'])
+    filtered_data = filter_report_data(data, spec['equipment'], spec['variables'], start, end)
+
+    # Scenario rows for one piece of equipment stream from the results store into the PDF
+    scenarios = scenario_count = None
+    if spec['equipment'] != 'all':
+        scenarios = iter_scenarios(spec['equipment'], start, end)
+        scenario_count = filtered_data['window_summary']['columns'][KPI_COLUMN]['count']
+    render_pdf_report(filtered_data, path, True, scenarios, scenario_count, spec['report_type'])
+
 @callback(
-    Output("download-pdf", "data"),
+    [Output("download-pdf-link", "href"),
+     Output("download-pdf-link", "children")],
     [Input("download-button", "n_clicks")],
     [State("time-range", "value"),
      State("equipment", "value"),
@@ -459,48 +584,41 @@ def update_report_content(n_clicks, time_range, equipment, report_type, variable
 def download_report(n_clicks, time_range, equipment, report_type, variables, start_date, end_date):
     if n_clicks is None:
         raise PreventUpdate
-    
-    try:
-        # Load data
-        with open('mock_results.json', 'r') as f:
-            data = json.load(f)
-        
-        # Filter data based on selections
-        filtered_data = {
-            'top_variables': {},
-            'top_impact': {},
-            'setpoint_impact_summary': {}
-        }
-        
-        # Only include selected variables
-        for var in variables:
-            var_title = var.replace('_', ' ').title()
-            if var_title in data['top_variables']:
-                filtered_data['top_variables'][var_title] = data['top_variables'][var_title]
-            if var_title in data['top_impact']:
-                filtered_data['top_impact'][var_title] = data['top_impact'][var_title]
-            if var_title in data['setpoint_impact_summary']:
-                filtered_data['setpoint_impact_summary'][var_title] = data['setpoint_impact_summary'][var_title]
-        
-        # Filter equipment if needed
-        if equipment != 'all' and 'simulated_summary' in data:
-            filtered_data['simulated_summary'] = {
-                'simulated_data': [
-                    scenario for scenario in data['simulated_summary']['simulated_data']
-                    if scenario['equipment'].lower() == equipment
-                ]
-            }
-        
-        # Generate PDF
-        pdf_base64 = create_pdf_report(filtered_data, include_ai=True)
-        return dict(
-            content=pdf_base64,
-            filename=f'process_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
-            type='application/pdf',
-            base64=True
+
+    # The selection is saved in the shared cache; the PDF is rendered and streamed by the route
+    report_id = uuid.uuid4().hex
+    spec = {"time_range": time_range, "equipment": equipment, "report_type": report_type,
+            "variables": variables, "start_date": start_date, "end_date": end_date}
+    get_cache().set(REPORT_DOWNLOAD_NAMESPACE, report_id, value=spec, ttl=REPORT_DOWNLOAD_TTL)
+    return f"/report/download/{report_id}.pdf", "Download process_report.pdf"
+
+def register_report_routes(server):
+    """
+    Attach the route streaming rendered PDF reports to the Flask server.
+
+    The report, AI insights included, is rendered inside the request, so a
+    download holds its worker until the PDF is written: GUNICORN_TIMEOUT (120
+    seconds by default) must stay above the slowest report.
+    """
+
+    @server.route("/report/download/<report_id>.pdf")
+    def download_report_file(report_id):
+        spec = get_cache().get(REPORT_DOWNLOAD_NAMESPACE, report_id)
+        if spec is None:
+            abort(404)
+        # An unnamed temporary file, deleted by the system when the response closes it
+        report = tempfile.TemporaryFile(suffix='.pdf')
+        try:
+            render_report_file(spec, report)
+            report.seek(0)
+        except Exception as e:
+            report.close()
+            print(f"Error generating PDF: {str(e)}")
+            print(traceback.format_exc())
+            abort(500)
+        return send_file(
+            report,
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f'process_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
         )
-            
-    except Exception as e:
-        print(f"Error generating PDF: {str(e)}")
-        print(traceback.format_exc())
-        return None
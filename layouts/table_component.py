@@ -1,12 +1,39 @@
+import time
 import dash_ag_grid as dag
-from dash import html
+from dash import html, dcc, callback, Input, Output, State
 import dash_bootstrap_components as dbc
-import pandas as pd
 import os
+from utils.composition import QueryError, get_composition_index
+from utils.grid_export import FORMAT_LABELS, available_formats, save_export, sort_model_from_state
 
 # Read the CSV file from the layouts directory
 csv_path = os.path.join(os.path.dirname(__file__), 'chemical_components.csv')
-data = pd.read_csv(csv_path).to_dict('records')
+
+# Most matching rows sent to the grid for one composition query
+MAX_QUERY_ROWS = 10000
+EXPORT_DATASET = "components"
+
+
+def catalogue_index():
+    return get_composition_index(csv_path)
+
+
+def catalogue_rows(query=None):
+    """Full catalogue DataFrame and the mask of rows a composition query keeps (None for all)"""
+    index = catalogue_index()
+    return index.frame, (index.mask(query) if query and query.strip() else None)
+
+
+def load_catalogue(limit=MAX_QUERY_ROWS):
+    """
+    First limit grid rows, built from the index's compact frame when requested,
+    and the status line; the export route covers the full catalogue
+    """
+    index = catalogue_index()
+    status = ""
+    if index.size > limit:
+        status = f"{index.size:,} components; showing the first {limit:,}"
+    return index.frame.iloc[:limit].to_dict('records'), status
 
 # Column definitions based on the CSV structure
 columnDefs = [
@@ -47,10 +74,18 @@ table_layout = html.Div([
     html.H2("Chemical Components Table", className="mb-4"),
     dbc.Card([
         dbc.CardBody([
+            dbc.Input(
+                id='composition-query',
+                placeholder='Composition query, e.g. C between 10 and 20 and contains O and not N '
+                            'and mw < 300 and hazard = Flammable',
+                debounce=True
+            ),
+            html.Div(id='composition-query-status', className="small text-muted mt-1 mb-2"),
+            # Filled by run_composition_query when the tab is shown
             dag.AgGrid(
                 id='data-table',
                 columnDefs=columnDefs,
-                rowData=data,
+                rowData=[],
                 columnSize="sizeToFit",
                 defaultColDef={
                     "resizable": True,
@@ -62,7 +97,62 @@ table_layout = html.Div([
                     "pagination": True,
                     "paginationPageSize": 10,
                 }
-            )
+            ),
+            dbc.Row([
+                dbc.Col([
+                    dcc.Dropdown(
+                        id='table-export-format',
+                        options=[{"label": FORMAT_LABELS[fmt], "value": fmt} for fmt in available_formats()],
+                        value="csv",
+                        clearable=False
+                    )
+                ], width=3),
+                dbc.Col([
+                    dbc.Button("Export", id="table-export-btn", color="secondary", className="me-2"),
+                    html.A(id="table-export-link", target="_blank")
+                ], width=9)
+            ], className="align-items-center mt-3"),
+            html.Div("Exports every row of the catalogue matching the current filters, query and sort, "
+                     "not just the rows loaded in the grid.", className="small text-muted mt-2")
         ])
     ])
 ])
+
+
+@callback(
+    [Output('data-table', 'rowData'),
+     Output('composition-query-status', 'children')],
+    Input('composition-query', 'value')
+)
+def run_composition_query(query):
+    if not query or not query.strip():
+        return load_catalogue()
+    started = time.perf_counter()
+    try:
+        index = catalogue_index()
+        rows, total = index.select(query, limit=MAX_QUERY_ROWS)
+    except QueryError as e:
+        return [], dbc.Alert(f"Invalid query: {str(e)}", color="warning", className="py-1 mb-0")
+    except Exception as e:
+        print(f"Composition Query Error: {str(e)}")
+        return [], dbc.Alert(f"Query failed: {str(e)}", color="danger", className="py-1 mb-0")
+    elapsed = (time.perf_counter() - started) * 1000
+    status = f"{total:,} of {index.size:,} components match ({elapsed:.1f} ms)"
+    if total > len(rows):
+        status += f"; showing the first {len(rows):,}"
+    return index.frame.iloc[rows].to_dict('records'), status
+
+
+@callback(
+    [Output('table-export-link', 'href'),
+     Output('table-export-link', 'children')],
+    Input('table-export-btn', 'n_clicks'),
+    [State('table-export-format', 'value'),
+     State('data-table', 'filterModel'),
+     State('data-table', 'columnState'),
+     State('composition-query', 'value')],
+    prevent_initial_call=True
+)
+def prepare_table_export(n_clicks, export_format, filter_model, column_state, query):
+    export_id = save_export(EXPORT_DATASET, filter_model, sort_model_from_state(column_state), query)
+    return f"/table/export/{export_id}.{export_format}", f"Download {EXPORT_DATASET}.{export_format}"
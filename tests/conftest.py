@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The shared cache and results store read their directories at import time,
+# so point them at a private directory before any test imports them
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="process_first_tests_"))
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.composition import CompositionIndex, QueryError, parse_formula, parse_query
+
+CATALOGUE = pd.DataFrame({
+    "formula": ["C2H5OH", "CH4", "Ca(OH)2", "CuSO4·5H2O", "C6H6", "NaCl", "not a formula", "C2H5OH"],
+    "molecular_weight": [46.07, 16.04, 74.09, 249.69, 78.11, 58.44, None, 46.07],
+    "hazard": ["Flammable", "flammable ", "Irritant", "Toxic", "Flammable", None, "Toxic", "Flammable"],
+})
+
+
+def test_parse_formula():
+    assert parse_formula("C2H5OH") == {"C": 2, "H": 6, "O": 1}
+    assert parse_formula("Ca(OH)2") == {"Ca": 1, "O": 2, "H": 2}
+    # The hydrate coefficient scales everything after the dot
+    assert parse_formula("CuSO4·5H2O") == {"Cu": 1, "S": 1, "O": 9, "H": 10}
+    for invalid in ("", "Xx2", "Ca(OH", "CaOH)2"):
+        with pytest.raises(ValueError):
+            parse_formula(invalid)
+
+
+def test_parse_query():
+    # Strict bounds on counts become inclusive integer bounds
+    assert parse_query("C > 2") == ("element", "C", 3, True, np.inf, True)
+    assert parse_query("C between 4 and 1") == ("element", "C", 1, True, 4, True)
+    assert parse_query("hazard in (Toxic, 'flammable')") == ("hazard", ("flammable", "toxic"))
+    assert parse_query("not (O or hazard is not Toxic)") == (
+        "not", ("or", ("element", "O", 1, True, np.inf, True), ("not", ("hazard", ("toxic",)))))
+    for invalid in ("", "c > 2", "C != 2", "C between 1", "(C", "mw > heavy"):
+        with pytest.raises(QueryError):
+            parse_query(invalid)
+
+
+# Rows with a valid formula, compared against a row-by-row evaluation
+VALID_ROWS = [0, 1, 2, 3, 4, 5, 7]
+
+
+def brute_force(predicate):
+    matches = []
+    for position in VALID_ROWS:
+        row = CATALOGUE.iloc[position]
+        hazard = (row.hazard or "").strip().lower()
+        matches.append(bool(predicate(parse_formula(row.formula), row.molecular_weight, hazard)))
+    return matches
+
+
+@pytest.mark.parametrize("query, predicate", [
+    ("C", lambda c, mw, hz: c.get("C", 0) >= 1),
+    ("H >= 6 and O", lambda c, mw, hz: c.get("H", 0) >= 6 and c.get("O", 0) >= 1),
+    ("not C", lambda c, mw, hz: c.get("C", 0) == 0),
+    ("mw < 60 or hazard = toxic", lambda c, mw, hz: mw < 60 or hz == "toxic"),
+    ("C = 0 and hazard != Irritant", lambda c, mw, hz: c.get("C", 0) == 0 and hz != "irritant"),
+])
+def test_index_matches_brute_force(query, predicate):
+    index = CompositionIndex.from_frame(CATALOGUE)
+    assert index.mask(query)[VALID_ROWS].tolist() == brute_force(predicate)
+
+
+def test_invalid_formula_matches_no_element_predicate():
+    index = CompositionIndex.from_frame(CATALOGUE)
+    assert not index.mask("C = 0")[6]
+    assert index.mask("hazard = toxic")[6]
+
+
+def test_select_and_mask_cache():
+    index = CompositionIndex.from_frame(CATALOGUE)
+    rows, total = index.select("C and hazard = flammable", limit=2)
+    assert rows.tolist() == [0, 1] and total == 4
+    misses = index.cache_info()["misses"]
+    # A refined query reuses the cached masks of its parts
+    index.select("C and hazard = flammable and H = 6")
+    info = index.cache_info()
+    # Only the new outer conjunction and H = 6 are evaluated
+    assert info["hits"] >= 1 and info["misses"] == misses + 2
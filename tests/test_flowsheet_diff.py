@@ -0,0 +1,56 @@
+from utils.flowsheet_diff import (ADDED_CLASS, MODIFIED_CLASS, REMOVED_CLASS, FlowsheetRevision, diff_counts,
+                                  diff_revisions, element_hash, overlay_elements)
+
+
+def flowsheet(count):
+    nodes = [{"id": str(i), "name": f"Unit {i}", "type": "type1", "area": f"area{i % 4}"} for i in range(count)]
+    edges = [{"id": f"{i}-{i + 1}", "source": str(i), "target": str(i + 1)} for i in range(count - 1)]
+    return nodes, edges
+
+
+def test_element_hash_ignores_key_order_and_status():
+    row = {"id": "1", "source": "a", "target": "b"}
+    assert element_hash(row) == element_hash(dict(reversed(list(row.items()))))
+    assert element_hash(row) == element_hash(dict(row, status="Creates recycle loop"))
+    assert element_hash(row) != element_hash(dict(row, target="c"))
+
+
+def test_equal_revisions_compare_no_regions():
+    nodes, edges = flowsheet(500)
+    diff = diff_revisions(FlowsheetRevision(nodes, edges), FlowsheetRevision(list(reversed(nodes)), edges))
+    assert diff_counts(diff) == {kind: {"added": 0, "removed": 0, "modified": 0} for kind in ("nodes", "edges")}
+    assert diff["regions"]["compared"] == 0
+
+
+def test_changes_are_found_in_the_changed_regions_only():
+    nodes, edges = flowsheet(500)
+    base = FlowsheetRevision(nodes, edges)
+    changed_nodes = [dict(row, name="Renamed") if row["id"] == "7" else row for row in nodes if row["id"] != "3"]
+    changed_nodes.append({"id": "new", "name": "New", "type": "type2"})
+    changed_edges = [row for row in edges if row["id"] != "2-3"] + [{"id": "new-0", "source": "new", "target": "0"}]
+    target = FlowsheetRevision(changed_nodes, changed_edges)
+
+    diff = diff_revisions(base, target)
+    assert diff["nodes"] == {"added": ["new"], "removed": ["3"], "modified": {"7": ["name"]}}
+    assert diff["edges"]["added"] == ["new-0"] and diff["edges"]["removed"] == ["2-3"]
+    assert 0 < diff["regions"]["compared"] <= 5 < diff["regions"]["total"]
+
+
+def test_moving_a_unit_between_areas_is_a_modification():
+    nodes, edges = flowsheet(50)
+    moved = [dict(row, area="elsewhere") if row["id"] == "10" else row for row in nodes]
+    diff = diff_revisions(FlowsheetRevision(nodes, edges), FlowsheetRevision(moved, edges))
+    assert diff["nodes"] == {"added": [], "removed": [], "modified": {"10": ["area"]}}
+
+
+def test_overlay_marks_changes_and_ghosts_removed_elements():
+    nodes, edges = flowsheet(5)
+    base = FlowsheetRevision(nodes, edges)
+    target = FlowsheetRevision([dict(nodes[0], name="Feed")] + nodes[1:4] + [{"id": "x", "name": "X"}],
+                               edges[:3] + [{"id": "3-x", "source": "3", "target": "x"}])
+    elements = overlay_elements(base, target, diff_revisions(base, target))
+    classes = {element["data"]["id"]: element.get("classes", "") for element in elements}
+    assert classes["0"] == MODIFIED_CLASS
+    assert classes["x"] == ADDED_CLASS and classes["3-x"] == ADDED_CLASS
+    assert classes["4"] == REMOVED_CLASS and classes["3-4"] == REMOVED_CLASS
+    assert classes["1"] == ""
@@ -0,0 +1,85 @@
+import base64
+import io
+import json
+import tracemalloc
+
+import pytest
+
+from utils import flowsheet_io
+from utils.flowsheet_io import WRITERS, FlowsheetBuilder, import_flowsheet, iter_graphml, read_graphml
+
+
+def upload(text, filename):
+    return f"data:application/octet-stream;base64,{base64.b64encode(text.encode()).decode()}", filename
+
+
+def test_duplicate_edge_ids_are_renamed_and_reported():
+    text = "".join(iter_graphml([{"id": "1"}, {"id": "2"}],
+                                [{"id": "e", "source": "1", "target": "2"}] * 3))
+    nodes, edges, errors, renamed = import_flowsheet(*upload(text, "plant.graphml"))
+    assert [edge["id"] for edge in edges] == ["e", "e-2", "e-3"]
+    assert renamed == ["e -> e-2", "e -> e-3"]
+    assert errors == []
+
+
+def graphml_peak(count):
+    nodes = [{"id": str(i), "name": f"N{i}", "type": "t"} for i in range(count)]
+    edges = [{"id": f"e{i}", "source": str(i), "target": str(i + 1)} for i in range(count - 1)]
+    data = "".join(iter_graphml(nodes, edges)).encode()
+    builder = FlowsheetBuilder()
+    # The records are dropped so only the parser's own memory is measured
+    builder.add_node = builder.add_edge = lambda record: None
+    tracemalloc.start()
+    try:
+        read_graphml(io.BytesIO(data), builder)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_graphml_parse_memory_does_not_grow_with_the_file():
+    assert graphml_peak(20000) < 2 * graphml_peak(5000)
+
+
+def round_trip(fmt, nodes, edges):
+    text = "".join(WRITERS[fmt](nodes, edges))
+    return import_flowsheet(*upload(text, f"plant.{fmt}"))
+
+
+def test_every_format_round_trips():
+    nodes = [{"id": "1", "name": "Feed & Mix", "type": "type1", "area": "North"},
+             {"id": "2", "name": 'Column "A"', "type": "type2"}]
+    edges = [{"id": "1-2", "source": "1", "target": "2"}]
+    for fmt in WRITERS:
+        assert round_trip(fmt, nodes, edges) == (nodes, edges, [], [])
+
+
+def test_json_values_split_across_reads(monkeypatch):
+    # Reads of a few characters split keys, strings and numbers between buffers
+    monkeypatch.setattr(flowsheet_io, "READ_CHUNK_SIZE", 3)
+    text = json.dumps({"version": 12345, "elements": [
+        {"data": {"id": "10", "name": "Reactor"}}, {"data": {"id": "20"}},
+        {"data": {"source": "10", "target": "20"}}]})
+    nodes, edges, errors, _ = import_flowsheet(*upload(text, "plant.json"))
+    assert [node["id"] for node in nodes] == ["10", "20"]
+    assert edges == [{"id": "10-20", "source": "10", "target": "20"}]
+    with pytest.raises(ValueError):
+        import_flowsheet(*upload('{"nodes": [{"id": 1}', "plant.json"))
+
+
+def test_invalid_records_are_skipped_with_a_reason():
+    text = ("kind,id,name,type,area,source,target\n"
+            "edge,early,,,,1,2\n"
+            "node,1,Feed,,,,\n"
+            "node,1,Again,,,,\n"
+            "node,,Nameless,,,,\n"
+            "node,2,,,,,\n"
+            "edge,dangling,,,,2,9\n")
+    nodes, edges, errors, _ = import_flowsheet(*upload(text, "plant.csv"))
+    assert [node["id"] for node in nodes] == ["1", "2"]
+    # An edge declared before its nodes is kept once they arrive
+    assert [edge["id"] for edge in edges] == ["early"]
+    assert errors == ["Duplicate node id 1 skipped", "Node without an id skipped",
+                      "Edge dangling references unknown node 9"]
+    with pytest.raises(ValueError):
+        import_flowsheet(*upload(text, "plant.txt"))
@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import grid_export
+from utils.grid_export import filter_mask, iter_csv, sort_model_from_state, sorted_rows
+
+FRAME = pd.DataFrame({
+    "name": ["Water", "methanol", None, "Ethanol", "Benzene", "water "],
+    "mw": [18.02, 32.04, 46.07, np.nan, 78.11, 18.02],
+    "hazard": ["None", "Flammable", "Flammable", "Flammable", "Toxic", "None"],
+})
+
+
+def test_text_filters_ignore_case():
+    contains = filter_mask(FRAME, {"name": {"filterType": "text", "type": "contains", "filter": "ANOL"}})
+    assert contains.tolist() == [False, True, False, True, False, False]
+    starts = filter_mask(FRAME, {"name": {"filterType": "text", "type": "startsWith", "filter": "w"}})
+    assert starts.tolist() == [True, False, False, False, False, True]
+    blank = filter_mask(FRAME, {"name": {"filterType": "text", "type": "blank"}})
+    assert blank.tolist() == [False, False, True, False, False, False]
+
+
+def test_number_set_and_combined_filters():
+    in_range = {"filterType": "number", "type": "inRange", "filter": 20, "filterTo": 80}
+    assert filter_mask(FRAME, {"mw": in_range}).tolist() == [False, True, True, False, True, False]
+    either = {"filterType": "number", "operator": "OR", "conditions": [
+        {"filterType": "number", "type": "lessThan", "filter": 20},
+        {"filterType": "number", "type": "greaterThan", "filter": 70}]}
+    assert filter_mask(FRAME, {"mw": either}).tolist() == [True, False, False, False, True, True]
+    both = filter_mask(FRAME, {"mw": in_range, "hazard": {"filterType": "set", "values": ["Flammable"]}})
+    assert both.tolist() == [False, True, True, False, False, False]
+    with pytest.raises(ValueError):
+        filter_mask(FRAME, {"missing": in_range})
+
+
+def test_sorting_matches_the_grid():
+    rows = np.arange(len(FRAME))
+    # Blanks first ascending, last descending
+    assert sorted_rows(FRAME, rows, [{"colId": "mw", "sort": "asc"}]).tolist()[0] == 3
+    assert sorted_rows(FRAME, rows, [{"colId": "mw", "sort": "desc"}]).tolist() == [4, 2, 1, 0, 5, 3]
+    by_hazard_then_mw = [{"colId": "hazard", "sort": "asc"}, {"colId": "mw", "sort": "desc"}]
+    assert sorted_rows(FRAME, rows, by_hazard_then_mw).tolist() == [2, 1, 3, 0, 5, 4]
+    # Only the filtered rows are reordered
+    assert sorted_rows(FRAME, np.array([5, 1, 4]), [{"colId": "name", "sort": "asc"}]).tolist() == [4, 1, 5]
+
+
+def test_sort_model_from_column_state():
+    state = [{"colId": "name", "sort": None}, {"colId": "mw", "sort": "desc", "sortIndex": 1},
+             {"colId": "hazard", "sort": "asc", "sortIndex": 0}]
+    assert sort_model_from_state(state) == [{"colId": "hazard", "sort": "asc"}, {"colId": "mw", "sort": "desc"}]
+
+
+def test_csv_chunks_join_into_one_file(monkeypatch):
+    monkeypatch.setattr(grid_export, "EXPORT_CHUNK_ROWS", 2)
+    rows = np.array([4, 0, 2, 5, 1])
+    exported = b"".join(iter_csv(FRAME, rows))
+    assert exported == FRAME.iloc[rows].to_csv(index=False).encode()
+    assert pd.read_csv(io.BytesIO(b"".join(iter_csv(FRAME, rows[:0])))).columns.tolist() == list(FRAME.columns)
@@ -0,0 +1,36 @@
+import numpy as np
+
+from utils.impact_analysis import permutation_importance
+
+
+class FixedPermutation:
+    def __init__(self, order):
+        self.order = np.array(order)
+
+    def permutation(self, n):
+        return self.order
+
+
+def test_permutation_importance_matches_the_mse_increase():
+    # y = 2x plus a residual of 0.5 on the first row; swapping neighbours moves
+    # each prediction by -+4, so the MSE goes from 0.25/4 to (4.5^2 + 3 * 4^2)/4
+    Xs = np.array([[1.0], [-1.0], [1.0], [-1.0]])
+    beta = np.array([2.0])
+    ys = np.array([2.5, -2.0, 2.0, -2.0])
+    importance = permutation_importance(Xs, ys, beta, FixedPermutation([1, 0, 3, 2]))
+    assert np.isclose(importance[0], 17.0)
+
+
+def test_permutation_importance_equals_the_brute_force_increase():
+    rng = np.random.default_rng(0)
+    Xs = rng.standard_normal((200, 3))
+    beta = np.array([1.0, -0.5, 0.2])
+    ys = Xs @ beta + rng.standard_normal(200)
+    order = np.random.default_rng(1).permutation(200)
+    importance = permutation_importance(Xs, ys, beta, FixedPermutation(order))
+    base = np.mean((ys - Xs @ beta) ** 2)
+    for j in range(3):
+        shuffled = Xs.copy()
+        shuffled[:, j] = Xs[order, j]
+        expected = max(0.0, np.mean((ys - shuffled @ beta) ** 2) - base)
+        assert np.isclose(importance[j], expected)
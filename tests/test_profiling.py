@@ -0,0 +1,13 @@
+from collections import Counter
+
+from utils import profiling
+from utils.shared_cache import get_cache
+
+
+def test_each_sampler_result_takes_its_own_slot():
+    cache = get_cache()
+    for pid in (101, 102, 103):
+        profiling._store_stacks(cache, "job-slots", (Counter({f"worker-{pid};main": 1}), pid))
+    results = profiling._collect_stacks(cache, "job-slots")
+    assert [samples for _, samples in results] == [101, 102, 103]
+    assert profiling._collect_stacks(cache, "job-unknown") == []
@@ -0,0 +1,32 @@
+from utils.prompt_builder import (MAX_OUTPUT_TOKENS, OUTPUT_SECTIONS, OUTPUT_TOKENS_PER_SECTION,
+                                  PROMPT_FOOTER, build_insights_prompt)
+
+
+def report_data(count):
+    names = [f"var_{i}" for i in range(count)]
+    return {
+        "top_impact": {name: 1.0 / (i + 2) for i, name in enumerate(names)},
+        "top_variables": {name: {"value": i, "unit": "K"} for i, name in enumerate(names)},
+    }
+
+
+def test_output_budget_covers_every_section():
+    plan = build_insights_prompt(report_data(3))
+    assert len(plan["detailed"]) == 3
+    # The previous fixed limit for the default selection; the risk section must still fit
+    assert plan["max_tokens"] >= 800
+    assert plan["max_tokens"] >= OUTPUT_SECTIONS * OUTPUT_TOKENS_PER_SECTION
+
+
+def test_output_budget_grows_with_detailed_variables():
+    few = build_insights_prompt(report_data(2))
+    many = build_insights_prompt(report_data(8))
+    assert len(many["detailed"]) > len(few["detailed"])
+    assert few["max_tokens"] < many["max_tokens"] <= MAX_OUTPUT_TOKENS
+
+
+def test_risk_assessment_is_the_last_section():
+    plan = build_insights_prompt(report_data(20))
+    body = plan["prompt"][:-len(PROMPT_FOOTER)]
+    assert body.rindex("4. RISK ASSESSMENT") > body.rindex("3. TECHNICAL RECOMMENDATIONS")
+    assert "var_0: [range]" in body[body.rindex("4. RISK ASSESSMENT"):]
@@ -0,0 +1,30 @@
+import pytest
+
+from utils.results_store import equipment_key
+
+report_generation = pytest.importorskip("layouts.report_generation")
+
+
+def test_cleared_time_range_falls_back_to_the_default_window():
+    start, end = report_generation.resolve_window(None, None, None)
+    default_start, default_end = report_generation.resolve_window(report_generation.DEFAULT_TIME_RANGE, None, None)
+    assert abs((end - start) - (default_end - default_start)) < 1
+
+
+def _find(component, component_id):
+    if getattr(component, "id", None) == component_id:
+        return component
+    children = getattr(component, "children", None)
+    for child in children if isinstance(children, list) else [children]:
+        if child is not None and not isinstance(child, str):
+            found = _find(child, component_id)
+            if found is not None:
+                return found
+    return None
+
+
+def test_equipment_options_match_normalized_names():
+    dropdown = _find(report_generation.layout(), "equipment")
+    for option in dropdown.options:
+        if option["value"] != "all":
+            assert option["value"] == equipment_key(option["label"])
@@ -0,0 +1,55 @@
+import numpy as np
+
+from utils.results_store import ResultsStore
+from utils.rollups import WindowRollups, reduce_groups
+
+
+def test_reduce_groups_ignores_nan():
+    values = np.array([[1.0, np.nan], [3.0, 2.0], [5.0, 4.0]])
+    groups, stats = reduce_groups(values, np.array([1, 0, 1]))
+    assert groups.tolist() == [0, 1]
+    # count, sum, min, max per column
+    assert stats[1, 0].tolist() == [2, 6.0, 1.0, 5.0]
+    assert stats[1, 1].tolist() == [1, 4.0, 4.0, 4.0]
+
+
+def _store(tmp_path, **limits):
+    store = ResultsStore(str(tmp_path / "results"), **limits)
+    store.load_baseline({}, "empty", 0.0)
+    return store
+
+
+def test_window_uses_buckets_and_raw_edges(tmp_path):
+    store = _store(tmp_path)
+    rollups = WindowRollups(store)
+    # One row every 10 minutes over two days, shuffled to check rows are time-ordered on append
+    timestamps = np.arange(0, 2 * 86400, 600, dtype=float)
+    order = np.random.default_rng(0).permutation(len(timestamps))
+    kpi = timestamps / 600
+    equipment = np.where(np.arange(len(kpi)) % 2, "Reactor A", "Pump")
+    store.append(equipment[order], ["T"], kpi[order], kpi[order], timestamps=timestamps[order])
+
+    start, end = 1800.0, 86400 + 7200 + 1200
+    summary = rollups.summarize(start, end)
+    inside = (timestamps >= start) & (timestamps < end)
+    assert summary["columns"]["KPI"]["count"] == inside.sum()
+    assert np.isclose(summary["columns"]["KPI"]["mean"], kpi[inside].mean())
+    assert summary["columns"]["KPI"]["min"] == kpi[inside].min()
+    assert summary["buckets"]["raw_hours"] == 2
+
+    reactor = rollups.summarize(start, end, "reactor_a")
+    assert reactor["columns"]["KPI"]["count"] == (inside & (equipment == "Reactor A")).sum()
+
+
+def test_pruned_chunks_are_dropped_without_a_rebuild(tmp_path):
+    store = _store(tmp_path, max_rows=25)
+    rollups = WindowRollups(store)
+    generation = store.generation
+    for batch in range(4):
+        store.append(["Pump"] * 10, ["T"], np.zeros(10), np.full(10, float(batch)), timestamps=np.full(10, 100.0))
+    # 40 rows against a cap of 25 prune down to 22.5, keeping the last two batches
+    assert store.generation == generation
+    assert len(store) == 20
+    summary = rollups.summarize(0, 3600)
+    assert summary["columns"]["KPI"]["count"] == 20
+    assert summary["columns"]["KPI"]["min"] == 2.0
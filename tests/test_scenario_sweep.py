@@ -0,0 +1,27 @@
+import numpy as np
+
+from benchmarks.synthetic import make_flowsheet
+from utils.scenario_sweep import MAX_SWEEP_ROWS, PARALLEL_THRESHOLD, grid_design, run_sweep
+
+
+def test_grid_design_varies_every_setpoint():
+    for n, dimensions in [(10, 3), (5, 3), (1000, 3), (2000, 3), (7, 1)]:
+        design = grid_design(n, dimensions)
+        assert 1 <= len(design) <= n
+        assert all(len(np.unique(design[:, d])) > 1 for d in range(dimensions))
+
+
+def test_parallel_threshold_is_reachable_under_the_row_cap():
+    assert PARALLEL_THRESHOLD * 4 <= MAX_SWEEP_ROWS
+
+
+def test_normal_sized_sweep_uses_the_pool():
+    nodes, edges = make_flowsheet(50)
+    scenarios = PARALLEL_THRESHOLD // 50 + 2000
+    summary = run_sweep(nodes, edges, design="latin_hypercube", n_scenarios=scenarios, workers=2)
+    assert summary["workers"] == 2
+    assert summary["rows"] == scenarios * 50
+
+    serial = run_sweep(nodes, edges, design="latin_hypercube", n_scenarios=scenarios, workers=1)
+    assert serial["workers"] == 1
+    assert serial["best_kpi"] == summary["best_kpi"]
@@ -0,0 +1,44 @@
+import os
+import time
+
+import pytest
+
+from utils import shared_cache
+from utils.shared_cache import SharedCache, SQLiteBackend, private_directory
+
+
+def test_private_directory_creates_parents_owner_only(tmp_path):
+    path = tmp_path / "cache" / "results"
+    private_directory(str(path))
+    assert os.stat(path).st_mode & 0o777 == 0o700
+    assert os.stat(path.parent).st_mode & 0o777 == 0o700
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_private_directory_refuses_a_shared_directory(tmp_path):
+    path = tmp_path / "shared"
+    path.mkdir(mode=0o777)
+    os.chmod(path, 0o777)
+    with pytest.raises(RuntimeError):
+        private_directory(str(path))
+
+
+def test_reads_do_not_rewrite_recent_access_times(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache"))
+    cache = SharedCache(backend)
+    cache.set("ns", "key", value={"a": 1})
+    conn = backend._connect()
+    before = conn.execute("SELECT accessed FROM entries").fetchone()[0]
+    assert cache.get("ns", "key") == {"a": 1}
+    assert conn.execute("SELECT accessed FROM entries").fetchone()[0] == before
+
+    conn.execute("UPDATE entries SET accessed = ?", (time.time() - shared_cache.ACCESS_RESOLUTION - 1,))
+    cache.get("ns", "key")
+    assert conn.execute("SELECT accessed FROM entries").fetchone()[0] > before - 1
+
+
+def test_invalidate_hides_older_entries(tmp_path):
+    cache = SharedCache(SQLiteBackend(str(tmp_path / "cache")))
+    cache.set("ns", "key", value=1)
+    cache.invalidate("ns")
+    assert cache.get("ns", "key", default=None) is None
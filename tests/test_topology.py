@@ -0,0 +1,81 @@
+import pytest
+
+from utils.topology import (CYCLE_REASON, UNKNOWN_NODE_REASON, CycleError, FlowTopology, build_topology,
+                            drop_topology, get_topology)
+
+
+def rows(node_ids, edges):
+    return ([{"id": node_id} for node_id in node_ids],
+            [{"id": f"{source}-{target}", "source": source, "target": target} for source, target in edges])
+
+
+def assert_ordered(topology, edges):
+    position = {node: i for i, node in enumerate(topology.topological_order())}
+    for source, target in edges:
+        assert position[source] < position[target]
+
+
+def test_inserts_against_the_order_are_renumbered():
+    topology = FlowTopology()
+    for node in "abcde":
+        topology.add_node(node)
+    # Every edge points backwards in insertion order, so each insert reorders
+    edges = [("e", "d"), ("d", "c"), ("c", "b"), ("b", "a"), ("e", "a")]
+    for source, target in edges:
+        topology.add_edge(f"{source}{target}", source, target)
+    assert topology.topological_order() == ["e", "d", "c", "b", "a"]
+    assert topology.downstream("c") == {"b", "a"}
+    assert topology.upstream("c") == {"e", "d"}
+
+
+def test_loop_is_rejected_and_retried_when_it_opens():
+    topology = build_topology(*rows("abc", [("a", "b"), ("b", "c")]))
+    with pytest.raises(CycleError) as error:
+        topology.add_edge("c-a", "c", "a")
+    assert error.value.path == ["c", "a", "b", "c"]
+
+    assert topology.set_edge("c-a", "c", "a") == CYCLE_REASON
+    assert topology.rejected == {"c-a": CYCLE_REASON}
+    assert topology.edge_count == 3
+    # Removing a-b breaks the loop, so the rejected edge is admitted
+    topology.remove_edge("a-b")
+    assert topology.rejected == {}
+    assert_ordered(topology, [("b", "c"), ("c", "a")])
+
+
+def test_edge_to_an_unknown_node_waits_for_the_node():
+    topology = build_topology(*rows("ab", [("a", "b")]))
+    assert topology.set_edge("b-x", "b", "x") == UNKNOWN_NODE_REASON
+    topology.add_node("x")
+    assert topology.edge_status("b-x") == ""
+    assert topology.downstream("a") == {"b", "x"}
+
+
+def test_remove_node_drops_its_edges():
+    topology = build_topology(*rows("abc", [("a", "b"), ("b", "c")]))
+    assert sorted(topology.remove_node("b")) == ["a-b", "b-c"]
+    assert topology.node_count == 2 and topology.edge_count == 0
+    assert topology.downstream("a") == frozenset()
+
+
+def test_signature_ignores_insertion_order():
+    edges = [("a", "b"), ("b", "c"), ("c", "a"), ("a", "d")]
+    forward = build_topology(*rows("abcd", edges))
+    backward = build_topology(*[list(reversed(part)) for part in rows("abcd", edges)])
+    assert forward.signature == backward.signature
+    forward.remove_edge("a-d")
+    assert forward.signature != backward.signature
+    forward.set_edge("a-d", "a", "d")
+    assert forward.signature == backward.signature
+
+
+def test_cached_topology_is_rebuilt_on_a_signature_mismatch():
+    node_rows, edge_rows = rows("abc", [("a", "b"), ("b", "c")])
+    topology = get_topology("test-token", node_rows, edge_rows)
+    assert get_topology("test-token", node_rows, edge_rows, topology.signature) is topology
+    # Another worker moved an edge: same counts, different structure
+    moved = edge_rows[:1] + [{"id": "b-c", "source": "a", "target": "c"}]
+    rebuilt = get_topology("test-token", node_rows, moved, build_topology(node_rows, moved).signature)
+    assert rebuilt is not topology
+    assert rebuilt.downstream("b") == frozenset()
+    drop_topology("test-token")
@@ -0,0 +1,125 @@
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+from dash import callback_context
+
+from utils.shared_cache import make_key
+
+# Outputs kept per memoized function
+DEFAULT_MEMO_SIZE = 128
+
+_MISSING = object()
+
+
+class CallbackMemo:
+    """Bounded LRU of one function's outputs, with optional expiry and hit/miss counts"""
+
+    def __init__(self, name, maxsize=DEFAULT_MEMO_SIZE, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return _MISSING
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            calls = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                    "maxsize": self.maxsize, "hit_rate": self.hits / calls if calls else 0.0}
+
+
+_memos = {}
+_memos_lock = threading.Lock()
+
+
+def _triggered():
+    # Inputs that fired the current callback; outside a callback there are none
+    try:
+        return sorted(callback_context.triggered_prop_ids)
+    except Exception:
+        return None
+
+
+def memoize_callback(maxsize=DEFAULT_MEMO_SIZE, version=None, ttl=None, ignore=(), by_trigger=True):
+    """
+    Serve repeated calls of a pure callback (or figure builder) from memory.
+
+    The key hashes the normalized arguments, the triggering inputs (unless
+    by_trigger is False, e.g. for figure builders) and the token returned by
+    version(), so outputs are reused only while the data they were built from
+    is unchanged. ignore names arguments left out of the key, such as a
+    button's n_clicks. ttl (seconds) bounds how long an output is served, for
+    outputs that also depend on the clock. Place the decorator below @callback
+    so Dash registers the memoized function; cached outputs are shared between
+    calls and must not be mutated.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        parameters = list(inspect.signature(func).parameters)
+        skipped = {parameters.index(arg) for arg in ignore if arg in parameters}
+        memo = CallbackMemo(name, maxsize, ttl)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(
+                [arg for i, arg in enumerate(args) if i not in skipped],
+                {k: v for k, v in kwargs.items() if k not in ignore},
+                _triggered() if by_trigger else None,
+                version() if version else None,
+            )
+            value = memo.get(key)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                memo.put(key, value)
+            return value
+
+        wrapper.invalidate = memo.clear
+        wrapper.cache_stats = memo.stats
+        with _memos_lock:
+            _memos[name] = memo
+        return wrapper
+    return decorator
+
+
+def invalidate(name=None):
+    """Drop the memoized outputs of one function (by module.qualname) or of all of them"""
+    with _memos_lock:
+        memos = [_memos[name]] if name is not None else list(_memos.values())
+    for memo in memos:
+        memo.clear()
+
+
+def memo_stats():
+    """Hit/miss counts and sizes of every memoized function, by module.qualname"""
+    with _memos_lock:
+        memos = list(_memos.values())
+    return {memo.name: memo.stats() for memo in memos}
@@ -0,0 +1,411 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.shared_cache import file_version
+from utils.preload import compact_frame
+
+ELEMENTS = frozenset("""
+H He Li Be B C N O F Ne Na Mg Al Si P S Cl Ar K Ca Sc Ti V Cr Mn Fe Co Ni Cu Zn Ga Ge As Se Br Kr
+Rb Sr Y Zr Nb Mo Tc Ru Rh Pd Ag Cd In Sn Sb Te I Xe Cs Ba La Ce Pr Nd Pm Sm Eu Gd Tb Dy Ho Er Tm Yb
+Lu Hf Ta W Re Os Ir Pt Au Hg Tl Pb Bi Po At Rn Fr Ra Ac Th Pa U Np Pu Am Cm Bk Cf Es Fm Md No Lr
+Rf Db Sg Bh Hs Mt Ds Rg Cn Nh Fl Mc Lv Ts Og D
+""".split())
+
+# Names the molecular weight can be queried by
+WEIGHT_FIELDS = ("mw", "molecular_weight", "weight")
+HAZARD_FIELD = "hazard"
+
+# Memory held by cached predicate masks, and the most parsed queries kept
+MASK_CACHE_BYTES = 64 * 1024 * 1024
+MAX_PARSED_QUERIES = 256
+
+FORMULA_TOKEN = re.compile(r"([A-Z][a-z]?)(\d*)|(\()|(\))(\d*)|[.·*](\d*)|(\s+)")
+QUERY_TOKEN = re.compile(r"""\s*(?:(\d+(?:\.\d+)?)|(>=|<=|!=|==|[<>=(),:])|"([^"]*)"|'([^']*)'|([A-Za-z][\w\-]*))""")
+KEYWORDS = {"and", "or", "not", "contains", "has", "between", "in", "is"}
+COMPARISONS = {">", ">=", "<", "<=", "=", "==", "!=", ":", "is"}
+
+
+class QueryError(ValueError):
+    """Raised for a composition query that cannot be parsed"""
+
+
+def parse_formula(formula):
+    """
+    Element counts of a formula such as C2H5OH, Ca(OH)2 or CuSO4·5H2O.
+    Raises ValueError for anything that is not a formula.
+    """
+    stack = [{}]
+    multiplier = 1
+    position = 0
+    text = str(formula).strip()
+    if not text:
+        raise ValueError("Empty formula")
+    while position < len(text):
+        match = FORMULA_TOKEN.match(text, position)
+        if not match:
+            raise ValueError(f"Unexpected '{text[position]}' in formula {text}")
+        symbol, count, opening, closing, group_count, hydrate = match.group(1, 2, 3, 4, 5, 6)
+        if symbol:
+            if symbol not in ELEMENTS:
+                raise ValueError(f"Unknown element {symbol} in formula {text}")
+            stack[-1][symbol] = stack[-1].get(symbol, 0) + multiplier * int(count or 1)
+        elif opening:
+            stack.append({})
+        elif closing:
+            if len(stack) == 1:
+                raise ValueError(f"Unbalanced ')' in formula {text}")
+            group = stack.pop()
+            for element, n in group.items():
+                stack[-1][element] = stack[-1].get(element, 0) + n * int(group_count or 1)
+        elif hydrate is not None:
+            # Everything after a hydrate dot is scaled by its leading coefficient
+            multiplier = int(hydrate or 1)
+        position = match.end()
+    if len(stack) != 1:
+        raise ValueError(f"Unbalanced '(' in formula {text}")
+    return stack[0]
+
+
+# Query parsing: predicates become tuples, so equal predicates share cached masks
+#   ("element", symbol, low, low_inclusive, high, high_inclusive)
+#   ("weight", low, low_inclusive, high, high_inclusive)
+#   ("hazard", (lowercased values...))
+#   ("not", node), ("and", left, right), ("or", left, right)
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = QUERY_TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise QueryError(f"Unexpected '{text[position:].strip()[:10]}' at position {position}")
+        number, operator, double, single, word = match.groups()
+        if number is not None:
+            tokens.append(("number", float(number)))
+        elif operator is not None:
+            tokens.append(("op", operator))
+        elif double is not None or single is not None:
+            tokens.append(("string", double if double is not None else single))
+        else:
+            tokens.append(("word", word))
+        position = match.end()
+    return tokens
+
+
+def _bounds(operator, value):
+    # (low, low inclusive, high, high inclusive) for a comparison
+    if operator in (">", ">="):
+        return value, operator == ">=", np.inf, True
+    if operator in ("<", "<="):
+        return -np.inf, True, value, operator == "<="
+    return value, True, value, True
+
+
+class _QueryParser:
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise QueryError("Empty query")
+        node = self._or()
+        if self.position < len(self.tokens):
+            raise QueryError(f"Unexpected '{self.tokens[self.position][1]}'")
+        return node
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _next(self, expected=None):
+        kind, value = self._peek()
+        if kind is None:
+            raise QueryError("Query ends early" + (f", expected {expected}" if expected else ""))
+        self.position += 1
+        return kind, value
+
+    def _keyword(self, *words):
+        kind, value = self._peek()
+        if kind == "word" and value.lower() in words:
+            self.position += 1
+            return value.lower()
+        return None
+
+    def _number(self):
+        kind, value = self._next("a number")
+        if kind != "number":
+            raise QueryError(f"Expected a number, got '{value}'")
+        return value
+
+    def _or(self):
+        node = self._and()
+        while self._keyword("or"):
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self):
+        node = self._factor()
+        while self._keyword("and"):
+            node = ("and", node, self._factor())
+        return node
+
+    def _factor(self):
+        if self._keyword("not"):
+            return ("not", self._factor())
+        if self._peek() == ("op", "("):
+            self.position += 1
+            node = self._or()
+            if self._next("')'") != ("op", ")"):
+                raise QueryError("Expected ')'")
+            return node
+        if self._keyword("contains", "has"):
+            return ("element", self._element(), 1, True, np.inf, True)
+        kind, value = self._peek()
+        if kind == "word" and value.lower() == HAZARD_FIELD:
+            self.position += 1
+            return self._hazard()
+        if kind == "word" and value.lower() in WEIGHT_FIELDS:
+            self.position += 1
+            return ("weight",) + self._range()
+        symbol = self._element()
+        kind, value = self._peek()
+        if (kind == "op" and value in COMPARISONS) or (kind == "word" and value.lower() == "between"):
+            low, low_inclusive, high, high_inclusive = self._range()
+            # Counts are whole numbers, so every range becomes inclusive integer bounds
+            low = np.floor(low) + 1 if not low_inclusive and np.isfinite(low) else np.ceil(low)
+            high = np.ceil(high) - 1 if not high_inclusive and np.isfinite(high) else np.floor(high)
+            return ("element", symbol, max(low, 0), True, high, True)
+        # A bare symbol means the element is present
+        return ("element", symbol, 1, True, np.inf, True)
+
+    def _element(self):
+        kind, value = self._next("an element")
+        if kind != "word" or value not in ELEMENTS:
+            raise QueryError(f"'{value}' is not an element symbol (symbols are case-sensitive, e.g. C, Cl, Na)")
+        return value
+
+    def _range(self):
+        if self._keyword("between"):
+            low = self._number()
+            if not self._keyword("and"):
+                raise QueryError("Expected 'and' in between")
+            high = self._number()
+            return min(low, high), True, max(low, high), True
+        kind, operator = self._next("a comparison")
+        if kind != "op" or operator not in COMPARISONS:
+            raise QueryError(f"Expected a comparison or 'between', got '{operator}'")
+        if operator == "!=":
+            raise QueryError("Use 'not' to exclude a value, e.g. not C = 2")
+        return _bounds(operator, self._number())
+
+    def _hazard(self):
+        negate = False
+        if self._keyword("in"):
+            if self._next("'('") != ("op", "("):
+                raise QueryError("Expected '(' after in")
+            values = [self._value()]
+            while self._peek() == ("op", ","):
+                self.position += 1
+                values.append(self._value())
+            if self._next("')'") != ("op", ")"):
+                raise QueryError("Expected ')'")
+        else:
+            if self._keyword("is"):
+                negate = bool(self._keyword("not"))
+            else:
+                kind, operator = self._next("a comparison")
+                if kind != "op" or operator not in ("=", "==", ":", "!="):
+                    raise QueryError(f"Compare hazard with =, != or in, not '{operator}'")
+                negate = operator == "!="
+            values = [self._value()]
+        node = ("hazard", tuple(sorted({value.lower() for value in values})))
+        return ("not", node) if negate else node
+
+    def _value(self):
+        kind, value = self._next("a value")
+        if kind not in ("word", "string"):
+            raise QueryError(f"Expected a hazard class, got '{value}'")
+        return value
+
+
+def parse_query(text):
+    """Predicate tree for a composition query, raising QueryError when it is invalid"""
+    return _QueryParser(text).parse()
+
+
+class CompositionIndex:
+    """
+    Element composition, molecular weight and hazard class of a chemical catalogue,
+    queried with boolean masks.
+
+    Each distinct formula is parsed once into a sparse element-count matrix stored
+    column by column (per element: formula ids and counts), so an element predicate
+    touches only the formulas containing that element and is then broadcast to the
+    catalogue rows through the formula codes. Masks of every predicate and
+    sub-expression are cached, so refining a query reuses the parts already seen.
+    """
+
+    def __init__(self, formulas, molecular_weight=None, hazard=None, frame=None):
+        self.frame = frame
+        self.codes, uniques = pd.factorize(pd.Series(formulas, dtype=object), use_na_sentinel=False)
+        self.codes = self.codes.astype(np.int64)
+        self.size = len(self.codes)
+        self.formula_count = len(uniques)
+        self.valid = np.zeros(self.formula_count, dtype=bool)
+        formula_ids, symbols, counts = [], [], []
+        for i, formula in enumerate(uniques.tolist()):
+            try:
+                parsed = parse_formula(formula) if isinstance(formula, str) else None
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                continue
+            self.valid[i] = True
+            formula_ids.extend([i] * len(parsed))
+            symbols.extend(parsed)
+            counts.extend(parsed.values())
+        # Compressed by element: rows of element k are ids[start[k]:start[k + 1]]
+        element_codes, self.elements = pd.factorize(pd.Series(symbols, dtype=object), sort=True)
+        order = np.argsort(element_codes, kind="stable")
+        self._ids = np.asarray(formula_ids, dtype=np.int64)[order]
+        self._counts = np.asarray(counts, dtype=np.int64)[order]
+        self._start = np.searchsorted(element_codes[order], np.arange(len(self.elements) + 1))
+        self._element_index = {symbol: k for k, symbol in enumerate(self.elements.tolist())}
+
+        self.molecular_weight = (np.full(self.size, np.nan) if molecular_weight is None
+                                 else pd.to_numeric(pd.Series(molecular_weight), errors="coerce").to_numpy(float))
+        hazard = pd.Series(hazard if hazard is not None else [None] * self.size, dtype=object)
+        self._hazard_codes, hazard_classes = pd.factorize(hazard.str.strip().str.lower())
+        self.hazard_classes = hazard_classes.tolist()
+
+        self._lock = threading.Lock()
+        self._masks = OrderedDict()
+        self._cached_bytes = 0
+        self._parsed = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_frame(cls, frame):
+        return cls(frame["formula"], frame.get("molecular_weight"), frame.get(HAZARD_FIELD), frame=frame)
+
+    def element_counts(self, symbol):
+        """(formula ids, counts) of the formulas containing an element"""
+        k = self._element_index.get(symbol)
+        if k is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return self._ids[self._start[k]:self._start[k + 1]], self._counts[self._start[k]:self._start[k + 1]]
+
+    # Querying
+    def parse(self, text):
+        key = " ".join(text.split())
+        with self._lock:
+            if key in self._parsed:
+                self._parsed.move_to_end(key)
+                return self._parsed[key]
+        node = parse_query(key)
+        with self._lock:
+            self._parsed[key] = node
+            if len(self._parsed) > MAX_PARSED_QUERIES:
+                self._parsed.popitem(last=False)
+        return node
+
+    def mask(self, query):
+        """Boolean mask over the catalogue rows for a query string or predicate tree"""
+        node = self.parse(query) if isinstance(query, str) else query
+        return self._evaluate(node)
+
+    def select(self, query, limit=None):
+        """(row indices of the first limit matches, total matches)"""
+        mask = self.mask(query)
+        rows = np.flatnonzero(mask)
+        return (rows if limit is None else rows[:limit]), len(rows)
+
+    def _evaluate(self, node):
+        mask = self._cached(node)
+        if mask is not None:
+            return mask
+        kind = node[0]
+        if kind == "and":
+            mask = self._evaluate(node[1]) & self._evaluate(node[2])
+        elif kind == "or":
+            mask = self._evaluate(node[1]) | self._evaluate(node[2])
+        elif kind == "not":
+            mask = ~self._evaluate(node[1])
+        elif kind == "element":
+            mask = self._element_mask(*node[1:])[self.codes]
+        elif kind == "weight":
+            mask = self._in_range(self.molecular_weight, *node[1:])
+        else:
+            # Lookup table over hazard codes; the extra last slot catches missing values (-1)
+            table = np.zeros(len(self.hazard_classes) + 1, dtype=bool)
+            table[[i for i, name in enumerate(self.hazard_classes) if name in node[1]]] = True
+            mask = table[self._hazard_codes]
+        mask.setflags(write=False)
+        self._store(node, mask)
+        return mask
+
+    def _element_mask(self, symbol, low, low_inclusive, high, high_inclusive):
+        # Per distinct formula: formulas without the element have a count of 0
+        mask = np.full(self.formula_count, bool(self._in_range(np.zeros(1), low, low_inclusive, high, high_inclusive)[0]))
+        ids, counts = self.element_counts(symbol)
+        mask[ids] = self._in_range(counts, low, low_inclusive, high, high_inclusive)
+        return mask & self.valid
+
+    @staticmethod
+    def _in_range(values, low, low_inclusive, high, high_inclusive):
+        above = values >= low if low_inclusive else values > low
+        below = values <= high if high_inclusive else values < high
+        return above & below
+
+    def _cached(self, node):
+        with self._lock:
+            mask = self._masks.get(node)
+            if mask is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._masks.move_to_end(node)
+            return mask
+
+    def _store(self, node, mask):
+        with self._lock:
+            if node in self._masks or mask.nbytes > MASK_CACHE_BYTES:
+                return
+            self._masks[node] = mask
+            self._cached_bytes += mask.nbytes
+            while self._cached_bytes > MASK_CACHE_BYTES:
+                _, evicted = self._masks.popitem(last=False)
+                self._cached_bytes -= evicted.nbytes
+
+    def clear_masks(self):
+        with self._lock:
+            self._masks.clear()
+            self._cached_bytes = 0
+
+    def cache_info(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "masks": len(self._masks), "bytes": self._cached_bytes}
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_composition_index(path):
+    """Process-wide composition index of a catalogue CSV, rebuilt when the file changes"""
+    version = file_version(path)
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    index = CompositionIndex.from_frame(compact_frame(pd.read_csv(path)))
+    with _indexes_lock:
+        _indexes[path] = (version, index)
+    return index
@@ -0,0 +1,200 @@
+import hashlib
+import time
+import uuid
+import zlib
+from collections import defaultdict
+
+from utils.shared_cache import get_cache
+
+# Fields derived from the graph (edge validity) rather than edited, left out of comparisons
+DERIVED_FIELDS = frozenset(("status",))
+# Units of one plant area are split into this many regions by id
+REGION_BUCKETS = 64
+# Saved revisions listed per session, and how long they are kept in the shared cache
+MAX_REVISIONS = 32
+REVISION_TTL = 24 * 3600
+REVISION_NAMESPACE = "flowsheet_revisions"
+REVISION_INDEX_NAMESPACE = "flowsheet_revision_index"
+# Canvas classes of the comparison overlay
+ADDED_CLASS = "diff-added"
+REMOVED_CLASS = "diff-removed"
+MODIFIED_CLASS = "diff-modified"
+
+_HASH_MASK = (1 << 64) - 1
+
+
+def element_hash(row):
+    """
+    64-bit blake2b hash of a node or edge row's fields in key order (derived fields
+    left out), so every worker computes the same hash for the same row
+    """
+    items = sorted(row.items())
+    if not DERIVED_FIELDS.isdisjoint(row):
+        items = [item for item in items if item[0] not in DERIVED_FIELDS]
+    # repr of strings and numbers is canonical and about twice as fast as JSON encoding
+    digest = hashlib.blake2b(repr(items).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _bucket(element_id):
+    return zlib.crc32(str(element_id).encode("utf-8")) % REGION_BUCKETS
+
+
+class FlowsheetRevision:
+    """
+    Node and edge rows of one flowsheet, indexed by id with a hash per element.
+
+    Elements are partitioned into regions: a unit belongs to its plant area
+    split into REGION_BUCKETS buckets by id, and a stream to the region of its
+    upstream unit. Each region hash combines the hashes of its elements, so
+    two revisions only need their elements compared in regions whose hashes
+    differ. Hashes are stable across processes, so a revision saved by one
+    worker can be compared by another.
+    """
+
+    def __init__(self, node_rows, edge_rows, label=None):
+        self.label = label
+        self.created = time.time()
+        self.nodes, self.edges = {}, {}
+        self.node_hashes, self.edge_hashes = {}, {}
+        self.regions = {}
+        sums = defaultdict(int)
+        node_region = {}
+        for row in node_rows:
+            node_id = row["id"]
+            value = element_hash(row)
+            region = (row.get("area") or "", _bucket(node_id))
+            self.nodes[node_id] = row
+            self.node_hashes[node_id] = value
+            node_region[node_id] = region
+            members = self.regions.get(region)
+            if members is None:
+                members = self.regions[region] = ([], [])
+            members[0].append(node_id)
+            sums[region] += value
+        for row in edge_rows:
+            edge_id = row["id"]
+            value = element_hash(row)
+            # Streams from an unknown unit get a region of their own id
+            region = node_region.get(row.get("source")) or (None, _bucket(edge_id))
+            self.edges[edge_id] = row
+            self.edge_hashes[edge_id] = value
+            members = self.regions.get(region)
+            if members is None:
+                members = self.regions[region] = ([], [])
+            members[1].append(edge_id)
+            sums[region] += value
+        self.region_hashes = {region: total & _HASH_MASK for region, total in sums.items()}
+        self.root_hash = sum(self.region_hashes.values()) & _HASH_MASK
+
+    def summary(self):
+        return {"label": self.label, "created": self.created, "nodes": len(self.nodes), "edges": len(self.edges)}
+
+
+def _compare(ids, base_rows, base_hashes, target_rows, target_hashes, changes):
+    added, removed, modified = changes["added"], changes["removed"], changes["modified"]
+    for element_id in ids:
+        base_hash = base_hashes.get(element_id)
+        target_hash = target_hashes.get(element_id)
+        if base_hash is None:
+            added.append(element_id)
+        elif target_hash is None:
+            removed.append(element_id)
+        elif base_hash != target_hash:
+            old, new = base_rows[element_id], target_rows[element_id]
+            fields = sorted(field for field in old.keys() | new.keys()
+                            if field not in DERIVED_FIELDS and old.get(field) != new.get(field))
+            if fields:
+                modified[element_id] = fields
+
+
+def diff_revisions(base, target):
+    """
+    Added, removed and modified (with the changed fields) node and edge ids
+    from base to target. Regions with equal hashes are skipped, so the cost
+    follows the size of the changed regions rather than of the flowsheet.
+    """
+    diff = {
+        "nodes": {"added": [], "removed": [], "modified": {}},
+        "edges": {"added": [], "removed": [], "modified": {}},
+        "regions": {"total": len(base.regions.keys() | target.regions.keys()), "compared": 0},
+    }
+    if base.root_hash == target.root_hash:
+        return diff
+
+    node_ids, edge_ids = set(), set()
+    empty = ((), ())
+    for region in base.region_hashes.keys() | target.region_hashes.keys():
+        if base.region_hashes.get(region) == target.region_hashes.get(region):
+            continue
+        diff["regions"]["compared"] += 1
+        # An element that moved region shows up in both changed regions and is compared by id
+        for nodes, edges in (base.regions.get(region, empty), target.regions.get(region, empty)):
+            node_ids.update(nodes)
+            edge_ids.update(edges)
+
+    _compare(sorted(node_ids), base.nodes, base.node_hashes, target.nodes, target.node_hashes, diff["nodes"])
+    _compare(sorted(edge_ids), base.edges, base.edge_hashes, target.edges, target.edge_hashes, diff["edges"])
+    return diff
+
+
+def diff_counts(diff):
+    return {kind: {change: len(diff[kind][change]) for change in ("added", "removed", "modified")}
+            for kind in ("nodes", "edges")}
+
+
+def overlay_elements(base, target, diff):
+    """
+    Cytoscape elements of the target revision with the diff classes set, plus
+    the removed units and streams of the base revision drawn as ghosts.
+    """
+    classes = {}
+    for kind in ("nodes", "edges"):
+        for element_id in diff[kind]["added"]:
+            classes[(kind, element_id)] = ADDED_CLASS
+        for element_id in diff[kind]["modified"]:
+            classes[(kind, element_id)] = MODIFIED_CLASS
+
+    def element(kind, row, extra=None):
+        if kind == "nodes":
+            data = {"id": row["id"], "name": row.get("name", row["id"]), "type": row.get("type")}
+        else:
+            data = {"id": row["id"], "source": row["source"], "target": row["target"]}
+        names = [name for name in (row.get("status") and "invalid", classes.get((kind, row["id"])), extra) if name]
+        return {"data": data, "classes": " ".join(names)} if names else {"data": data}
+
+    elements = [element("nodes", row) for row in target.nodes.values()]
+    node_ids = set(target.nodes)
+    for node_id in diff["nodes"]["removed"]:
+        elements.append(element("nodes", base.nodes[node_id], REMOVED_CLASS))
+        node_ids.add(node_id)
+    # Cytoscape rejects streams to units it does not have, so those are left out
+    elements.extend(element("edges", row) for row in target.edges.values()
+                    if row["source"] in node_ids and row["target"] in node_ids)
+    for edge_id in diff["edges"]["removed"]:
+        row = base.edges[edge_id]
+        if row["source"] in node_ids and row["target"] in node_ids:
+            elements.append(element("edges", row, REMOVED_CLASS))
+    return elements
+
+
+# Saved revisions live in the shared cache, listed per session (the flowsheet's
+# topology token) so any worker can compare them and sessions do not see each other's
+def save_revision(scope, node_rows, edge_rows, label=None):
+    revision = FlowsheetRevision(node_rows, edge_rows, label)
+    revision_id = uuid.uuid4().hex[:12]
+    cache = get_cache()
+    cache.set(REVISION_NAMESPACE, scope, revision_id, value=revision, ttl=REVISION_TTL)
+    index = cache.get(REVISION_INDEX_NAMESPACE, scope, default=[])
+    index = (index + [(revision_id, revision.summary())])[-MAX_REVISIONS:]
+    cache.set(REVISION_INDEX_NAMESPACE, scope, value=index, ttl=REVISION_TTL)
+    return revision_id
+
+
+def get_revision(scope, revision_id):
+    return get_cache().get(REVISION_NAMESPACE, scope, revision_id)
+
+
+def list_revisions(scope):
+    """(revision_id, summary) of the session's saved revisions, oldest first"""
+    return list(get_cache().get(REVISION_INDEX_NAMESPACE, scope, default=[]))
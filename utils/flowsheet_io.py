@@ -0,0 +1,364 @@
+import base64
+import csv
+import io
+import json
+import uuid
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape, quoteattr
+
+from flask import Response, abort
+
+from utils.shared_cache import get_cache
+
+# Read size for the streaming parsers and rows per exported chunk
+READ_CHUNK_SIZE = 64 * 1024
+EXPORT_BATCH_SIZE = 1000
+# Validation messages (and renamed edge ids) kept per import
+MAX_IMPORT_ERRORS = 50
+# GraphML records consumed between clearing them from their parent element
+GRAPHML_CLEAR_INTERVAL = 1000
+# Seconds an export snapshot stays downloadable
+SNAPSHOT_TTL = 3600
+SNAPSHOT_NAMESPACE = "flowsheet_snapshots"
+
+NODE_FIELDS = ("id", "name", "type", "area")
+EDGE_FIELDS = ("id", "source", "target")
+CSV_FIELDS = ("kind", "id", "name", "type", "area", "source", "target")
+
+GRAPHML_NS = "{http://graphml.graphdrawing.org/xmlns}"
+
+FORMATS = {
+    "json": "application/json",
+    "csv": "text/csv",
+    "graphml": "application/xml",
+}
+
+
+class FlowsheetBuilder:
+    """
+    Collects imported nodes and edges in a single pass.
+
+    Node ids go into a hash index as they arrive so each edge is validated on
+    arrival. Edges that reference a node declared later are parked and checked
+    once against the finished index. Duplicate edge ids are renamed, and the
+    renames are reported alongside the errors.
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.edges = []
+        self.errors = []
+        self.error_count = 0
+        self.renamed = []
+        self._node_ids = set()
+        self._edge_ids = set()
+        self._pending = []
+
+    def add_node(self, record):
+        node_id = _clean(record.get("id"))
+        if not node_id:
+            return self._error("Node without an id skipped")
+        if node_id in self._node_ids:
+            return self._error(f"Duplicate node id {node_id} skipped")
+        self._node_ids.add(node_id)
+        node = {
+            "id": node_id,
+            "name": _clean(record.get("name")) or f"Node {node_id}",
+            "type": _clean(record.get("type")) or "type1",
+        }
+        # Plant area is optional and used to group units on the canvas
+        if _clean(record.get("area")):
+            node["area"] = _clean(record.get("area"))
+        self.nodes.append(node)
+
+    def add_edge(self, record):
+        source, target = _clean(record.get("source")), _clean(record.get("target"))
+        if not source or not target:
+            return self._error("Edge without source or target skipped")
+        edge_id = _clean(record.get("id")) or f"{source}-{target}"
+        if edge_id in self._edge_ids:
+            base, suffix = edge_id, 2
+            while edge_id in self._edge_ids:
+                edge_id = f"{base}-{suffix}"
+                suffix += 1
+            if len(self.renamed) < MAX_IMPORT_ERRORS:
+                self.renamed.append(f"{base} -> {edge_id}")
+        self._edge_ids.add(edge_id)
+        edge = {"id": edge_id, "source": source, "target": target}
+        if source in self._node_ids and target in self._node_ids:
+            self.edges.append(edge)
+        else:
+            self._pending.append(edge)
+
+    def finish(self):
+        for edge in self._pending:
+            missing = [n for n in (edge["source"], edge["target"]) if n not in self._node_ids]
+            if missing:
+                self._error(f"Edge {edge['id']} references unknown node {missing[0]}")
+            else:
+                self.edges.append(edge)
+        self._pending = []
+        return self.nodes, self.edges, self.errors, self.renamed
+
+    def _error(self, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            self.errors.append(message)
+
+
+def _clean(value):
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+# Streaming readers
+def read_json(stream, builder):
+    """Parse {"nodes": [...], "edges": [...]} (or {"elements": [...]}) item by item"""
+    reader = _JsonStream(io.TextIOWrapper(stream, encoding="utf-8"))
+    reader.expect("{")
+    while not reader.consume("}"):
+        key = reader.decode()
+        reader.expect(":")
+        if key in ("nodes", "edges", "elements") and reader.consume("["):
+            while not reader.consume("]"):
+                item = reader.decode()
+                _add_record(builder, key, item)
+                reader.consume(",")
+        else:
+            reader.decode()
+        reader.consume(",")
+
+
+def _add_record(builder, section, item):
+    # Cytoscape elements wrap their fields in "data"
+    record = item.get("data", item) if isinstance(item, dict) else {}
+    if section == "nodes" or (section == "elements" and "source" not in record):
+        builder.add_node(record)
+    else:
+        builder.add_edge(record)
+
+
+class _JsonStream:
+    """Minimal pull parser that decodes one JSON value at a time from a text stream"""
+
+    def __init__(self, text_stream):
+        self._stream = text_stream
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        chunk = self._stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                return
+
+    def consume(self, char):
+        self._skip_whitespace()
+        if self._buffer.startswith(char, self._pos):
+            self._pos += 1
+            return True
+        return False
+
+    def expect(self, char):
+        if not self.consume(char):
+            raise ValueError(f"Invalid flowsheet JSON: expected '{char}'")
+
+    def decode(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                value, end = None, None
+            # A value ending exactly at the buffer edge may be a truncated number
+            if end is not None and (end < len(self._buffer) or self._eof):
+                self._pos = end
+                return value
+            if not self._fill():
+                if end is not None:
+                    self._pos = end
+                    return value
+                raise ValueError("Invalid flowsheet JSON: truncated or malformed value")
+
+
+def read_csv(stream, builder):
+    """Parse rows of kind,id,name,type,source,target; kind is 'node' or 'edge'"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+    for row in reader:
+        kind = (row.get("kind") or "").strip().lower()
+        if kind == "node":
+            builder.add_node(row)
+        elif kind == "edge":
+            builder.add_edge(row)
+        elif row.get("source") or row.get("target"):
+            builder.add_edge(row)
+        else:
+            builder.add_node(row)
+
+
+def read_graphml(stream, builder):
+    """
+    Parse GraphML with iterparse. Each node and edge is cleared once consumed and,
+    every GRAPHML_CLEAR_INTERVAL records, dropped from its parent (the graph, or
+    the root), so memory does not grow with the file.
+    """
+    keys = {}
+    # Elements started but not yet ended; the first is the root
+    open_elements = []
+    consumed = 0
+    for event, elem in iterparse(stream, events=("start", "end")):
+        if event == "start":
+            open_elements.append(elem)
+            continue
+        open_elements.pop()
+        tag = elem.tag.replace(GRAPHML_NS, "")
+        if tag == "key":
+            keys[elem.get("id")] = elem.get("attr.name") or elem.get("id")
+        elif tag in ("node", "edge"):
+            record = {keys.get(data.get("key"), data.get("key")): data.text
+                      for data in elem if data.tag.endswith("data")}
+            record.update((k, v) for k, v in elem.attrib.items() if k in EDGE_FIELDS)
+            if tag == "node":
+                builder.add_node(record)
+            else:
+                builder.add_edge(record)
+            elem.clear()
+            consumed += 1
+            if consumed % GRAPHML_CLEAR_INTERVAL == 0 and open_elements:
+                del open_elements[-1][:]
+        elif tag == "graph":
+            elem.clear()
+
+
+READERS = {
+    "json": read_json,
+    "csv": read_csv,
+    "graphml": read_graphml,
+}
+
+
+def detect_format(filename):
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension == "xml":
+        return "graphml"
+    return extension if extension in READERS else None
+
+
+def import_flowsheet(contents, filename):
+    """Parse a dcc.Upload payload into node rows, edge rows, validation errors and renamed edge ids"""
+    fmt = detect_format(filename)
+    if fmt is None:
+        raise ValueError(f"Unsupported flowsheet file: {filename}")
+    _, encoded = contents.split(",", 1)
+    stream = io.BytesIO(base64.b64decode(encoded))
+    builder = FlowsheetBuilder()
+    READERS[fmt](stream, builder)
+    return builder.finish()
+
+
+# Streaming writers
+def _batched(rows, size=EXPORT_BATCH_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _iter_json_rows(rows, fields):
+    separator = ""
+    for batch in _batched(rows):
+        yield separator + ",\n".join(json.dumps({f: row[f] for f in fields if f in row}) for row in batch)
+        separator = ",\n"
+
+
+def iter_json(nodes, edges):
+    yield '{"nodes": [\n'
+    yield from _iter_json_rows(nodes, NODE_FIELDS)
+    yield '\n], "edges": [\n'
+    yield from _iter_json_rows(edges, EDGE_FIELDS)
+    yield "\n]}\n"
+
+
+def iter_csv(nodes, edges):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    for kind, rows in (("node", nodes), ("edge", edges)):
+        for batch in _batched(rows):
+            for row in batch:
+                writer.writerow([kind] + [row.get(f, "") for f in CSV_FIELDS[1:]])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_graphml(nodes, edges):
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+           '  <key id="name" for="node" attr.name="name" attr.type="string"/>\n'
+           '  <key id="type" for="node" attr.name="type" attr.type="string"/>\n'
+           '  <key id="area" for="node" attr.name="area" attr.type="string"/>\n'
+           '  <graph id="flowsheet" edgedefault="directed">\n')
+    for batch in _batched(nodes):
+        yield "".join(
+            f'    <node id={quoteattr(str(row["id"]))}>'
+            f'<data key="name">{escape(str(row.get("name", "")))}</data>'
+            f'<data key="type">{escape(str(row.get("type", "")))}</data>'
+            + (f'<data key="area">{escape(str(row["area"]))}</data>' if row.get("area") else "")
+            + '</node>\n'
+            for row in batch
+        )
+    for batch in _batched(edges):
+        yield "".join(
+            f'    <edge id={quoteattr(str(row["id"]))} source={quoteattr(str(row["source"]))} '
+            f'target={quoteattr(str(row["target"]))}/>\n'
+            for row in batch
+        )
+    yield "  </graph>\n</graphml>\n"
+
+
+WRITERS = {
+    "json": iter_json,
+    "csv": iter_csv,
+    "graphml": iter_graphml,
+}
+
+
+# Export snapshots handed from the Dash callback to the download route, kept in the
+# shared cache so the download can land on any worker
+def save_snapshot(nodes, edges):
+    snapshot_id = uuid.uuid4().hex
+    get_cache().set(SNAPSHOT_NAMESPACE, snapshot_id, value=(nodes, edges), ttl=SNAPSHOT_TTL)
+    return snapshot_id
+
+
+def get_snapshot(snapshot_id):
+    return get_cache().get(SNAPSHOT_NAMESPACE, snapshot_id)
+
+
+def register_flowsheet_routes(server):
+    """Attach the streaming flowsheet download route to the Flask server"""
+
+    @server.route("/flowsheet/export/<snapshot_id>.<fmt>")
+    def export_flowsheet(snapshot_id, fmt):
+        snapshot = get_snapshot(snapshot_id)
+        if snapshot is None or fmt not in WRITERS:
+            abort(404)
+        nodes, edges = snapshot
+        return Response(
+            WRITERS[fmt](nodes, edges),
+            mimetype=FORMATS[fmt],
+            headers={"Content-Disposition": f"attachment; filename=flowsheet.{fmt}"},
+        )
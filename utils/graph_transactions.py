@@ -0,0 +1,87 @@
+def _ids(rows):
+    return {row["id"] if isinstance(row, dict) else row for row in rows or ()}
+
+
+def apply_transaction(topology, node_rows, edge_rows, transaction):
+    """
+    Apply a batch of node/edge adds, updates and deletes in one pass.
+
+    transaction = {"add": {"nodes": [...], "edges": [...]},
+                   "update": {"nodes": [...], "edges": [...]},
+                   "remove": {"nodes": [ids or rows], "edges": [ids or rows]}}
+
+    Deleting a node cascades to its incident edges via the topology's adjacency
+    index. Returns the new node and edge rows plus one AG Grid rowTransaction per
+    grid, so the browser receives a single consolidated update.
+    """
+    add = transaction.get("add", {})
+    update = transaction.get("update", {})
+    remove = transaction.get("remove", {})
+    rejected_before = topology.rejected
+
+    removed_nodes = _ids(remove.get("nodes"))
+    removed_edges = _ids(remove.get("edges"))
+    for node_id in removed_nodes:
+        removed_edges |= topology.incident_edges(node_id)
+
+    if removed_nodes:
+        node_rows = [row for row in node_rows if row["id"] not in removed_nodes]
+    if removed_edges:
+        edge_rows = [row for row in edge_rows if row["id"] not in removed_edges]
+
+    node_updates = _merge_updates(node_rows, update.get("nodes"))
+    edge_updates = _merge_updates(edge_rows, update.get("edges"))
+    added_nodes = [row for row in add.get("nodes", ()) if row["id"] not in removed_nodes]
+    added_edges = [row for row in add.get("edges", ()) if row["id"] not in removed_edges]
+    node_rows.extend(added_nodes)
+    edge_rows.extend(added_edges)
+
+    for edge_id in removed_edges:
+        topology.remove_edge(edge_id)
+    for node_id in removed_nodes:
+        topology.remove_node(node_id)
+    for row in added_nodes:
+        topology.add_node(row["id"])
+    for row in edge_updates + added_edges:
+        topology.set_edge(row["id"], row["source"], row["target"])
+
+    # Edges whose status flipped (e.g. a deleted stream broke a recycle loop) are refreshed too
+    rejected_after = topology.rejected
+    touched = {row["id"] for row in edge_updates + added_edges}
+    flipped = {edge_id for edge_id in rejected_before.keys() ^ rejected_after.keys()
+               if edge_id not in removed_edges and edge_id not in touched}
+    for row in edge_updates + added_edges:
+        row["status"] = topology.edge_status(row["id"])
+    if flipped:
+        for row in edge_rows:
+            if row["id"] in flipped:
+                row["status"] = topology.edge_status(row["id"])
+                edge_updates.append(row)
+
+    node_transaction = {
+        "add": added_nodes,
+        "update": node_updates,
+        "remove": [{"id": node_id} for node_id in removed_nodes],
+        "async": False
+    }
+    edge_transaction = {
+        "add": added_edges,
+        "update": edge_updates,
+        "remove": [{"id": edge_id} for edge_id in removed_edges],
+        "async": False
+    }
+    return node_rows, edge_rows, node_transaction, edge_transaction
+
+
+def _merge_updates(rows, updates):
+    """Apply partial row updates by id, returning the updated rows"""
+    if not updates:
+        return []
+    updates_by_id = {row["id"]: row for row in updates}
+    updated = []
+    for row in rows:
+        changes = updates_by_id.get(row["id"])
+        if changes is not None:
+            row.update(changes)
+            updated.append(row)
+    return updated
@@ -0,0 +1,257 @@
+import tempfile
+import uuid
+
+import numpy as np
+import pandas as pd
+from flask import Response, abort, jsonify
+
+from utils.shared_cache import get_cache
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+# Rows formatted per chunk, and bytes per block when streaming a spooled file
+EXPORT_CHUNK_ROWS = 50000
+READ_CHUNK_SIZE = 1024 * 1024
+# Spooled exports stay in memory up to this size, then move to a temporary file
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+# Data rows an XLSX sheet can hold (the header takes the first of 1048576)
+XLSX_MAX_ROWS = 1048575
+# Seconds a prepared export stays downloadable
+EXPORT_TTL = 3600
+EXPORT_NAMESPACE = "grid_exports"
+
+FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+FORMAT_LABELS = {"csv": "CSV", "parquet": "Parquet", "xlsx": "Excel"}
+
+
+def available_formats():
+    """Export formats whose optional writer package is installed"""
+    return [fmt for fmt in FORMATS
+            if fmt == "csv" or (fmt == "parquet" and pq is not None) or (fmt == "xlsx" and Workbook is not None)]
+
+
+# AG Grid filter and sort models
+def _by_value(series, test):
+    """
+    Apply test (a function of a Series) to each distinct value once and broadcast
+    the result through the value codes, so repeated values are tested only once.
+    """
+    codes, uniques = pd.factorize(series)
+    # The extra last slot is missing values (code -1), tested as an empty string
+    table = np.asarray(test(pd.Series(list(uniques) + [""], dtype=object)), dtype=bool)
+    return table[codes]
+
+
+def _blank(values):
+    return values.isna() | (values.astype(str).str.strip() == "")
+
+
+def _condition_mask(series, condition):
+    """Mask of one simple AG Grid filter condition (text, number, date or set)"""
+    filter_type = condition.get("filterType", "text")
+    kind = condition.get("type", "equals")
+    if filter_type == "set":
+        allowed = [str(value) for value in condition.get("values") or []]
+        return _by_value(series, lambda values: values.astype(str).isin(allowed))
+    if kind == "blank":
+        return _by_value(series, _blank)
+    if kind == "notBlank":
+        return ~_by_value(series, _blank)
+    if filter_type == "number":
+        values = pd.to_numeric(series, errors="coerce").to_numpy(float)
+        low, high = condition.get("filter"), condition.get("filterTo")
+    elif filter_type == "date":
+        values = pd.to_datetime(series, errors="coerce")
+        low, high = pd.to_datetime(condition.get("dateFrom")), pd.to_datetime(condition.get("dateTo"))
+    else:
+        # Text filters match case-insensitively, as in the grid
+        value = str(condition.get("filter") or "").lower()
+        matchers = {
+            "contains": lambda text: text.str.contains(value, regex=False),
+            "notContains": lambda text: ~text.str.contains(value, regex=False),
+            "equals": lambda text: text == value,
+            "notEqual": lambda text: text != value,
+            "startsWith": lambda text: text.str.startswith(value),
+            "endsWith": lambda text: text.str.endswith(value),
+        }
+        if kind not in matchers:
+            raise ValueError(f"Unsupported text filter type {kind}")
+        return _by_value(series, lambda values: matchers[kind](values.fillna("").astype(str).str.lower()))
+    comparisons = {
+        "equals": lambda: values == low,
+        "notEqual": lambda: values != low,
+        "lessThan": lambda: values < low,
+        "lessThanOrEqual": lambda: values <= low,
+        "greaterThan": lambda: values > low,
+        "greaterThanOrEqual": lambda: values >= low,
+        "inRange": lambda: (values > low) & (values < high),
+    }
+    if kind not in comparisons:
+        raise ValueError(f"Unsupported {filter_type} filter type {kind}")
+    return np.asarray(comparisons[kind](), dtype=bool)
+
+
+def filter_mask(frame, filter_model):
+    """Rows of frame passing an AG Grid filterModel ({column: filter}), as a boolean mask"""
+    mask = np.ones(len(frame), dtype=bool)
+    for column, model in (filter_model or {}).items():
+        if column not in frame.columns:
+            raise ValueError(f"Unknown column {column}")
+        series = frame[column]
+        conditions = model.get("conditions") or [model[key] for key in ("condition1", "condition2") if model.get(key)]
+        if conditions:
+            masks = [_condition_mask(series, condition) for condition in conditions]
+            combined = np.logical_or.reduce(masks) if model.get("operator") == "OR" else np.logical_and.reduce(masks)
+        else:
+            combined = _condition_mask(series, model)
+        mask &= combined
+    return mask
+
+
+def sort_model_from_state(column_state):
+    """AG Grid sortModel ([{colId, sort}]) from the grid's columnState"""
+    sorted_columns = [state for state in column_state or [] if state.get("sort")]
+    sorted_columns.sort(key=lambda state: state.get("sortIndex") or 0)
+    return [{"colId": state["colId"], "sort": state["sort"]} for state in sorted_columns]
+
+
+def sorted_rows(frame, rows, sort_model):
+    """rows (positions in frame) reordered by an AG Grid sortModel; blanks sort first, as in the grid"""
+    keys = []
+    for entry in reversed(sort_model or []):
+        if entry.get("colId") not in frame.columns:
+            raise ValueError(f"Unknown column {entry.get('colId')}")
+        column = frame[entry["colId"]]
+        descending = entry.get("sort") == "desc"
+        if pd.api.types.is_numeric_dtype(column):
+            values = column.to_numpy(float)[rows]
+            # Blanks come first ascending and last descending
+            keys.append(np.where(np.isnan(values), np.inf, -values) if descending
+                        else np.where(np.isnan(values), -np.inf, values))
+        else:
+            codes, uniques = pd.factorize(column.iloc[rows], sort=True)
+            keys.append(np.where(codes < 0, len(uniques), len(uniques) - 1 - codes) if descending else codes)
+    if not keys:
+        return rows
+    return rows[np.lexsort(keys)]
+
+
+# Streaming writers: each yields the export as byte blocks
+def iter_csv(frame, rows):
+    for start in range(0, max(len(rows), 1), EXPORT_CHUNK_ROWS):
+        chunk = frame.iloc[rows[start:start + EXPORT_CHUNK_ROWS]]
+        yield chunk.to_csv(index=False, header=start == 0).encode("utf-8")
+
+
+def write_parquet(frame, rows, sink):
+    schema = pa.Schema.from_pandas(frame.iloc[rows[:EXPORT_CHUNK_ROWS]], preserve_index=False)
+    with pq.ParquetWriter(sink, schema) as writer:
+        # One row group per chunk
+        for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+            chunk = frame.iloc[rows[start:start + EXPORT_CHUNK_ROWS]]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_xlsx(frame, rows, sink):
+    # Write-only workbooks stream rows to the file instead of building a sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([str(column) for column in frame.columns])
+    for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+        chunk = frame.iloc[rows[start:start + EXPORT_CHUNK_ROWS]].astype(object)
+        for row in chunk.where(chunk.notna(), None).itertuples(index=False):
+            sheet.append(list(row))
+    workbook.save(sink)
+
+
+FILE_WRITERS = {
+    "parquet": write_parquet,
+    "xlsx": write_xlsx,
+}
+
+
+def _iter_file(spool):
+    try:
+        while True:
+            block = spool.read(READ_CHUNK_SIZE)
+            if not block:
+                break
+            yield block
+    finally:
+        spool.close()
+
+
+def export_response(frame, rows, fmt, filename):
+    """
+    Streaming download of frame's rows. CSV is sent chunk by chunk as it is
+    formatted; Parquet and XLSX are written to a spooled temporary file first
+    so the response carries a Content-Length. X-Export-Rows gives the row count.
+    """
+    headers = {"Content-Disposition": f"attachment; filename={filename}.{fmt}",
+               "X-Export-Rows": str(len(rows))}
+    if fmt == "csv":
+        return Response(iter_csv(frame, rows), mimetype=FORMATS[fmt], headers=headers)
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    try:
+        FILE_WRITERS[fmt](frame, rows, spool)
+        headers["Content-Length"] = str(spool.tell())
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    return Response(_iter_file(spool), mimetype=FORMATS[fmt], headers=headers)
+
+
+# Grid states handed from the Dash callback to the download route, kept in the
+# shared cache so the download can land on any worker
+def save_export(dataset, filter_model=None, sort_model=None, query=None):
+    export_id = uuid.uuid4().hex
+    spec = {"dataset": dataset, "filter_model": filter_model or {},
+            "sort_model": sort_model or [], "query": query or None}
+    get_cache().set(EXPORT_NAMESPACE, export_id, value=spec, ttl=EXPORT_TTL)
+    return export_id
+
+
+def get_export(export_id):
+    return get_cache().get(EXPORT_NAMESPACE, export_id)
+
+
+def register_export_routes(server, datasets):
+    """
+    Attach the streaming grid export route to the Flask server.
+
+    datasets maps a dataset name to a function of the saved query returning the
+    full backing DataFrame and a mask of the rows the query keeps (or None).
+    """
+
+    @server.route("/table/export/<export_id>.<fmt>")
+    def export_table(export_id, fmt):
+        spec = get_export(export_id)
+        if spec is None or spec["dataset"] not in datasets or fmt not in available_formats():
+            abort(404)
+        try:
+            frame, mask = datasets[spec["dataset"]](spec["query"])
+            keep = filter_mask(frame, spec["filter_model"])
+            if mask is not None:
+                keep &= mask
+            rows = sorted_rows(frame, np.flatnonzero(keep), spec["sort_model"])
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        if fmt == "xlsx" and len(rows) > XLSX_MAX_ROWS:
+            return jsonify(error=f"{len(rows)} rows exceed the Excel sheet limit of {XLSX_MAX_ROWS}; "
+                                 "export as CSV or Parquet instead"), 413
+        return export_response(frame, rows, fmt, spec["dataset"])
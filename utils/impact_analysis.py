@@ -0,0 +1,197 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+
+# Share of total impact above which a variable is rated High / Medium
+HIGH_IMPACT_SHARE = 0.4
+MEDIUM_IMPACT_SHARE = 0.15
+
+# Bootstrap replicates and the rows drawn per replicate (m-out-of-n for large runs)
+BOOTSTRAP_SAMPLES = 30
+BOOTSTRAP_MAX_ROWS = 5000
+# Bins used for the variance-based (first-order) sensitivity estimate
+MAX_SENSITIVITY_BINS = 50
+
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def scenario_matrix(simulated_data):
+    """Convert simulated_data records into (names, X, y, equipment) arrays"""
+    names = []
+    index = {}
+    for record in simulated_data:
+        for name in record.get("variables", {}):
+            if name not in index:
+                index[name] = len(names)
+                names.append(name)
+    X = np.full((len(simulated_data), len(names)), np.nan)
+    for row, record in enumerate(simulated_data):
+        for name, value in record.get("variables", {}).items():
+            X[row, index[name]] = value
+    y = np.fromiter((record.get("kpi_value", np.nan) for record in simulated_data),
+                    dtype=float, count=len(simulated_data))
+    equipment = np.array([record.get("equipment", "") for record in simulated_data])
+    return names, X, y, equipment
+
+
+def _clean(X, y):
+    keep = np.isfinite(y)
+    X, y = X[keep], y[keep]
+    # Missing setpoints are imputed with the column mean
+    if np.isnan(X).any():
+        means = np.nanmean(X, axis=0)
+        X = np.where(np.isnan(X), np.nan_to_num(means), X)
+    return X, y
+
+
+def _standardize(X, y):
+    # Column-major layout keeps the per-variable passes below contiguous
+    Xs = np.array(X, dtype=float, order="F")
+    Xs -= Xs.mean(axis=0)
+    x_std = np.sqrt(np.einsum("ij,ij->j", Xs, Xs) / len(Xs))
+    x_std[x_std == 0] = 1.0
+    Xs /= x_std
+    y_std = y.std() or 1.0
+    return Xs, (y - y.mean()) / y_std
+
+
+def standardized_coefficients(Xs, ys):
+    """Standardized regression coefficients from the normal equations"""
+    gram = Xs.T @ Xs
+    # A small ridge term keeps collinear or constant setpoints solvable
+    gram[np.diag_indices_from(gram)] += 1e-9 * len(ys)
+    return np.linalg.solve(gram, Xs.T @ ys)
+
+
+def permutation_importance(Xs, ys, beta, rng):
+    """
+    Increase in the linear model's MSE when each variable is shuffled, relative to
+    Var(y). Shuffling moves the prediction by shift, so the residual becomes
+    residual - shift and the MSE grows by mean(shift^2) - 2 mean(residual * shift).
+    """
+    residual = ys - Xs @ beta
+    permutation = rng.permutation(len(ys))
+    importance = np.empty(Xs.shape[1])
+    for j in range(Xs.shape[1]):
+        shift = beta[j] * (Xs[permutation, j] - Xs[:, j])
+        importance[j] = np.mean(shift * shift) - 2 * np.mean(residual * shift)
+    return np.clip(importance, 0, None)
+
+
+def first_order_indices(Xs, ys, bins=None):
+    """Variance-based first-order sensitivity Var(E[y|x_i]) / Var(y) by binning each variable"""
+    n, p = Xs.shape
+    bins = bins or int(min(MAX_SENSITIVITY_BINS, max(2, np.sqrt(n) / 2)))
+    total_variance = ys.var() or 1.0
+    indices = np.empty(p)
+    for j in range(p):
+        # Standardized values are clipped to +-3 sigma and cut into equal-width bins
+        codes = np.clip(((Xs[:, j] + 3) / 6 * bins).astype(np.int64), 0, bins - 1)
+        counts = np.bincount(codes, minlength=bins)
+        sums = np.bincount(codes, weights=ys, minlength=bins)
+        filled = counts > 0
+        means = sums[filled] / counts[filled]
+        indices[j] = np.sum(counts[filled] * means * means) / n / total_variance
+    return np.clip(indices, 0, 1)
+
+
+def _impact_shares(Xs, ys, rng):
+    beta = standardized_coefficients(Xs, ys)
+    measures = np.vstack([
+        np.abs(beta),
+        permutation_importance(Xs, ys, beta, rng),
+        first_order_indices(Xs, ys),
+    ])
+    totals = measures.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    # Each measure is normalized to shares and the three are averaged
+    return (measures / totals).mean(axis=0), beta, measures
+
+
+def impact_level(share):
+    if share >= HIGH_IMPACT_SHARE:
+        return "High"
+    if share >= MEDIUM_IMPACT_SHARE:
+        return "Medium"
+    return "Low"
+
+
+def analyze_matrix(names, X, y, seed=0):
+    """
+    Rank setpoint variables by their impact on the KPI.
+
+    Returns None when there are too few scenarios to fit every variable.
+    Confidence is the share of bootstrap replicates that give a variable the
+    same High/Medium/Low rating as the full data.
+    """
+    X, y = _clean(np.asarray(X, dtype=float), np.asarray(y, dtype=float))
+    n, p = X.shape
+    if p == 0 or n < p + 2 or y.std() == 0:
+        return None
+    rng = np.random.default_rng(seed)
+    Xs, ys = _standardize(X, y)
+    shares, beta, measures = _impact_shares(Xs, ys, rng)
+    levels = [impact_level(share) for share in shares]
+
+    rows = min(n, BOOTSTRAP_MAX_ROWS)
+    replicates = np.empty((BOOTSTRAP_SAMPLES, p))
+    for b in range(BOOTSTRAP_SAMPLES):
+        sample = rng.integers(0, n, rows)
+        Xb, yb = _standardize(X[sample], y[sample])
+        replicates[b] = _impact_shares(Xb, yb, rng)[0]
+    agreement = np.array([[impact_level(share) == levels[j] for j, share in enumerate(row)]
+                          for row in replicates]).mean(axis=0)
+    low, high = np.percentile(replicates, [2.5, 97.5], axis=0)
+
+    order = np.argsort(-shares)
+    return {
+        "top_impact": {names[j]: round(float(shares[j]), 4) for j in order},
+        "setpoint_impact_summary": {
+            names[j]: {"impact": levels[j], "confidence": round(float(agreement[j]), 2)} for j in order
+        },
+        "details": {
+            names[j]: {
+                "standardized_coefficient": float(beta[j]),
+                "permutation_importance": float(measures[1, j]),
+                "first_order_index": float(measures[2, j]),
+                "share_interval": [float(low[j]), float(high[j])],
+            }
+            for j in order
+        },
+        "scenarios": int(n),
+    }
+
+
+def analyze_impact(simulated_data, by_equipment=True, seed=0):
+    """Impact analysis over all scenarios, plus one per equipment group run in parallel"""
+    names, X, y, equipment = scenario_matrix(simulated_data)
+    return analyze_arrays(names, X, y, equipment if by_equipment else None, seed)
+
+
+def analyze_arrays(names, X, y, equipment=None, seed=0):
+    groups = np.unique(equipment) if equipment is not None else []
+    if len(groups) < 2:
+        return analyze_matrix(names, X, y, seed)
+    # NumPy releases the GIL in its kernels, so equipment groups overlap on threads
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        overall = pool.submit(analyze_matrix, names, X, y, seed)
+        futures = {group: pool.submit(analyze_matrix, names, X[equipment == group],
+                                      y[equipment == group], seed)
+                   for group in groups}
+        result = overall.result()
+        if result is not None:
+            result["by_equipment"] = {str(group): future.result() for group, future in futures.items()}
+    return result
+
+
+def derive_impact(results):
+    """top_impact and setpoint_impact_summary computed from the scenarios, else the stored values"""
+    simulated = results.get("simulated_summary", {}).get("simulated_data", [])
+    analysis = analyze_impact(simulated, by_equipment=False) if simulated else None
+    if analysis is None:
+        return {
+            "top_impact": results.get("top_impact", {}),
+            "setpoint_impact_summary": results.get("setpoint_impact_summary", {}),
+        }
+    return analysis
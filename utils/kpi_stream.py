@@ -0,0 +1,281 @@
+import hmac
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from dotenv import load_dotenv
+from flask import abort, jsonify, request
+
+from utils.impact_analysis import scenario_matrix
+from utils.results_store import get_results_store
+
+# Points kept per series: the overall trend and each piece of equipment
+STREAM_CAPACITY = 5000
+EQUIPMENT_CAPACITY = 1000
+MAX_EQUIPMENT_SERIES = 100
+# Scenarios averaged by the rolling mean trace
+ROLLING_WINDOW = 50
+# Most recent rows replayed into the buffers when a worker starts streaming
+BACKFILL_ROWS = 200000
+
+ALL_SERIES = "All"
+
+# The append route exists only when a token is configured; posts must send it in the header
+load_dotenv()
+KPI_APPEND_TOKEN = os.getenv('KPI_APPEND_TOKEN')
+TOKEN_HEADER = "X-KPI-Token"
+
+
+def parse_cursor(cursor):
+    """(chunk key, scenario) of a cursor string; None or "" is before every point"""
+    if not cursor:
+        return -1, -1
+    chunk, scenario = str(cursor).split(":")
+    return int(chunk), int(scenario)
+
+
+def format_cursor(key):
+    # A string, since chunk keys (nanoseconds) lose precision as JavaScript numbers
+    return f"{key[0]}:{key[1]}"
+
+
+class RingBuffer:
+    """
+    Fixed-capacity buffer of rows; extending costs O(new rows) and old rows are
+    overwritten. Every row carries a (chunk key, scenario) key that is the same
+    in every worker, so a cursor read from one worker can be resumed on another.
+    """
+
+    def __init__(self, capacity, columns):
+        self.capacity = capacity
+        self._data = np.empty((capacity, columns))
+        self._keys = np.empty((capacity, 2), dtype=np.int64)
+        # Total rows ever appended
+        self.count = 0
+
+    def extend(self, rows, keys):
+        rows = np.asarray(rows, dtype=float)
+        skipped = max(0, len(rows) - self.capacity)
+        positions = np.arange(self.count + skipped, self.count + len(rows)) % self.capacity
+        self._data[positions] = rows[skipped:]
+        self._keys[positions] = np.asarray(keys, dtype=np.int64)[skipped:]
+        self.count += len(rows)
+
+    def since(self, cursor=None):
+        """
+        Rows with keys after cursor (of those still held), and the cursor of the
+        newest row; the cursor never moves backwards
+        """
+        chunk, scenario = parse_cursor(cursor)
+        positions = np.arange(max(self.count - self.capacity, 0), self.count) % self.capacity
+        keys = self._keys[positions]
+        # Keys grow with the position, so the rows after the cursor are a suffix
+        after = (keys[:, 0] > chunk) | ((keys[:, 0] == chunk) & (keys[:, 1] > scenario))
+        start = int(np.argmax(after)) if after.any() else len(positions)
+        if start == len(positions):
+            return self._data[positions[:0]], cursor
+        return self._data[positions[start:]], format_cursor(keys[-1])
+
+    def values(self):
+        return self.since()[0]
+
+
+class RollingMean:
+    """Trailing mean over the last window values, updated from the new values only"""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+        self._tail = np.empty(0)
+
+    def update(self, values):
+        joined = np.concatenate([self._tail, values])
+        sums = np.concatenate([[0.0], np.cumsum(joined)])
+        end = np.arange(len(self._tail) + 1, len(joined) + 1)
+        start = np.maximum(end - self.window, 0)
+        self._tail = joined[max(0, len(joined) - self.window + 1):] if self.window > 1 else np.empty(0)
+        return (sums[end] - sums[start]) / (end - start)
+
+
+class RunningStats:
+    """Count, mean, standard deviation, min and max merged batch by batch (Chan et al.)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        if not len(values):
+            return
+        count = len(values)
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def std(self):
+        return (self._m2 / self.count) ** 0.5 if self.count else 0.0
+
+
+class Series:
+    # Buffer columns: scenario, KPI, rolling mean
+    def __init__(self, capacity):
+        self.buffer = RingBuffer(capacity, 3)
+        self.rolling = RollingMean()
+        self.stats = RunningStats()
+
+    def extend(self, chunk_key, scenarios, kpi):
+        keys = np.column_stack([np.full(len(scenarios), chunk_key), scenarios])
+        self.buffer.extend(np.column_stack([scenarios, kpi, self.rolling.update(kpi)]), keys)
+        self.stats.update(kpi)
+
+
+def _scenario_means(scenario, kpi):
+    # Mean KPI per scenario across its units, in scenario order
+    numbers, codes = np.unique(scenario, return_inverse=True)
+    return numbers, np.bincount(codes, weights=kpi) / np.bincount(codes)
+
+
+class KPIStream:
+    """
+    Live KPI series fed by the results store.
+
+    Every batch the store receives (from a sweep, the append endpoint or another
+    worker) is reduced to per-scenario points and pushed into ring buffers, so
+    the analytics tab only ever ships the points added since its last poll.
+    Points are keyed by their chunk and scenario rather than by arrival, so
+    polls answered by different workers neither repeat nor skip points.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._reset()
+        store.subscribe(self.ingest)
+
+    def _reset(self):
+        # Replays the newest whole chunks, up to about BACKFILL_ROWS rows
+        self._series = {ALL_SERIES: Series(STREAM_CAPACITY)}
+        self._generation = self.store.generation
+        backfill, rows = [], 0
+        for chunk in reversed(self.store.chunks()):
+            if rows >= BACKFILL_ROWS:
+                break
+            backfill.append(chunk)
+            rows += len(chunk["kpi"])
+        for chunk in reversed(backfill):
+            self._ingest(chunk)
+
+    def ingest(self, chunk):
+        with self._lock:
+            if self._generation != self.store.generation:
+                self._reset()
+            else:
+                self._ingest(chunk)
+
+    def _ingest(self, chunk):
+        kpi = np.asarray(chunk["kpi"], dtype=float)
+        keep = np.isfinite(kpi)
+        if not keep.any():
+            return
+        kpi, scenario = kpi[keep], np.asarray(chunk["scenario"])[keep]
+        codes = np.asarray(chunk["equipment"])[keep]
+        self._series[ALL_SERIES].extend(chunk["key"], *_scenario_means(scenario, kpi))
+        for code in np.unique(codes).tolist():
+            name = chunk["equipment_names"][code]
+            series = self._series.get(name)
+            if series is None:
+                if len(self._series) > MAX_EQUIPMENT_SERIES:
+                    continue
+                series = self._series[name] = Series(EQUIPMENT_CAPACITY)
+            rows = codes == code
+            series.extend(chunk["key"], *_scenario_means(scenario[rows], kpi[rows]))
+
+    def series_names(self):
+        with self._lock:
+            return [ALL_SERIES] + sorted(name for name in self._series if name != ALL_SERIES)
+
+    def poll(self, name=ALL_SERIES, cursor=None):
+        """(rows, cursor, stats) for points of a series after cursor"""
+        self.store.refresh()
+        with self._lock:
+            if self._generation != self.store.generation:
+                self._reset()
+            series = self._series.get(name) or self._series[ALL_SERIES]
+            rows, cursor = series.buffer.since(cursor)
+            stats = series.stats
+            summary = {"count": stats.count, "mean": stats.mean, "std": stats.std,
+                       "min": stats.min, "max": stats.max}
+            return rows.copy(), cursor, summary
+
+    def capacity(self, name=ALL_SERIES):
+        series = self._series.get(name) or self._series[ALL_SERIES]
+        return series.buffer.capacity
+
+
+_stream = None
+_stream_lock = threading.Lock()
+
+
+def get_kpi_stream(store):
+    """Process-wide KPI stream attached to the results store"""
+    global _stream
+    with _stream_lock:
+        if _stream is None:
+            _stream = KPIStream(store)
+        return _stream
+
+
+def _timestamp(value, default):
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+def append_records(store, records):
+    """Append simulated_data style records (optionally with a timestamp) to the store"""
+    names, X, y, equipment = scenario_matrix(records)
+    # Records sharing a scenario value are one scenario, numbered in order of appearance
+    index = {}
+    scenarios = [index.setdefault(str(r.get("scenario", i)), len(index)) for i, r in enumerate(records)]
+    now = time.time()
+    timestamps = [_timestamp(r.get("timestamp"), now) for r in records]
+    return store.append(equipment, names, X, y, scenarios=scenarios, timestamps=timestamps)
+
+
+def register_kpi_stream_routes(server):
+    """
+    Attach the results append route to the Flask server when KPI_APPEND_TOKEN is
+    set; every post needs the token in the X-KPI-Token header.
+    """
+    if not KPI_APPEND_TOKEN:
+        return False
+
+    @server.route("/kpi/append", methods=["POST"])
+    def append_kpi():
+        token = request.headers.get(TOKEN_HEADER, "")
+        if not hmac.compare_digest(token.encode(), KPI_APPEND_TOKEN.encode()):
+            abort(403)
+        payload = request.get_json(silent=True)
+        records = payload.get("records") if isinstance(payload, dict) else payload
+        if not isinstance(records, list) or not records:
+            return jsonify(error="Expected a JSON list of result records"), 400
+        try:
+            count = append_records(get_results_store(), records)
+        except (TypeError, ValueError, AttributeError) as e:
+            return jsonify(error=str(e)), 400
+        return jsonify(appended=count)
+
+    return True
@@ -0,0 +1,194 @@
+from collections import Counter, defaultdict
+
+GROUP_PREFIX = "group:"
+
+# Layout spacing in model coordinates
+NODE_DX = 180
+NODE_DY = 70
+GROUP_GAP = 60
+
+# Nominal canvas size in pixels (the canvas is 600px high and roughly this wide)
+CANVAS_WIDTH = 800
+CANVAS_HEIGHT = 600
+# Extra area around the viewport that is still sent, as a fraction of its size
+VIEWPORT_MARGIN = 0.5
+# Upper bound on individual units sent; denser groups stay collapsed
+MAX_VISIBLE_NODES = 1500
+
+
+def group_by_attribute(node_rows, field, default="Unassigned"):
+    return {row["id"]: str(row.get(field) or default) for row in node_rows}
+
+
+def detect_communities(node_rows, edge_rows, iterations=10):
+    """Group units by label propagation over the undirected flowsheet"""
+    neighbours = {row["id"]: [] for row in node_rows}
+    for row in edge_rows:
+        source, target = row["source"], row["target"]
+        if source in neighbours and target in neighbours and source != target:
+            neighbours[source].append(target)
+            neighbours[target].append(source)
+
+    labels = {node: node for node in neighbours}
+    for _ in range(iterations):
+        changed = False
+        for node, adjacent in neighbours.items():
+            if not adjacent:
+                continue
+            counts = Counter(labels[n] for n in adjacent)
+            # Ties break on the label itself so repeated runs give the same groups
+            best = max(counts.items(), key=lambda item: (item[1], str(item[0])))[0]
+            if best != labels[node]:
+                labels[node] = best
+                changed = True
+        if not changed:
+            break
+    return {node: f"Cluster {label}" for node, label in labels.items()}
+
+
+def assign_groups(node_rows, edge_rows, grouping):
+    if grouping == "community":
+        return detect_communities(node_rows, edge_rows)
+    return group_by_attribute(node_rows, grouping)
+
+
+def layer_ranks(topology):
+    """Longest-path layer of each unit, following the topological order"""
+    ranks = {}
+    for node in topology.topological_order():
+        ranks[node] = max((ranks[p] + 1 for p in topology.predecessors(node)), default=0)
+    return ranks
+
+
+def viewport_bounds(center, zoom):
+    half_width = CANVAS_WIDTH / 2 / zoom * (1 + 2 * VIEWPORT_MARGIN)
+    half_height = CANVAS_HEIGHT / 2 / zoom * (1 + 2 * VIEWPORT_MARGIN)
+    return (center[0] - half_width, center[1] - half_height,
+            center[0] + half_width, center[1] + half_height)
+
+
+def viewport_pan(center, zoom):
+    """Cytoscape pan that puts center in the middle of the canvas"""
+    return {"x": CANVAS_WIDTH / 2 - center[0] * zoom, "y": CANVAS_HEIGHT / 2 - center[1] * zoom}
+
+
+def build_lod_elements(node_rows, edge_rows, groups, ranks, expanded, center=None, zoom=1.0):
+    """
+    Build the Cytoscape elements for the current level of detail.
+
+    Collapsed groups become one summary node with aggregated edges; expanded
+    groups become compound parents with their units as children. Only elements
+    inside the viewport (plus a margin) are returned, and expanded groups are
+    collapsed again if they would exceed MAX_VISIBLE_NODES.
+
+    Returns (elements, center, info).
+    """
+    members = defaultdict(list)
+    for row in node_rows:
+        members[groups.get(row["id"], "Unassigned")].append(row)
+    expanded = set(expanded or ()) & members.keys()
+
+    # Groups are ordered by their mean layer and stacked in bands, so upstream
+    # areas appear top-left and no two groups overlap
+    mean_rank = {group: sum(ranks.get(row["id"], 0) for row in rows) / len(rows)
+                 for group, rows in members.items()}
+    positions = {}
+    summary_positions = {}
+    offset = 0
+    for index, group in enumerate(sorted(members, key=lambda g: (mean_rank[g], g))):
+        rows = members[group]
+        x0 = index * NODE_DX
+        if group in expanded:
+            # Members are placed on their layers, compacted to the layers the group uses
+            local_rank = {rank: i for i, rank in enumerate(sorted({ranks.get(row["id"], 0) for row in rows}))}
+            slots = Counter()
+            for row in rows:
+                column = local_rank[ranks.get(row["id"], 0)]
+                positions[row["id"]] = (x0 + column * NODE_DX, offset + slots[column] * NODE_DY)
+                slots[column] += 1
+            offset += max(slots.values()) * NODE_DY + GROUP_GAP
+        else:
+            summary_positions[group] = (x0, offset)
+            offset += NODE_DY + GROUP_GAP
+
+    if center is None:
+        # Start at the top-left corner, where the feed units are
+        center = (CANVAS_WIDTH / 2 / zoom - NODE_DX / 2, CANVAS_HEIGHT / 2 / zoom - NODE_DY / 2)
+    left, top, right, bottom = viewport_bounds(center, zoom)
+
+    def visible(position):
+        return left <= position[0] <= right and top <= position[1] <= bottom
+
+    visible_members = {group: [row for row in members[group] if visible(positions[row["id"]])]
+                       for group in expanded}
+    # Collapse the densest groups until the visible unit count fits the budget
+    dense = []
+    total = sum(len(rows) for rows in visible_members.values())
+    for group in sorted(visible_members, key=lambda g: len(visible_members[g]), reverse=True):
+        if total <= MAX_VISIBLE_NODES:
+            break
+        total -= len(visible_members.pop(group))
+        dense.append(group)
+        rows = members[group]
+        xs = [positions[row["id"]][0] for row in rows]
+        ys = [positions[row["id"]][1] for row in rows]
+        summary_positions[group] = (sum(xs) / len(xs), min(ys))
+
+    elements = []
+    representative = {}
+    shown = set()
+    for group, position in summary_positions.items():
+        group_id = GROUP_PREFIX + group
+        for row in members[group]:
+            representative[row["id"]] = group_id
+        if visible(position):
+            shown.add(group_id)
+            elements.append({
+                "data": {"id": group_id, "name": f"{group} ({len(members[group])} units)",
+                         "group": group, "size": len(members[group])},
+                "position": {"x": position[0], "y": position[1]},
+                "classes": "summary"
+            })
+    for group, rows in visible_members.items():
+        for row in members[group]:
+            representative[row["id"]] = row["id"]
+        if not rows:
+            continue
+        group_id = GROUP_PREFIX + group
+        elements.append({"data": {"id": group_id, "name": group, "group": group}, "classes": "group"})
+        for row in rows:
+            shown.add(row["id"])
+            x, y = positions[row["id"]]
+            elements.append({
+                "data": {"id": row["id"], "name": row["name"], "type": row["type"], "parent": group_id},
+                "position": {"x": x, "y": y}
+            })
+
+    aggregated = Counter()
+    for row in edge_rows:
+        source = representative.get(row["source"])
+        target = representative.get(row["target"])
+        if source not in shown or target not in shown:
+            continue
+        if source == row["source"] and target == row["target"]:
+            element = {"data": {"id": row["id"], "source": source, "target": target}}
+            if row.get("status"):
+                element["classes"] = "invalid"
+            elements.append(element)
+        elif source != target:
+            aggregated[(source, target)] += 1
+    for (source, target), count in aggregated.items():
+        elements.append({
+            "data": {"id": f"agg:{source}->{target}", "source": source, "target": target,
+                     "weight": count, "name": str(count)},
+            "classes": "aggregate"
+        })
+
+    info = {
+        "groups": len(members),
+        "expanded": len(visible_members),
+        "nodes_sent": sum(1 for element in elements if "source" not in element["data"]),
+        "edges_sent": sum(1 for element in elements if "source" in element["data"]),
+        "too_dense": sorted(dense),
+    }
+    return elements, center, info
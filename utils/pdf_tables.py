@@ -0,0 +1,85 @@
+import zlib
+
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+# Monospaced font, so one format string lays out every row
+TABLE_FONT = "Courier"
+TABLE_HEADER_FONT = "Courier-Bold"
+TABLE_FONT_SIZE = 7
+TABLE_LEADING = 9
+
+
+class CompressingCanvas(canvas.Canvas):
+    """
+    Canvas that deflates each page's content stream as soon as the page is
+    finished, instead of holding every page uncompressed until save().
+    """
+
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        if page.stream and not page.Contents:
+            contents = pdfdoc.PDFStream(content=zlib.compress(page.stream.encode('utf8')))
+            # An explicit Filter tells reportlab the content is already encoded
+            contents.dictionary["Filter"] = pdfdoc.PDFArray([pdfdoc.PDFName("FlateDecode")])
+            contents.__Comment__ = "page stream"
+            page.Contents = contents
+            page.stream = None
+
+
+class FixedWidthTable:
+    """
+    Table whose column layout is computed once and rendered one text line per row.
+
+    columns is a list of (header, width in characters, align) with align "left" or
+    "right"; cells longer than their column are truncated. Columns that do not fit
+    max_width points are dropped from the right.
+    """
+
+    def __init__(self, columns, max_width, font=TABLE_FONT, size=TABLE_FONT_SIZE, leading=TABLE_LEADING):
+        self.font = font
+        self.size = size
+        self.leading = leading
+        char_width = stringWidth("0", font, size)
+        max_chars = int(max_width // char_width)
+        kept, used = [], 0
+        for header, width, align in columns:
+            if used + width > max_chars and kept:
+                break
+            kept.append((header, width, align))
+            used += width + 1
+        self.columns = kept
+        self.dropped = len(columns) - len(kept)
+        self._format = " ".join(
+            f"{{:{'<' if align == 'left' else '>'}{width}.{width}}}" for _, width, align in kept
+        )
+        self.header = self.format_row(header for header, _, _ in kept)
+
+    def format_row(self, cells):
+        return self._format.format(*(str(cell) for cell in cells))
+
+    def draw(self, pdf, rows, x, y, top, bottom, new_page):
+        """
+        Draw rows (iterables of cells) from y downwards, starting a new page through
+        new_page() whenever the next row would pass bottom. Rows are consumed lazily
+        and each page is written as a single text object. Returns the final y.
+        """
+        text = self._begin(pdf, x, y)
+        for row in rows:
+            if text.getY() - self.leading < bottom:
+                pdf.drawText(text)
+                new_page()
+                text = self._begin(pdf, x, top)
+            text.textLine(self.format_row(row[:len(self.columns)]))
+        pdf.drawText(text)
+        return text.getY()
+
+    def _begin(self, pdf, x, y):
+        text = pdf.beginText(x, y)
+        text.setLeading(self.leading)
+        text.setFont(TABLE_HEADER_FONT if self.font == TABLE_FONT else self.font, self.size)
+        text.textLine(self.header)
+        text.setFont(self.font, self.size)
+        return text
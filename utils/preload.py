@@ -0,0 +1,74 @@
+import gc
+import time
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from utils.results_store import get_results_store
+from utils.rollups import get_rollups
+from utils.kpi_stream import get_kpi_stream
+
+# Text columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_SHARE = 0.5
+
+
+def compact_frame(frame):
+    """
+    Frame whose text columns hold no per-row Python objects: Arrow strings when
+    pyarrow is installed, otherwise categoricals for columns with repeated values.
+    Forked workers then read them without touching (and copying) shared pages.
+    """
+    columns = {}
+    for column in frame.columns:
+        series = frame[column]
+        if series.dtype != object:
+            continue
+        if pyarrow is not None:
+            columns[column] = series.astype("string[pyarrow]")
+        elif series.nunique(dropna=True) <= CATEGORY_MAX_SHARE * len(series):
+            columns[column] = series.astype("category")
+    return frame.assign(**columns) if columns else frame
+
+
+def preload_shared_data(catalogue_index, results_path):
+    """
+    Load the read-only data every worker serves: the catalogue's composition
+    index (a function building it) and the results store with its rollups and
+    KPI stream. Returns the seconds spent on each.
+    """
+    timings = {}
+    started = time.perf_counter()
+    catalogue_index()
+    timings["catalogue"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    store = get_results_store(results_path)
+    get_rollups(store)
+    get_kpi_stream(store)
+    timings["results"] = time.perf_counter() - started
+    return timings
+
+
+def warm_up(builders):
+    """Call each builder once so its memoized layout or figure exists before workers fork"""
+    timings = {}
+    for name, build in builders.items():
+        started = time.perf_counter()
+        try:
+            build()
+        except Exception as e:
+            print(f"Warm-up Error ({name}): {str(e)}")
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def freeze_heap():
+    """
+    Move every object allocated so far out of the garbage collector's reach, so
+    collections in forked workers do not write to (and un-share) preloaded pages.
+    """
+    gc.collect()
+    gc.freeze()
+    return gc.get_freeze_count()
@@ -0,0 +1,332 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from dotenv import load_dotenv
+from flask import Response, abort, g, jsonify, request
+
+from utils.shared_cache import get_cache
+
+# Profiling routes and hooks exist only when enabled and a token is configured
+load_dotenv()
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '0') == '1'
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')
+
+TOKEN_HEADER = "X-Profiling-Token"
+PROFILE_REQUEST_HEADER = "X-Profile"
+
+# CPU sampling limits
+DEFAULT_SAMPLE_SECONDS = 10
+MAX_SAMPLE_SECONDS = 60
+DEFAULT_SAMPLE_INTERVAL = 0.005
+MIN_SAMPLE_INTERVAL = 0.001
+# Frames kept per tracemalloc traceback, and rows returned by default
+TRACEMALLOC_FRAMES = 25
+DEFAULT_TOP = 25
+# Memory snapshots listed, and how long snapshots and request profiles stay in the shared cache
+MAX_SNAPSHOTS = 8
+PROFILE_TTL = 3600
+PROFILE_NAMESPACE = "profiling"
+REQUEST_PROFILE_ROWS = 40
+# How often each worker's sampler checks for a CPU profile to join, and how long
+# the requesting worker waits past the end for every sampler's stacks
+SAMPLER_POLL_INTERVAL = 0.5
+SAMPLER_COLLECT_GRACE = 2.0
+
+_sampler_pid = None
+_sampler_lock = threading.Lock()
+# When this worker last started tracemalloc; a memory stop posted later ends it
+_tracing_started = 0.0
+# Threads waiting on a CPU profile, left out of the samples
+_waiting_threads = set()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds, interval=DEFAULT_SAMPLE_INTERVAL, skip=()):
+    """
+    Sample the stack of every other thread (and none in skip) each interval for
+    seconds and count each distinct stack, root first, as "thread;frame;frame"
+    (collapsed format).
+    """
+    own = threading.get_ident()
+    stacks = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own or ident in skip:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(labels))] += 1
+        samples += 1
+        time.sleep(interval)
+    return stacks, samples
+
+
+def collapsed(stacks):
+    """Flamegraph-compatible text: one "stack count" line per distinct stack"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def start_sampler():
+    """
+    Start this worker's CPU sampler thread, once per process. Threads started
+    before gunicorn forks do not survive in the workers, so gunicorn.conf.py
+    calls this from post_fork; the CPU route also calls it for servers without
+    that hook.
+    """
+    global _sampler_pid
+    if not PROFILING_ENABLED or not PROFILING_TOKEN:
+        return False
+    with _sampler_lock:
+        if _sampler_pid == os.getpid():
+            return False
+        _sampler_pid = os.getpid()
+    threading.Thread(target=_run_sampler, name="profile-sampler", daemon=True).start()
+    return True
+
+
+def _run_sampler():
+    # Joins each CPU profile posted to the shared cache and stores this worker's stacks,
+    # and stops tracemalloc when a memory stop has been posted since it was started
+    cache = get_cache()
+    joined = None
+    while True:
+        time.sleep(SAMPLER_POLL_INTERVAL)
+        try:
+            stopped = cache.get(PROFILE_NAMESPACE, "memory_stop", default=0.0)
+            if stopped > _tracing_started and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            job = cache.get(PROFILE_NAMESPACE, "cpu")
+            if job is None or job["id"] == joined or time.time() >= job["end"]:
+                continue
+            joined = job["id"]
+            time.sleep(max(0.0, job["start"] - time.time()))
+            stacks, samples = sample_stacks(job["end"] - time.time(), job["interval"], skip=_waiting_threads)
+            pid = os.getpid()
+            stacks = Counter({f"worker-{pid};{stack}": count for stack, count in stacks.items()})
+            _store_stacks(cache, job["id"], (stacks, samples))
+        except Exception as e:
+            print(f"Profile Sampler Error: {str(e)}")
+
+
+def _store_stacks(cache, job_id, result):
+    # Each sampler takes the first free numbered slot of the profile; get_or_compute
+    # lets exactly one worker fill a slot, and the slots expire with the profile
+    token = uuid.uuid4().hex
+    number = 1
+    while cache.get_or_compute(PROFILE_NAMESPACE, ("cpu", job_id, number),
+                               lambda: (token, result), ttl=PROFILE_TTL)[0] != token:
+        number += 1
+
+
+def _collect_stacks(cache, job_id):
+    """Results stored by the samplers of a CPU profile, in slot order"""
+    results = []
+    while True:
+        slot = cache.get(PROFILE_NAMESPACE, "cpu", job_id, len(results) + 1)
+        if slot is None:
+            return results
+        results.append(slot[1])
+
+
+class MemorySnapshots:
+    """
+    tracemalloc snapshots of the worker taking them, kept by id in the shared
+    cache so any worker can report or diff them
+    """
+
+    def __init__(self, limit=MAX_SNAPSHOTS):
+        self.limit = limit
+
+    def take(self):
+        global _tracing_started
+        if not tracemalloc.is_tracing():
+            _tracing_started = time.time()
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            # The sampler is what later ends tracing here on a memory stop
+            start_sampler()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        snapshot_id = uuid.uuid4().hex[:12]
+        cache = get_cache()
+        cache.set(PROFILE_NAMESPACE, "snapshot", snapshot_id, value=(os.getpid(), snapshot), ttl=PROFILE_TTL)
+        index = (self.ids() + [snapshot_id])[-self.limit:]
+        cache.set(PROFILE_NAMESPACE, "snapshots", value=index, ttl=PROFILE_TTL)
+        return snapshot_id, snapshot
+
+    def get(self, snapshot_id):
+        """(pid of the worker that took it, snapshot), or None"""
+        if snapshot_id not in self.ids():
+            return None
+        return get_cache().get(PROFILE_NAMESPACE, "snapshot", snapshot_id)
+
+    def ids(self):
+        return list(get_cache().get(PROFILE_NAMESPACE, "snapshots", default=[]))
+
+
+def _describe(stat):
+    return {
+        "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        "size_kb": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+
+
+def _describe_diff(stat):
+    return dict(_describe(stat), size_diff_kb=round(stat.size_diff / 1024, 1), count_diff=stat.count_diff)
+
+
+def register_profiling_routes(server):
+    """
+    Attach the admin profiling routes to the Flask server when PROFILING_ENABLED=1
+    and PROFILING_TOKEN is set; otherwise nothing is registered, so there is no
+    cost at all. Every route needs the token in the X-Profiling-Token header.
+
+    CPU profiles sample every worker through its sampler thread, and snapshots
+    and request profiles live in the shared cache, so any worker can answer.
+    """
+    if not PROFILING_ENABLED or not PROFILING_TOKEN:
+        return False
+
+    cache = get_cache()
+    snapshots = MemorySnapshots()
+
+    def authorized():
+        token = request.headers.get(TOKEN_HEADER, "")
+        return hmac.compare_digest(token.encode(), PROFILING_TOKEN.encode())
+
+    def require_admin():
+        if not authorized():
+            abort(403)
+
+    @server.route("/admin/profile/cpu")
+    def profile_cpu():
+        require_admin()
+        try:
+            seconds = min(float(request.args.get("seconds", DEFAULT_SAMPLE_SECONDS)), MAX_SAMPLE_SECONDS)
+            interval = max(float(request.args.get("interval", DEFAULT_SAMPLE_INTERVAL)), MIN_SAMPLE_INTERVAL)
+        except ValueError:
+            return jsonify(error="seconds and interval must be numbers"), 400
+        running = cache.get(PROFILE_NAMESPACE, "cpu")
+        if running is not None and running["end"] > time.time():
+            return jsonify(error="A CPU profile is already running"), 409
+        start_sampler()
+        # Starts once every sampler has had a chance to see it
+        start = time.time() + 2 * SAMPLER_POLL_INTERVAL
+        job = {"id": uuid.uuid4().hex[:12], "start": start, "end": start + seconds, "interval": interval}
+        cache.set(PROFILE_NAMESPACE, "cpu", value=job, ttl=PROFILE_TTL)
+        _waiting_threads.add(threading.get_ident())
+        try:
+            time.sleep(job["end"] - time.time() + SAMPLER_COLLECT_GRACE)
+        finally:
+            _waiting_threads.discard(threading.get_ident())
+        stacks, samples = Counter(), 0
+        results = _collect_stacks(cache, job["id"])
+        for worker_stacks, worker_samples in results:
+            stacks.update(worker_stacks)
+            samples = max(samples, worker_samples)
+        return Response(
+            collapsed(stacks),
+            mimetype="text/plain",
+            headers={"Content-Disposition": f"attachment; filename=cpu-{int(time.time())}.folded",
+                     "X-Profile-Samples": str(samples),
+                     "X-Profile-Workers": str(len(results))},
+        )
+
+    @server.route("/admin/profile/memory/snapshot", methods=["POST"])
+    def memory_snapshot():
+        require_admin()
+        group = request.args.get("group", "lineno")
+        if group not in ("lineno", "filename", "traceback"):
+            return jsonify(error="group must be lineno, filename or traceback"), 400
+        limit = request.args.get("limit", DEFAULT_TOP, type=int)
+        snapshot_id, snapshot = snapshots.take()
+        current, peak = tracemalloc.get_traced_memory()
+        return jsonify(
+            id=snapshot_id,
+            traced_mb=round(current / 1024 / 1024, 2),
+            peak_mb=round(peak / 1024 / 1024, 2),
+            top=[_describe(stat) for stat in snapshot.statistics(group)[:limit]],
+        )
+
+    @server.route("/admin/profile/memory/diff")
+    def memory_diff():
+        # Compares two stored snapshots, or a stored one with a new snapshot
+        # The pids show when the two snapshots come from different workers
+        require_admin()
+        base = snapshots.get(request.args.get("base", ""))
+        if base is None:
+            return jsonify(error="Unknown base snapshot", snapshots=snapshots.ids()), 404
+        target_id = request.args.get("target")
+        target = snapshots.get(target_id) if target_id else (os.getpid(), snapshots.take()[1])
+        if target is None:
+            return jsonify(error="Unknown target snapshot", snapshots=snapshots.ids()), 404
+        group = request.args.get("group", "lineno")
+        limit = request.args.get("limit", DEFAULT_TOP, type=int)
+        return jsonify(base_pid=base[0], target_pid=target[0],
+                       top=[_describe_diff(stat) for stat in target[1].compare_to(base[1], group)[:limit]])
+
+    @server.route("/admin/profile/memory/stop", methods=["POST"])
+    def memory_stop():
+        # Stops tracing here at once; the other workers' samplers stop it within a poll
+        require_admin()
+        tracemalloc.stop()
+        cache.set(PROFILE_NAMESPACE, "memory_stop", value=time.time(), ttl=PROFILE_TTL)
+        return jsonify(tracing=False)
+
+    @server.route("/admin/profile/requests/<profile_id>")
+    def request_profile(profile_id):
+        require_admin()
+        report = cache.get(PROFILE_NAMESPACE, "request", profile_id)
+        if report is None:
+            abort(404)
+        return Response(report, mimetype="text/plain")
+
+    # Per-request profiling: a request carrying X-Profile and the token runs under cProfile
+    @server.before_request
+    def start_request_profile():
+        if PROFILE_REQUEST_HEADER not in request.headers or not authorized():
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active on this thread
+            return
+        g.request_profile = profile
+
+    @server.after_request
+    def finish_request_profile(response):
+        profile = g.pop("request_profile", None)
+        if profile is None:
+            return response
+        profile.disable()
+        output = io.StringIO()
+        output.write(f"{request.method} {request.path}\n")
+        pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(REQUEST_PROFILE_ROWS)
+        profile_id = uuid.uuid4().hex[:12]
+        cache.set(PROFILE_NAMESPACE, "request", profile_id, value=output.getvalue(), ttl=PROFILE_TTL)
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+
+    return True
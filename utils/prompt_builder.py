@@ -0,0 +1,171 @@
+import math
+
+# Rough characters per token for English text and numbers (no tokenizer needed)
+CHARS_PER_TOKEN = 4
+# Prompt budget and the most variables given their own section in the output
+DEFAULT_PROMPT_TOKENS = 1500
+DEFAULT_DETAILED_VARIABLES = 8
+# Output tokens: a share for each of the four sections plus, per detailed variable,
+# its analysis block and its threshold line. The Safety report reads the last
+# section (RISK ASSESSMENT), so the budget must leave room to reach it
+OUTPUT_SECTIONS = 4
+OUTPUT_TOKENS_PER_SECTION = 150
+OUTPUT_TOKENS_PER_VARIABLE = 70
+MAX_OUTPUT_TOKENS = 4000
+
+PROMPT_HEADER = """Analyze this industrial process data and provide a structured, comprehensive technical report in a clean and uniform format.
+
+**Key Requirements:**
+- Use consistent indentation and bullet points throughout
+- Use bold text sparingly and only for main section headers
+- Maintain consistent formatting across all sections
+- Focus on actionable insights and clear data presentation
+"""
+
+PROMPT_FOOTER = """
+Use consistent bullet points and maintain proper indentation. Replace placeholders with specific numerical values and technical details."""
+
+FIXED_SECTIONS = """2. OPTIMIZATION PRIORITIES
+   • Primary Targets
+      - [Target 1]
+      - [Target 2]
+      - [Target 3]
+
+   • Expected Improvements
+      - Efficiency: [X]% improvement
+      - Quality: [specific improvements]
+      - Cost: [estimated savings]
+
+3. TECHNICAL RECOMMENDATIONS
+   • Immediate Actions
+      - [Action 1]
+      - [Action 2]
+      - [Action 3]
+
+   • Long-term Strategy
+      - [Strategy 1]
+      - [Strategy 2]
+      - [Strategy 3]
+"""
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def output_tokens(detailed):
+    """Output token limit for a report with this many detailed variables"""
+    return OUTPUT_SECTIONS * OUTPUT_TOKENS_PER_SECTION + OUTPUT_TOKENS_PER_VARIABLE * detailed
+
+
+def rank_variables(data):
+    """Every variable named in the data, highest impact first"""
+    impact = data.get('top_impact', {})
+    names = dict.fromkeys(list(impact) + list(data.get('top_variables', {}))
+                          + list(data.get('setpoint_impact_summary', {})))
+    return sorted(names, key=lambda name: -float(impact.get(name, 0) or 0))
+
+
+def describe_variable(name, data):
+    """One compact line with everything known about a variable"""
+    parts = [name]
+    impact = data.get('top_impact', {}).get(name)
+    if impact is not None:
+        parts.append(f"impact {impact * 100:.1f}%")
+    current = data.get('top_variables', {}).get(name)
+    if current:
+        parts.append(f"value {current.get('value')} {current.get('unit', '')}".rstrip())
+    setpoint = data.get('setpoint_impact_summary', {}).get(name)
+    if setpoint:
+        parts.append(f"{setpoint.get('impact')} (confidence {setpoint.get('confidence')})")
+    window = data.get('window_summary', {}).get('columns', {}).get(name)
+    if window and window.get('count'):
+        parts.append(f"window mean {window['mean']:.3g} [{window['min']:.3g}, {window['max']:.3g}] n={window['count']}")
+    return " | ".join(parts)
+
+
+def _variable_template(name, data):
+    impact = data.get('top_impact', {}).get(name)
+    label = f"{impact * 100:.1f}%" if impact is not None else "X%"
+    return (f"   • {name} (Impact: {label})\n"
+            "      - Current Value: [value] [unit]\n"
+            "      - Confidence Level: [percentage]\n"
+            "      - Critical Range: [range]\n"
+            "      - Impact Level: [level]\n")
+
+
+def _summary_table(names, data):
+    # Variables beyond the detailed ones: aggregate figures plus a name,impact table
+    impact = data.get('top_impact', {})
+    levels = {}
+    for name in names:
+        level = data.get('setpoint_impact_summary', {}).get(name, {}).get('impact', 'Unrated')
+        levels[level] = levels.get(level, 0) + 1
+    share = sum(float(impact.get(name, 0) or 0) for name in names)
+    header = (f"• Other Variables ({len(names)}, combined impact {share * 100:.1f}%; "
+              + ", ".join(f"{count} {level}" for level, count in sorted(levels.items())) + "):\n")
+    return header, [f"{name},{float(impact.get(name, 0) or 0) * 100:.3g}" for name in names]
+
+
+def build_insights_prompt(data, token_budget=DEFAULT_PROMPT_TOKENS, max_detailed=DEFAULT_DETAILED_VARIABLES):
+    """
+    Prompt for the technical analysis, kept within token_budget however many
+    variables the data holds.
+
+    The highest-impact variables (up to max_detailed) get a line of input data
+    and their own block in the output template; the rest are compacted into a
+    name,impact% table that is cut off once the budget runs out. Returns the
+    prompt, the output token limit and the estimated token counts.
+    """
+    ranked = rank_variables(data)
+    kpi = data.get('window_summary', {}).get('columns', {}).get('KPI')
+    kpi_line = (f"• KPI in window: mean {kpi['mean']:.3g} [{kpi['min']:.3g}, {kpi['max']:.3g}] n={kpi['count']}\n"
+                if kpi and kpi.get('count') else "")
+
+    def assemble(detailed, table_header, table_rows, omitted):
+        input_lines = "".join(f"• {describe_variable(name, data)}\n" for name in detailed)
+        table = ""
+        if table_header:
+            table = table_header + "   name,impact%\n" + "".join(f"   {row}\n" for row in table_rows)
+            if omitted:
+                table += f"   (+{omitted} more with lower impact)\n"
+        thresholds = "".join(f"      - {name}: [range]\n" for name in detailed)
+        return (PROMPT_HEADER
+                + "\n**Input Data:**\n" + kpi_line + input_lines + table
+                + "\n**Required Format:**\n\n1. KEY VARIABLE ANALYSIS\n"
+                + "\n".join(_variable_template(name, data) for name in detailed)
+                + "\n" + FIXED_SECTIONS
+                + "\n4. RISK ASSESSMENT\n   • Critical Thresholds\n" + thresholds
+                + "\n   • Safety Protocols\n      - [Protocol 1]\n      - [Protocol 2]\n      - [Protocol 3]\n"
+                + PROMPT_FOOTER)
+
+    # Add detailed variables while the prompt (without the table) fits the budget
+    detailed = []
+    for name in ranked[:max_detailed]:
+        if detailed and estimate_tokens(assemble(detailed + [name], "", [], 0)) > token_budget:
+            break
+        detailed.append(name)
+
+    rest = ranked[len(detailed):]
+    rows = []
+    header = ""
+    if rest:
+        header, all_rows = _summary_table(rest, data)
+        used = estimate_tokens(assemble(detailed, header, [], len(rest)))
+        for row in all_rows:
+            cost = estimate_tokens(f"   {row}\n")
+            if used + cost > token_budget:
+                break
+            rows.append(row)
+            used += cost
+
+    prompt = assemble(detailed, header, rows, len(rest) - len(rows))
+    max_tokens = min(MAX_OUTPUT_TOKENS, output_tokens(len(detailed)))
+    return {
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "prompt_tokens": estimate_tokens(prompt),
+        "detailed": detailed,
+        "summarized": len(rows),
+        "omitted": len(rest) - len(rows),
+    }
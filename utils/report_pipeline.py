@@ -0,0 +1,121 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Background threads generating values ahead of a request, and the most kept pending
+PREFETCH_WORKERS = 2
+MAX_PREFETCH = 32
+
+
+class ReportPipeline:
+    """
+    Report sections with declared dependencies, evaluated lazily per report type.
+
+    Values (such as the AI insights) are functions of other values or of the
+    render inputs; a render computes only the values its report type's sections
+    require, each once, so a report without an AI section never calls the LLM.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._sections = {}
+        self._report_types = {}
+
+    def value(self, name, depends=()):
+        """Register function(**depends) as the provider of a value"""
+        def decorator(func):
+            self._values[name] = (func, tuple(depends))
+            return func
+        return decorator
+
+    def section(self, name, requires=()):
+        """Register function(writer, **requires) as a section drawing onto the writer"""
+        def decorator(func):
+            self._sections[name] = (func, tuple(requires))
+            return func
+        return decorator
+
+    def report_type(self, name, sections):
+        missing = [section for section in sections if section not in self._sections]
+        if missing:
+            raise KeyError(f"Unknown sections for report type {name}: {', '.join(missing)}")
+        self._report_types[name] = tuple(sections)
+
+    def sections(self, report_type):
+        return self._report_types[report_type]
+
+    def required_values(self, report_type):
+        """Every value the report type needs, dependencies first"""
+        order = []
+
+        def visit(name, path):
+            if name in order:
+                return
+            if name in path:
+                raise ValueError(f"Value dependency cycle: {' -> '.join(path + (name,))}")
+            for dependency in self._values.get(name, (None, ()))[1]:
+                visit(dependency, path + (name,))
+            order.append(name)
+
+        for section in self.sections(report_type):
+            for name in self._sections[section][1]:
+                visit(name, ())
+        return order
+
+    def needs(self, report_type, value):
+        return value in self.required_values(report_type)
+
+    def render(self, report_type, writer, **inputs):
+        """Draw the report type's sections in order, computing each required value on first use"""
+        values = dict(inputs)
+
+        def resolve(name):
+            if name not in values:
+                if name not in self._values:
+                    raise KeyError(f"No input or provider for value {name}")
+                func, depends = self._values[name]
+                values[name] = func(**{dependency: resolve(dependency) for dependency in depends})
+            return values[name]
+
+        for section in self.sections(report_type):
+            func, requires = self._sections[section]
+            func(writer, **{name: resolve(name) for name in requires})
+
+
+class Prefetcher:
+    """
+    Runs functions in background threads ahead of the request that needs them.
+    A key already pending is not submitted again; the results are expected to
+    land in a cache the later request reads.
+    """
+
+    def __init__(self, workers=PREFETCH_WORKERS, limit=MAX_PREFETCH):
+        self.workers = workers
+        self.limit = limit
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, *args):
+        """Start func(*args) unless key is already pending; returns whether it was started"""
+        with self._lock:
+            if key in self._pending or len(self._pending) >= self.limit:
+                return False
+            # Threads are only started on first use, so a forking server's master has none
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+            future = self._executor.submit(self._run, key, func, *args)
+            self._pending[key] = future
+            return True
+
+    def _run(self, key, func, *args):
+        try:
+            return func(*args)
+        except Exception as e:
+            print(f"Prefetch Error: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
@@ -0,0 +1,380 @@
+import contextlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from utils.shared_cache import CACHE_DIR, private_directory
+
+# Directory holding appended result chunks, shared by every worker on the host
+RESULTS_DIR = os.getenv('RESULTS_DIR', os.path.join(CACHE_DIR, 'results'))
+# Appended rows kept on disk; the oldest chunks are deleted past either limit
+RESULTS_MAX_ROWS = int(os.getenv('RESULTS_MAX_ROWS', 20000000))
+RESULTS_MAX_AGE_DAYS = float(os.getenv('RESULTS_MAX_AGE_DAYS', 30))
+# Past RESULTS_MAX_ROWS, chunks are pruned down to this share of it, so pruning is occasional
+RESULTS_PRUNE_TO = 0.9
+
+# A chunk is a directory of uncompressed .npy columns plus meta.json, read memory-mapped
+CHUNK_SUFFIX = '.chunk'
+CHUNK_COLUMNS = ('X', 'kpi', 'equipment', 'scenario', 'timestamp')
+LOCK_FILE = '.append.lock'
+
+
+def equipment_key(name):
+    """Normalized equipment name, so 'Reactor A' matches the report's 'reactor_a'"""
+    return str(name).strip().lower().replace(' ', '_')
+
+
+def chunk_rows(name):
+    """Row count recorded in a chunk's directory name"""
+    return int(name.split('-')[1])
+
+
+class ResultsStore:
+    """
+    Append-only columnar store of scenario results.
+
+    The baseline comes from the results JSON; every appended batch is written as
+    its own chunk directory so other worker processes pick it up on their next
+    refresh(). Chunk columns are memory-mapped, so workers share their pages
+    through the OS cache instead of each holding a copy. Equipment is stored as
+    integer codes into the chunk's equipment list; arrays() maps them onto one
+    sorted lookup table of every name held.
+
+    Appends are serialized by a lock file: each chunk is named after the append
+    order and numbers its scenarios after the previous chunk's, so every worker
+    reads the same chunks in the same order with the same scenario ids.
+    """
+
+    def __init__(self, directory=RESULTS_DIR, max_rows=RESULTS_MAX_ROWS, max_age_days=RESULTS_MAX_AGE_DAYS):
+        self.directory = directory
+        self.max_rows = max_rows
+        self.max_age = max_age_days * 86400
+        private_directory(directory)
+        self._lock = threading.RLock()
+        self._baseline = None
+        self._chunks = []
+        self._loaded_files = set()
+        self._baseline_key = None
+        self._listeners = []
+        self.version = 0
+        # Bumped when rows are replaced rather than appended or pruned (baseline reload, clear)
+        self.generation = 0
+
+    # Loading
+    def load_baseline(self, results, key=None, timestamp=None):
+        """
+        Use simulated_data from a results dict as the first rows of the store,
+        timestamped at timestamp (the results file's mtime) or now
+        """
+        with self._lock:
+            if key is not None and key == self._baseline_key:
+                return
+            records = results.get('simulated_summary', {}).get('simulated_data', [])
+            names = list(dict.fromkeys(name for record in records for name in record.get('variables', {})))
+            X = np.array([[record.get('variables', {}).get(name, np.nan) for name in names]
+                          for record in records], dtype=float).reshape(len(records), len(names))
+            equipment_names, codes = np.unique(np.array([str(record.get('equipment', '')) for record in records],
+                                                        dtype=str), return_inverse=True)
+            self._baseline = {
+                'file': None,
+                'key': 0,
+                'scenario': np.array([record.get('scenario', i + 1) for i, record in enumerate(records)], dtype=np.int64),
+                'equipment': codes.astype(np.int32),
+                'equipment_names': equipment_names.tolist(),
+                'names': names,
+                'X': X,
+                'kpi': np.array([record.get('kpi_value', np.nan) for record in records], dtype=float),
+                'timestamp': np.full(len(records), time.time() if timestamp is None else timestamp),
+            }
+            self._baseline_key = key
+            self.generation += 1
+            self.version += 1
+
+    def _list(self):
+        try:
+            return sorted(name for name in os.listdir(self.directory) if name.endswith(CHUNK_SUFFIX))
+        except FileNotFoundError:
+            return []
+
+    def _read(self, name):
+        path = os.path.join(self.directory, name)
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        chunk = {column: np.load(os.path.join(path, column + '.npy'), mmap_mode='r', allow_pickle=False)
+                 for column in CHUNK_COLUMNS}
+        chunk.update(file=name, key=int(name.split('-')[0]), names=meta['names'],
+                     equipment_names=meta['equipment'])
+        return chunk
+
+    def refresh(self):
+        """Pick up chunks appended (or pruned) by any process since the last call"""
+        files = self._list()
+        if set(files) == self._loaded_files:
+            return self.version
+        loaded, dropped = [], []
+        with self._lock:
+            current = set(files)
+            removed = self._loaded_files - current
+            reordered = False
+            for name in files:
+                if name in self._loaded_files:
+                    continue
+                try:
+                    chunk = self._read(name)
+                except FileNotFoundError:
+                    # Pruned or cleared by another worker between listing and loading
+                    current.discard(name)
+                    continue
+                # Appends are serialized, so a chunk sorting before one already held is unexpected
+                reordered = reordered or bool(self._chunks and name < self._chunks[-1]['file'])
+                self._chunks.append(chunk)
+                self._loaded_files.add(name)
+                loaded.append(chunk)
+            if removed or reordered:
+                dropped = [chunk for chunk in self._chunks if chunk['file'] not in current]
+                self._chunks = sorted((chunk for chunk in self._chunks if chunk['file'] in current),
+                                      key=lambda chunk: chunk['file'])
+                self._loaded_files = {chunk['file'] for chunk in self._chunks}
+            if reordered:
+                self.generation += 1
+                # Subscribers rebuild from chunks() when the generation changes
+                loaded, dropped = [], []
+            self.version += 1
+            listeners = list(self._listeners)
+        # Pruned chunks are dropped by subscribers before the new ones are added
+        self._notify([on_remove for _, on_remove in listeners if on_remove], dropped)
+        self._notify([on_append for on_append, _ in listeners], loaded)
+        return self.version
+
+    # Writing
+    @contextlib.contextmanager
+    def _append_lock(self):
+        # Held across processes while a chunk is numbered, written and published
+        if fcntl is None:
+            with self._lock:
+                yield
+            return
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _last_scenario(self, files):
+        if files:
+            with open(os.path.join(self.directory, files[-1], 'meta.json'), 'r') as f:
+                return json.load(f)['last_scenario']
+        baseline = self._baseline
+        return int(baseline['scenario'].max()) if baseline is not None and len(baseline['scenario']) else 0
+
+    def append(self, equipment, names, X, kpi, scenarios=None, timestamps=None):
+        """
+        Persist a batch of results and make it visible to every worker.
+
+        scenarios numbers the batch's rows from 0 (rows sharing a number belong to
+        one scenario); they are stored offset past the previous chunk's scenarios.
+        """
+        kpi = np.asarray(kpi, dtype=float)
+        if not len(kpi):
+            return 0
+        X = np.asarray(X, dtype=float).reshape(len(kpi), len(names))
+        equipment_names, codes = np.unique(np.asarray(equipment, dtype=str), return_inverse=True)
+        scenarios = np.arange(len(kpi)) if scenarios is None else np.asarray(scenarios, dtype=np.int64)
+        if timestamps is None:
+            timestamps = np.full(len(kpi), time.time())
+        timestamps = np.asarray(timestamps, dtype=float)
+        # Rows are kept in time order within a chunk, so time windows are index ranges
+        if len(timestamps) > 1 and (np.diff(timestamps) < 0).any():
+            order = np.argsort(timestamps, kind='stable')
+            kpi, X, codes = kpi[order], X[order], codes[order]
+            scenarios, timestamps = scenarios[order], timestamps[order]
+        with self._append_lock():
+            files = self._list()
+            # Names sort in append order, even if the clock steps back
+            created = time.time_ns()
+            if files:
+                created = max(created, int(files[-1].split('-')[0]) + 1)
+            name = f"{created:020d}-{len(kpi):012d}-{uuid.uuid4().hex[:8]}{CHUNK_SUFFIX}"
+            scenario = scenarios + self._last_scenario(files) + 1
+            path = os.path.join(self.directory, name)
+            temp_path = path + '.tmp'
+            os.makedirs(temp_path)
+            columns = {'X': X, 'kpi': kpi, 'equipment': codes.astype(np.int32), 'scenario': scenario,
+                       'timestamp': timestamps}
+            for column, values in columns.items():
+                np.save(os.path.join(temp_path, column + '.npy'), values)
+            with open(os.path.join(temp_path, 'meta.json'), 'w') as f:
+                json.dump({'names': list(names), 'equipment': equipment_names.tolist(), 'rows': len(kpi),
+                           'last_scenario': int(scenario.max())}, f)
+            os.rename(temp_path, path)
+            self._prune(files + [name])
+        self.refresh()
+        return len(kpi)
+
+    def _prune(self, files):
+        # Oldest chunks beyond the age limit, and past the row limit down to
+        # RESULTS_PRUNE_TO of it; never the one just written
+        now = time.time_ns()
+        total = sum(chunk_rows(name) for name in files)
+        target = self.max_rows * RESULTS_PRUNE_TO if total > self.max_rows else self.max_rows
+        for name in files[:-1]:
+            expired = now - int(name.split('-')[0]) > self.max_age * 1e9
+            if total <= target and not expired:
+                break
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            total -= chunk_rows(name)
+        # Directories left by a writer that died before publishing
+        for name in os.listdir(self.directory):
+            if name.endswith(CHUNK_SUFFIX + '.tmp'):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    @staticmethod
+    def _notify(listeners, chunks):
+        for chunk in chunks:
+            for listener in listeners:
+                try:
+                    listener(chunk)
+                except Exception as e:
+                    print(f"Results Listener Error: {str(e)}")
+
+    def subscribe(self, listener, on_remove=None):
+        """
+        Call listener(chunk) for every batch appended here or picked up from other
+        workers; chunk holds names, X, kpi, equipment codes (into equipment_names),
+        scenario and timestamp arrays (rows in time order), and its sort key.
+        on_remove(chunk), when given, is called for each chunk pruned from the store.
+        """
+        with self._lock:
+            self._listeners.append((listener, on_remove))
+
+    def clear(self):
+        """Delete appended chunks, keeping the baseline"""
+        with self._append_lock():
+            for name in self._list():
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        with self._lock:
+            self._chunks = []
+            self._loaded_files = set()
+            self.generation += 1
+            self.version += 1
+
+    # Reading
+    def token(self):
+        """Version token that is identical in every worker holding the same rows"""
+        self.refresh()
+        with self._lock:
+            first = self._chunks[0]['file'] if self._chunks else ''
+            last = self._chunks[-1]['file'] if self._chunks else ''
+            return f"{self._baseline_key}:{len(self._chunks)}:{first}:{last}"
+
+    def chunks(self):
+        """Chunks held so far in append order (baseline first), without refreshing"""
+        with self._lock:
+            return ([self._baseline] if self._baseline is not None else []) + self._chunks
+
+    def equipment_names(self):
+        """Sorted equipment lookup table, indexed by the codes arrays() returns"""
+        return sorted({name for chunk in self.chunks() for name in chunk['equipment_names']})
+
+    def __len__(self):
+        return sum(len(chunk['kpi']) for chunk in self.chunks())
+
+    def arrays(self):
+        """
+        (names, X, kpi, equipment codes, scenario, timestamp) over every row.
+
+        Concatenated on each call and not kept, so callers should cache what they
+        derive from it (per token()) rather than the arrays themselves.
+        """
+        self.refresh()
+        chunks = self.chunks()
+        names = list(dict.fromkeys(name for chunk in chunks for name in chunk['names']))
+        index = {name: i for i, name in enumerate(names)}
+        total = sum(len(chunk['kpi']) for chunk in chunks)
+        X = np.full((total, len(names)), np.nan)
+        start = 0
+        for chunk in chunks:
+            rows = len(chunk['kpi'])
+            columns = [index[name] for name in chunk['names']]
+            X[start:start + rows, columns] = chunk['X']
+            start += rows
+        if not chunks:
+            return names, X, np.empty(0), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64), np.empty(0)
+        lookup = {name: i for i, name in enumerate(sorted({name for chunk in chunks
+                                                           for name in chunk['equipment_names']}))}
+        kpi = np.concatenate([chunk['kpi'] for chunk in chunks])
+        equipment = np.concatenate([
+            np.array([lookup[name] for name in chunk['equipment_names']], dtype=np.int32)[chunk['equipment']]
+            for chunk in chunks])
+        scenario = np.concatenate([chunk['scenario'] for chunk in chunks])
+        timestamp = np.concatenate([chunk['timestamp'] for chunk in chunks])
+        return names, X, kpi, equipment, scenario, timestamp
+
+    def iter_records(self, equipment=None, start=None, end=None):
+        """
+        Yield simulated_data style records, optionally for one equipment and time
+        window, working through one chunk at a time so memory stays bounded.
+        """
+        self.refresh()
+        key = None if equipment is None else equipment_key(equipment)
+        for chunk in self.chunks():
+            mask = np.ones(len(chunk['kpi']), dtype=bool)
+            if key is not None and len(mask):
+                matches = np.array([equipment_key(name) == key for name in chunk['equipment_names']], dtype=bool)
+                mask &= matches[chunk['equipment']]
+            if start is not None:
+                mask &= chunk['timestamp'] >= start
+            if end is not None:
+                mask &= chunk['timestamp'] < end
+            rows = np.flatnonzero(mask)
+            names = chunk['names']
+            equipment_names = chunk['equipment_names']
+            for scenario, code, row_values, kpi in zip(
+                chunk['scenario'][rows].tolist(), chunk['equipment'][rows].tolist(),
+                chunk['X'][rows].tolist(), chunk['kpi'][rows].tolist()
+            ):
+                yield {
+                    'scenario': scenario,
+                    'equipment': equipment_names[code],
+                    'variables': {name: value for name, value in zip(names, row_values) if value == value},
+                    'kpi_value': kpi,
+                }
+
+    def to_simulated_data(self, equipment=None, start=None, end=None, limit=None):
+        records = []
+        for record in self.iter_records(equipment, start, end):
+            if limit is not None and len(records) >= limit:
+                break
+            records.append(record)
+        return records
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_results_store(results_path=None):
+    """Process-wide results store, seeded from the results JSON when given"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultsStore()
+    if results_path is not None:
+        stat = os.stat(results_path)
+        key = (results_path, stat.st_mtime_ns, stat.st_size)
+        if key != _store._baseline_key:
+            with open(results_path, 'r') as f:
+                _store.load_baseline(json.load(f), key, stat.st_mtime)
+    _store.refresh()
+    return _store
@@ -0,0 +1,246 @@
+import threading
+
+import numpy as np
+
+from utils.results_store import equipment_key
+
+# Bucket widths (seconds) of the materialized rollups, coarsest first
+RESOLUTIONS = {"day": 86400, "hour": 3600}
+HOUR = RESOLUTIONS["hour"]
+KPI_COLUMN = "KPI"
+
+# Per-column statistics layout: count, sum, min, max
+COUNT, SUM, MIN, MAX = range(4)
+
+
+def _empty_stats(columns):
+    stats = np.zeros((columns, 4))
+    stats[:, MIN] = np.inf
+    stats[:, MAX] = -np.inf
+    return stats
+
+
+def _merge(target, stats):
+    """Merge stats into target in place (target may have more columns)"""
+    columns = len(stats)
+    target[:columns, COUNT] += stats[:, COUNT]
+    target[:columns, SUM] += stats[:, SUM]
+    np.minimum(target[:columns, MIN], stats[:, MIN], out=target[:columns, MIN])
+    np.maximum(target[:columns, MAX], stats[:, MAX], out=target[:columns, MAX])
+
+
+def reduce_groups(values, groups):
+    """Per-group count/sum/min/max of every column, ignoring NaN: (group ids, stats[G, C, 4])"""
+    order = np.argsort(groups, kind="stable")
+    groups, values = groups[order], values[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    valid = ~np.isnan(values)
+    stats = np.empty((len(starts), values.shape[1], 4))
+    stats[:, :, COUNT] = np.add.reduceat(valid, starts, axis=0)
+    stats[:, :, SUM] = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+    stats[:, :, MIN] = np.minimum.reduceat(np.where(valid, values, np.inf), starts, axis=0)
+    stats[:, :, MAX] = np.maximum.reduceat(np.where(valid, values, -np.inf), starts, axis=0)
+    return groups[starts], stats
+
+
+class WindowRollups:
+    """
+    Per-hour and per-day count/sum/min/max of the KPI and every variable, overall
+    and per equipment, updated from each batch the results store receives.
+
+    A time window is answered from whole days, then whole hours at either end,
+    and only the raw rows of the (at most two) partial hours at its edges. Each
+    bucket keeps one partial result per chunk, so a chunk pruned from the store
+    is dropped without recomputing anything.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._reset()
+        store.subscribe(self.ingest, self.remove)
+
+    def _reset(self):
+        self._columns = [KPI_COLUMN]
+        self._index = {KPI_COLUMN: 0}
+        # resolution -> {(equipment key or None, bucket start): {chunk file: stats}}
+        self._buckets = {name: {} for name in RESOLUTIONS}
+        # (resolution, bucket key) -> stats merged over its chunks, built when first read
+        self._merged = {}
+        # chunk file -> [(resolution, bucket key)] and hour starts it contributed to
+        self._chunk_buckets = {}
+        self._chunk_hours = {}
+        # hour start -> [(chunk, start row, stop row)]; rows of a chunk are in time order
+        self._hour_rows = {}
+        self._generation = self.store.generation
+        for chunk in self.store.chunks():
+            self._ingest(chunk)
+
+    def _values(self, chunk, rows=slice(None)):
+        # KPI and variables laid out in this rollup's column order
+        for name in chunk["names"]:
+            if name not in self._index:
+                self._index[name] = len(self._columns)
+                self._columns.append(name)
+        kpi = np.asarray(chunk["kpi"], dtype=float)[rows]
+        values = np.full((len(kpi), len(self._columns)), np.nan)
+        values[:, 0] = kpi
+        if chunk["names"]:
+            values[:, [self._index[name] for name in chunk["names"]]] = np.asarray(chunk["X"])[rows]
+        return values
+
+    def ingest(self, chunk):
+        with self._lock:
+            if self._generation != self.store.generation:
+                self._reset()
+            else:
+                self._ingest(chunk)
+
+    def remove(self, chunk):
+        """Drop a chunk pruned from the store"""
+        with self._lock:
+            if self._generation != self.store.generation:
+                self._reset()
+                return
+            file = chunk["file"]
+            for name, key in self._chunk_buckets.pop(file, []):
+                parts = self._buckets[name].get(key)
+                if parts is not None:
+                    parts.pop(file, None)
+                    if not parts:
+                        del self._buckets[name][key]
+                self._merged.pop((name, key), None)
+            for hour in self._chunk_hours.pop(file, []):
+                ranges = [entry for entry in self._hour_rows.get(hour, []) if entry[0]["file"] != file]
+                if ranges:
+                    self._hour_rows[hour] = ranges
+                else:
+                    self._hour_rows.pop(hour, None)
+
+    def _ingest(self, chunk):
+        if not len(chunk["kpi"]):
+            return
+        file = chunk["file"]
+        values = self._values(chunk)
+        timestamps = np.asarray(chunk["timestamp"], dtype=float)
+        # Equipment codes of the chunk mapped onto codes of their normalized keys
+        keys, key_codes = np.unique([equipment_key(name) for name in chunk["equipment_names"]],
+                                    return_inverse=True)
+        codes = key_codes[np.asarray(chunk["equipment"])]
+        touched = self._chunk_buckets.setdefault(file, [])
+        for name, width in RESOLUTIONS.items():
+            buckets = np.floor(timestamps / width).astype(np.int64)
+            base = int(buckets.min())
+            span = int(buckets.max()) - base + 1
+            table = self._buckets[name]
+            # Overall and per-equipment groups, as (bucket offset) and (equipment, bucket offset) ids
+            for ids, label in ((buckets - base, lambda g: None),
+                               (codes * span + (buckets - base), lambda g: keys[g // span])):
+                groups, stats = reduce_groups(values, ids)
+                for group, group_stats in zip(groups.tolist(), stats):
+                    key = (label(group), (base + group % span) * width)
+                    table.setdefault(key, {})[file] = group_stats
+                    self._merged.pop((name, key), None)
+                    touched.append((name, key))
+        hours = np.floor(timestamps / HOUR).astype(np.int64)
+        edges = np.flatnonzero(np.r_[True, hours[1:] != hours[:-1], True])
+        hour_starts = self._chunk_hours.setdefault(file, [])
+        for low, high in zip(edges[:-1].tolist(), edges[1:].tolist()):
+            hour = int(hours[low]) * HOUR
+            self._hour_rows.setdefault(hour, []).append((chunk, low, high))
+            hour_starts.append(hour)
+
+    def _stats(self, name, key):
+        # Bucket stats merged over the chunks that contributed to it
+        merged = self._merged.get((name, key))
+        if merged is None:
+            parts = self._buckets[name].get(key)
+            if not parts:
+                return None
+            merged = _empty_stats(len(self._columns))
+            for stats in parts.values():
+                _merge(merged, stats)
+            self._merged[(name, key)] = merged
+        return merged
+
+    def _raw(self, hour, start, end, key, total):
+        # Rows of one hour bucket inside [start, end)
+        for chunk, low, high in self._hour_rows.get(hour, []):
+            timestamps = np.asarray(chunk["timestamp"], dtype=float)
+            first = low + int(np.searchsorted(timestamps[low:high], start, side="left"))
+            last = low + int(np.searchsorted(timestamps[low:high], end, side="left"))
+            if first >= last:
+                continue
+            rows = np.arange(first, last)
+            if key is not None:
+                matches = np.array([equipment_key(name) == key for name in chunk["equipment_names"]], dtype=bool)
+                rows = rows[matches[np.asarray(chunk["equipment"])[first:last]]]
+            if len(rows):
+                values = self._values(chunk, rows)
+                _, stats = reduce_groups(values, np.zeros(len(values), dtype=np.int64))
+                _merge(total, stats[0])
+
+    def summarize(self, start, end, equipment=None):
+        """
+        Count, mean, min and max of every column over [start, end) (epoch seconds),
+        for all equipment or one (matched by equipment_key).
+        """
+        self.store.refresh()
+        key = None if equipment in (None, "all") else equipment_key(equipment)
+        with self._lock:
+            if self._generation != self.store.generation:
+                self._reset()
+            total = _empty_stats(len(self._columns))
+            used = {"day": 0, "hour": 0, "raw_hours": 0}
+            day, hour = RESOLUTIONS["day"], HOUR
+            first_hour, last_hour = -(-int(start) // hour) * hour, int(end) // hour * hour
+            if first_hour >= last_hour:
+                # Window inside a single hour (or straddling one boundary): raw rows only
+                for edge in sorted({int(start) // hour * hour, int(end) // hour * hour}):
+                    self._raw(edge, start, end, key, total)
+                    used["raw_hours"] += 1
+            else:
+                first_day, last_day = -(-first_hour // day) * day, last_hour // day * day
+                if first_day >= last_day:
+                    first_day = last_day = first_hour
+                hour_ranges = [(first_hour, first_day), (last_day, last_hour)]
+                for bucket in range(first_day, last_day, day):
+                    stats = self._stats("day", (key, bucket))
+                    if stats is not None:
+                        _merge(total, stats)
+                    used["day"] += 1
+                for low, high in hour_ranges:
+                    for bucket in range(low, high, hour):
+                        stats = self._stats("hour", (key, bucket))
+                        if stats is not None:
+                            _merge(total, stats)
+                        used["hour"] += 1
+                if start < first_hour:
+                    self._raw(first_hour - hour, start, first_hour, key, total)
+                    used["raw_hours"] += 1
+                if last_hour < end:
+                    self._raw(last_hour, last_hour, end, key, total)
+                    used["raw_hours"] += 1
+            columns = {}
+            for name, stats in zip(self._columns, total):
+                count = int(stats[COUNT])
+                columns[name] = {
+                    "count": count,
+                    "mean": float(stats[SUM] / count) if count else None,
+                    "min": float(stats[MIN]) if count else None,
+                    "max": float(stats[MAX]) if count else None,
+                }
+            return {"start": start, "end": end, "columns": columns, "buckets": used}
+
+
+_rollups = None
+_rollups_lock = threading.Lock()
+
+
+def get_rollups(store):
+    """Process-wide rollups attached to the results store"""
+    global _rollups
+    with _rollups_lock:
+        if _rollups is None:
+            _rollups = WindowRollups(store)
+        return _rollups
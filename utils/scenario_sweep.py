@@ -0,0 +1,239 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import zlib
+
+import numpy as np
+
+from utils.topology import build_topology
+
+try:
+    from scipy.stats import qmc
+except ImportError:
+    qmc = None
+
+# Setpoint ranges swept when the caller does not pass its own
+DEFAULT_SETPOINTS = [
+    {"name": "Temperature", "low": 60.0, "high": 110.0},
+    {"name": "Pressure", "low": 1.0, "high": 4.0},
+    {"name": "Flow Rate", "low": 70.0, "high": 130.0},
+]
+DESIGNS = ["grid", "latin_hypercube", "sobol"]
+
+# Scenarios evaluated per task, and the largest sweep accepted in one run
+SWEEP_BATCH_SIZE = 2000
+MAX_SCENARIOS = 200000
+# Most result rows (scenarios x units) one sweep appends to the results store
+MAX_SWEEP_ROWS = int(os.getenv("MAX_SWEEP_ROWS", 5000000))
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+# Below this many scenario-unit evaluations the pool start-up costs more than it saves
+# (well under MAX_SWEEP_ROWS, so capped sweeps of any size still run in parallel)
+PARALLEL_THRESHOLD = 200000
+
+# Worker-side views of the shared design and result arrays
+_shared = {}
+
+
+# Designs over the unit cube
+def grid_design(n, dimensions):
+    """
+    Full-factorial grid of at most n points that varies every setpoint: each gets
+    floor(n ** (1 / dimensions)) levels, and the first ones a level more while the
+    grid still fits. Below 2 ** dimensions points the two-level grid is sampled
+    evenly from its all-low to its all-high corner.
+    """
+    levels = int(np.floor(n ** (1.0 / dimensions) + 1e-9))
+    if levels < 2:
+        corners = np.stack(np.meshgrid(*([np.array([0.0, 1.0])] * dimensions), indexing="ij"), axis=-1)
+        corners = corners.reshape(-1, dimensions)
+        return corners[np.unique(np.linspace(0, len(corners) - 1, n).round().astype(int))]
+    counts = [levels] * dimensions
+    for i in range(dimensions):
+        if math.prod(counts) // levels * (levels + 1) > n:
+            break
+        counts[i] += 1
+    axes = [np.linspace(0.0, 1.0, count) for count in counts]
+    return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, dimensions)
+
+
+def latin_hypercube(n, dimensions, seed=0):
+    """One point per stratum in every dimension, strata shuffled independently"""
+    rng = np.random.default_rng(seed)
+    strata = np.argsort(rng.random((dimensions, n)), axis=1).T
+    return (strata + rng.random((n, dimensions))) / n
+
+
+def _radical_inverse(indices, base):
+    result = np.zeros(len(indices))
+    fraction = 1.0 / base
+    indices = indices.copy()
+    while indices.any():
+        result += (indices % base) * fraction
+        indices //= base
+        fraction /= base
+    return result
+
+
+def halton(n, dimensions, skip=1):
+    """Halton low-discrepancy sequence (first primes as bases)"""
+    primes = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53]
+    indices = np.arange(skip, skip + n, dtype=np.int64)
+    return np.column_stack([_radical_inverse(indices, primes[d]) for d in range(dimensions)])
+
+
+def sobol_design(n, dimensions, seed=0):
+    """Scrambled Sobol points from SciPy, or a Halton sequence when SciPy is not installed"""
+    if qmc is not None:
+        return qmc.Sobol(d=dimensions, scramble=True, seed=seed).random(n)
+    return halton(n, dimensions)
+
+
+def build_design(design, n, setpoints, seed=0):
+    """Scenario setpoints (n x len(setpoints)) for the named design"""
+    dimensions = len(setpoints)
+    if design == "grid":
+        unit = grid_design(n, dimensions)
+    elif design == "latin_hypercube":
+        unit = latin_hypercube(n, dimensions, seed)
+    elif design == "sobol":
+        unit = sobol_design(n, dimensions, seed)
+    else:
+        raise ValueError(f"Unknown design: {design}")
+    low = np.array([float(s["low"]) for s in setpoints])
+    high = np.array([float(s["high"]) for s in setpoints])
+    return low + unit * (high - low)
+
+
+# KPI models
+def _unit_profile(unit, dimensions):
+    # Deterministic per-unit optimum and sensitivity, identical in every process
+    rng = np.random.default_rng(zlib.crc32(str(unit).encode("utf-8")))
+    return rng.uniform(0.3, 0.7, dimensions), rng.uniform(0.5, 2.0, dimensions)
+
+
+def quadratic_kpi_model(unit_design, unit, inlet):
+    """
+    Default unit model: efficiency falls off quadratically away from a per-unit
+    optimum and is scaled by the mean efficiency of the units feeding it.
+
+    unit_design holds the batch's setpoints mapped onto [0, 1]; inlet is the
+    feed efficiency (batch,) or None for a unit without upstream units.
+    """
+    optimum, sensitivity = _unit_profile(unit, unit_design.shape[1])
+    deviation = (unit_design - optimum) ** 2 @ sensitivity
+    efficiency = np.exp(-deviation)
+    return efficiency if inlet is None else efficiency * (0.5 + 0.5 * inlet)
+
+
+def evaluate_batch(unit_design, units, predecessors, model=quadratic_kpi_model):
+    """KPI (batch x units) for every unit, walking the flowsheet in topological order"""
+    kpi = np.empty((len(unit_design), len(units)))
+    for i, unit in enumerate(units):
+        feeds = predecessors[i]
+        inlet = kpi[:, feeds].mean(axis=1) if feeds else None
+        kpi[:, i] = model(unit_design, unit, inlet)
+    return kpi * 100.0
+
+
+def _attach(design_name, result_name, shape, unit_count):
+    design_shm = shared_memory.SharedMemory(name=design_name)
+    result_shm = shared_memory.SharedMemory(name=result_name)
+    _shared["handles"] = (design_shm, result_shm)
+    _shared["design"] = np.ndarray(shape, dtype=np.float64, buffer=design_shm.buf)
+    _shared["result"] = np.ndarray((shape[0], unit_count), dtype=np.float64, buffer=result_shm.buf)
+
+
+def _run_batch(start, stop, units, predecessors, model):
+    # Runs in a worker: reads its slice of the shared design and writes KPIs in place
+    _shared["result"][start:stop] = evaluate_batch(_shared["design"][start:stop], units, predecessors, model)
+    return start, stop
+
+
+def _sweep_units(node_rows, edge_rows):
+    topology = build_topology(node_rows, edge_rows)
+    order = topology.topological_order()
+    position = {node: i for i, node in enumerate(order)}
+    names = {row.get("id"): row.get("name") or row.get("id") for row in node_rows}
+    predecessors = [sorted(position[p] for p in topology.predecessors(node)) for node in order]
+    return [names.get(node, node) for node in order], predecessors
+
+
+def run_sweep(node_rows, edge_rows, setpoints=None, design="latin_hypercube", n_scenarios=1000,
+              model=quadratic_kpi_model, store=None, batch_size=SWEEP_BATCH_SIZE,
+              workers=MAX_WORKERS, seed=0):
+    """
+    Evaluate a setpoint design over every unit of the flowsheet.
+
+    Batches run in a process pool that reads the design from and writes KPIs to
+    shared memory; each finished batch is appended to the results store as it
+    lands. model(unit_design, unit, inlet) must be a picklable module-level
+    function. Returns a summary dict.
+    """
+    setpoints = setpoints or DEFAULT_SETPOINTS
+    n_scenarios = int(min(max(n_scenarios, 1), MAX_SCENARIOS))
+    units, predecessors = _sweep_units(node_rows, edge_rows)
+    if not units:
+        return {"scenarios": 0, "units": 0, "rows": 0}
+    n_scenarios = max(1, min(n_scenarios, MAX_SWEEP_ROWS // len(units)))
+    names = [s["name"] for s in setpoints]
+    design_values = build_design(design, n_scenarios, setpoints, seed)
+    low = np.array([float(s["low"]) for s in setpoints])
+    span = np.array([float(s["high"]) for s in setpoints]) - low
+    span[span == 0] = 1.0
+    unit_design = (design_values - low) / span
+    n = len(design_values)
+    batches = [(start, min(start + batch_size, n)) for start in range(0, n, batch_size)]
+
+    def publish(result, start, stop):
+        if store is not None:
+            rows = stop - start
+            store.append(
+                np.tile(np.array(units, dtype=str), rows),
+                names,
+                np.repeat(design_values[start:stop], len(units), axis=0),
+                result[start:stop].reshape(-1),
+                scenarios=np.repeat(np.arange(rows), len(units)),
+            )
+
+    parallel = workers > 1 and len(batches) > 1 and n * len(units) >= PARALLEL_THRESHOLD
+    if not parallel:
+        result = np.empty((n, len(units)))
+        for start, stop in batches:
+            result[start:stop] = evaluate_batch(unit_design[start:stop], units, predecessors, model)
+            publish(result, start, stop)
+    else:
+        design_shm = shared_memory.SharedMemory(create=True, size=unit_design.nbytes)
+        result_shm = shared_memory.SharedMemory(create=True, size=n * len(units) * 8)
+        try:
+            shared_design = np.ndarray(unit_design.shape, dtype=np.float64, buffer=design_shm.buf)
+            shared_design[:] = unit_design
+            result = np.ndarray((n, len(units)), dtype=np.float64, buffer=result_shm.buf)
+            # Spawned (not forked) workers never inherit the server's threads or held locks
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(workers, len(batches)), mp_context=context,
+                                     initializer=_attach,
+                                     initargs=(design_shm.name, result_shm.name, unit_design.shape, len(units))) as pool:
+                futures = [pool.submit(_run_batch, start, stop, units, predecessors, model)
+                           for start, stop in batches]
+                for future in as_completed(futures):
+                    publish(result, *future.result())
+            result = result.copy()
+            del shared_design
+        finally:
+            design_shm.close()
+            design_shm.unlink()
+            result_shm.close()
+            result_shm.unlink()
+
+    best = int(np.argmax(result.mean(axis=1)))
+    return {
+        "scenarios": n,
+        "units": len(units),
+        "rows": n * len(units),
+        "design": design,
+        "workers": min(workers, len(batches)) if parallel else 1,
+        "best_setpoints": {name: round(float(v), 3) for name, v in zip(names, design_values[best])},
+        "best_kpi": round(float(result[best].mean()), 2),
+    }
@@ -0,0 +1,293 @@
+import functools
+import getpass
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from dotenv import load_dotenv
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Cache location and limits, overridable from the environment (.env). The default
+# directory is per user, since entries are unpickled and must not be writable by others
+load_dotenv()
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(
+    tempfile.gettempdir(), f"process_first_cache-{os.getuid() if hasattr(os, 'getuid') else getpass.getuser()}"))
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 256 * 1024 * 1024))
+CACHE_DEFAULT_TTL = float(os.getenv('CACHE_DEFAULT_TTL', 3600))
+REDIS_URL = os.getenv('REDIS_URL')
+
+# How long a worker computing a value holds the lock, and how often others poll it
+LOCK_TIMEOUT = 60.0
+LOCK_POLL_INTERVAL = 0.05
+# Size-based eviction runs after this share of max_bytes has been written, or this many seconds
+EVICT_WRITE_FRACTION = 1 / 16
+EVICT_INTERVAL = 30.0
+# A hit rewrites an entry's access time only when it is older than this (seconds), so
+# most reads never take the SQLite write lock
+ACCESS_RESOLUTION = 60.0
+
+_MISSING = object()
+
+
+def make_key(*parts):
+    """Stable hash of JSON-serializable key parts"""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def private_directory(path):
+    """
+    Create path (mode 0700) if needed and check that only this user owns and can
+    use it; refuses a directory another user created first or can write to.
+    """
+    # Missing parents are created private as well (makedirs gives them the umask's mode)
+    missing = []
+    head = os.path.abspath(path)
+    while not os.path.isdir(head):
+        missing.append(head)
+        head = os.path.dirname(head)
+    for directory in reversed(missing):
+        try:
+            os.mkdir(directory, 0o700)
+        except FileExistsError:
+            pass
+    if hasattr(os, 'getuid'):
+        stat = os.stat(path)
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+            raise RuntimeError(f"{path} must be owned by the current user with mode 0700; "
+                               "fix its permissions or set CACHE_DIR to a private directory")
+    return path
+
+
+def file_version(path):
+    """Version token for a data file, changing whenever the file is rewritten"""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+class SQLiteBackend:
+    """
+    On-disk store shared by every worker on the host.
+
+    Entries carry an expiry and a last-access time (to ACCESS_RESOLUTION); once
+    the total size passes max_bytes the least recently used entries are evicted. The size is summed
+    only every EVICT_WRITE_FRACTION of max_bytes written (or EVICT_INTERVAL),
+    not on every set.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        private_directory(directory)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._written = 0
+        self._last_evict = 0.0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires REAL, accessed REAL
+                );
+                CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+                CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires);
+                CREATE TABLE IF NOT EXISTS versions (namespace TEXT PRIMARY KEY, version INTEGER);
+                CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, expires REAL);
+            """)
+
+    def _connect(self):
+        # Connections are per thread and per process (never shared across a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, expires, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return _MISSING
+        if row[1] is not None and row[1] < now:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return _MISSING
+        if now - row[2] > ACCESS_RESOLUTION:
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        expires = now + ttl if ttl else None
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, blob, len(blob), expires, now)
+        )
+        self._written += len(blob)
+        if self._written >= self.max_bytes * EVICT_WRITE_FRACTION or now - self._last_evict >= EVICT_INTERVAL:
+            self._evict(conn, now)
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self, conn, now):
+        self._written = 0
+        self._last_evict = now
+        conn.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+    def get_version(self, namespace):
+        row = self._connect().execute(
+            "SELECT version FROM versions WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, namespace):
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO versions (namespace, version) VALUES (?, 1) "
+            "ON CONFLICT(namespace) DO UPDATE SET version = version + 1",
+            (namespace,)
+        )
+        return self.get_version(namespace)
+
+    def acquire_lock(self, key, timeout=LOCK_TIMEOUT):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("DELETE FROM locks WHERE key = ? AND expires < ?", (key, now))
+        cursor = conn.execute("INSERT OR IGNORE INTO locks (key, expires) VALUES (?, ?)", (key, now + timeout))
+        return cursor.rowcount == 1
+
+    def release_lock(self, key):
+        self._connect().execute("DELETE FROM locks WHERE key = ?", (key,))
+
+
+class RedisBackend:
+    """Redis store for deployments spanning several hosts; eviction is left to maxmemory-policy"""
+
+    def __init__(self, url=REDIS_URL):
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        blob = self.client.get(f"cache:{key}")
+        return _MISSING if blob is None else pickle.loads(blob)
+
+    def set(self, key, value, ttl=None):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        # Millisecond expiry, so TTLs under a second are not rounded down to an invalid 0
+        self.client.set(f"cache:{key}", blob, px=max(1, int(ttl * 1000)) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(f"cache:{key}")
+
+    def get_version(self, namespace):
+        return int(self.client.get(f"version:{namespace}") or 0)
+
+    def bump_version(self, namespace):
+        return self.client.incr(f"version:{namespace}")
+
+    def acquire_lock(self, key, timeout=LOCK_TIMEOUT):
+        return bool(self.client.set(f"lock:{key}", 1, nx=True, px=max(1, int(timeout * 1000))))
+
+    def release_lock(self, key):
+        self.client.delete(f"lock:{key}")
+
+
+class SharedCache:
+    """
+    Cache shared by all worker processes.
+
+    Keys are namespaced and versioned: bumping a namespace's version makes every
+    older entry unreachable without scanning. On a miss only one worker computes
+    the value while the others wait for it (stampede protection).
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _versioned_key(self, namespace, parts):
+        return f"{namespace}:v{self.backend.get_version(namespace)}:{make_key(*parts)}"
+
+    def get(self, namespace, *parts, default=None):
+        value = self.backend.get(self._versioned_key(namespace, parts))
+        return default if value is _MISSING else value
+
+    def set(self, namespace, *parts, value, ttl=CACHE_DEFAULT_TTL):
+        self.backend.set(self._versioned_key(namespace, parts), value, ttl)
+
+    def invalidate(self, namespace):
+        """Drop every entry in a namespace by moving it to a new version"""
+        return self.backend.bump_version(namespace)
+
+    def get_or_compute(self, namespace, parts, compute, ttl=CACHE_DEFAULT_TTL):
+        key = self._versioned_key(namespace, parts)
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            return value
+
+        deadline = time.time() + LOCK_TIMEOUT
+        while not self.backend.acquire_lock(key):
+            # Another worker is computing this value; wait for it to land
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = self.backend.get(key)
+            if value is not _MISSING:
+                return value
+            if time.time() > deadline:
+                return compute()
+        try:
+            value = self.backend.get(key)
+            if value is _MISSING:
+                value = compute()
+                self.backend.set(key, value, ttl)
+            return value
+        finally:
+            self.backend.release_lock(key)
+
+    def cached(self, namespace, ttl=CACHE_DEFAULT_TTL, version=None):
+        """Decorator caching a function by its arguments (and an optional version callable)"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                parts = (func.__qualname__, args, kwargs, version() if version else None)
+                return self.get_or_compute(namespace, parts, lambda: func(*args, **kwargs), ttl)
+            wrapper.invalidate = lambda: self.invalidate(namespace)
+            return wrapper
+        return decorator
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache, backed by Redis when REDIS_URL is set and redis is installed"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if REDIS_URL and redis is not None:
+                backend = RedisBackend(REDIS_URL)
+            else:
+                backend = SQLiteBackend()
+            _cache = SharedCache(backend)
+        return _cache
@@ -0,0 +1,303 @@
+from collections import OrderedDict, deque
+import hashlib
+import threading
+
+# Reasons an edge can be kept out of the topological order
+CYCLE_REASON = "Creates recycle loop"
+UNKNOWN_NODE_REASON = "Unknown node"
+
+# Number of per-session topologies kept in memory
+MAX_TOPOLOGIES = 64
+
+_SIGNATURE_MASK = (1 << 64) - 1
+
+
+def _element_signature(*parts):
+    # Stable across processes (unlike hash()), so workers can compare signatures
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class CycleError(ValueError):
+    """Raised when an edge would close a recycle loop"""
+
+    def __init__(self, source, target, path):
+        self.source = source
+        self.target = target
+        self.path = path
+        super().__init__(f"Edge {source} -> {target} closes loop: {' -> '.join(map(str, path))}")
+
+
+class FlowTopology:
+    """
+    Directed process flow graph with an incrementally maintained topological order.
+
+    Edge inserts follow Pearce-Kelly: only the nodes whose order lies between the
+    new edge's endpoints are searched and renumbered, so the cost is proportional
+    to the affected region rather than the whole flowsheet. Edges that would close
+    a loop (or reference a missing node) are kept aside as rejected.
+
+    signature identifies the structure (node ids and edge endpoints, rejected
+    edges included) independently of insertion order. It is kept up to date
+    with every change, so a worker can tell whether its cached topology still
+    matches the graph another worker last returned.
+    """
+
+    def __init__(self):
+        self._ord = {}
+        self._succ = {}
+        self._pred = {}
+        self._edges = {}
+        self._incident = {}
+        self._rejected = OrderedDict()
+        self._next_ord = 0
+        self._closure_cache = {}
+        self._signature = 0
+        self.version = 0
+
+    # Nodes
+    def has_node(self, node):
+        return node in self._ord
+
+    def add_node(self, node):
+        if node in self._ord:
+            return
+        self._ord[node] = self._next_ord
+        self._next_ord += 1
+        self._sign(1, "node", node)
+        self._succ[node] = {}
+        self._pred[node] = {}
+        self._incident[node] = set()
+        self._changed()
+        self._retry_rejected()
+
+    def remove_node(self, node):
+        """Remove a node and its incident edges, returning the removed edge ids"""
+        if node not in self._ord:
+            return []
+        removed = list(self._incident[node])
+        for edge_id in removed:
+            self._sign(-1, "edge", edge_id, *self._edges[edge_id])
+            self._detach(edge_id)
+        del self._ord[node], self._succ[node], self._pred[node], self._incident[node]
+        self._sign(-1, "node", node)
+        self._changed()
+        self._retry_rejected()
+        return removed
+
+    # Edges
+    def add_edge(self, edge_id, source, target):
+        """Insert an edge, raising CycleError if it would close a loop"""
+        if edge_id in self._edges or self._rejected.get(edge_id, (source, target))[:2] != (source, target):
+            self.remove_edge(edge_id)
+        # A rejected edge being retried is already part of the signature
+        counted = edge_id in self._rejected
+        if source not in self._ord or target not in self._ord:
+            raise KeyError(f"Edge {edge_id} references an unknown node")
+
+        lower, upper = self._ord[target], self._ord[source]
+        if source == target:
+            raise CycleError(source, target, [source, target])
+        if lower < upper:
+            forward = self._search_forward(target, upper, source)
+            backward = self._search_backward(source, lower)
+            self._reorder(forward, backward)
+
+        self._succ[source][target] = self._succ[source].get(target, 0) + 1
+        self._pred[target][source] = self._pred[target].get(source, 0) + 1
+        self._edges[edge_id] = (source, target)
+        self._incident[source].add(edge_id)
+        self._incident[target].add(edge_id)
+        self._rejected.pop(edge_id, None)
+        if not counted:
+            self._sign(1, "edge", edge_id, source, target)
+        self._changed()
+
+    def set_edge(self, edge_id, source, target):
+        """Insert or move an edge, recording it as rejected instead of raising"""
+        self.remove_edge(edge_id)
+        try:
+            self.add_edge(edge_id, source, target)
+        except CycleError:
+            self._rejected[edge_id] = (source, target, CYCLE_REASON)
+            self._sign(1, "edge", edge_id, source, target)
+        except KeyError:
+            self._rejected[edge_id] = (source, target, UNKNOWN_NODE_REASON)
+            self._sign(1, "edge", edge_id, source, target)
+        return self.edge_status(edge_id)
+
+    def remove_edge(self, edge_id):
+        rejected = self._rejected.pop(edge_id, None)
+        if rejected is not None:
+            self._sign(-1, "edge", edge_id, rejected[0], rejected[1])
+        if edge_id not in self._edges:
+            return
+        self._sign(-1, "edge", edge_id, *self._edges[edge_id])
+        self._detach(edge_id)
+        self._changed()
+        self._retry_rejected()
+
+    def edge_status(self, edge_id):
+        """Return the rejection reason for an edge, or an empty string if valid"""
+        rejected = self._rejected.get(edge_id)
+        return rejected[2] if rejected else ""
+
+    def incident_edges(self, node):
+        """Ids of all edges touching node, including rejected ones"""
+        edge_ids = set(self._incident.get(node, ()))
+        edge_ids.update(edge_id for edge_id, (s, t, _) in self._rejected.items() if node in (s, t))
+        return edge_ids
+
+    @property
+    def rejected(self):
+        return {edge_id: reason for edge_id, (_, _, reason) in self._rejected.items()}
+
+    @property
+    def signature(self):
+        """Hex digest of the structure, equal for equal graphs built in any order or process"""
+        return f"{self._signature:016x}"
+
+    @property
+    def node_count(self):
+        return len(self._ord)
+
+    @property
+    def edge_count(self):
+        return len(self._edges) + len(self._rejected)
+
+    # Queries
+    def topological_order(self):
+        return sorted(self._ord, key=self._ord.__getitem__)
+
+    def predecessors(self, node):
+        return self._pred.get(node, {}).keys()
+
+    def downstream(self, node):
+        """All units reachable from node (cached until the graph changes)"""
+        return self._closure(node, "down", self._succ)
+
+    def upstream(self, node):
+        """All units that feed into node (cached until the graph changes)"""
+        return self._closure(node, "up", self._pred)
+
+    # Internals
+    def _sign(self, sign, *parts):
+        self._signature = (self._signature + sign * _element_signature(*parts)) & _SIGNATURE_MASK
+
+    def _changed(self):
+        self.version += 1
+        self._closure_cache.clear()
+
+    def _detach(self, edge_id):
+        source, target = self._edges.pop(edge_id)
+        self._incident[source].discard(edge_id)
+        self._incident[target].discard(edge_id)
+        for adjacency, a, b in ((self._succ, source, target), (self._pred, target, source)):
+            count = adjacency[a][b] - 1
+            if count:
+                adjacency[a][b] = count
+            else:
+                del adjacency[a][b]
+
+    def _retry_rejected(self):
+        # Removing an edge or adding a node can make a rejected edge valid again
+        for edge_id, (source, target, _) in list(self._rejected.items()):
+            try:
+                self.add_edge(edge_id, source, target)
+            except (CycleError, KeyError):
+                continue
+
+    def _search_forward(self, start, upper, source):
+        visited = {start: None}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for succ in self._succ[node]:
+                if succ == source:
+                    chain = [node]
+                    while visited[chain[-1]] is not None:
+                        chain.append(visited[chain[-1]])
+                    raise CycleError(source, start, [source] + chain[::-1] + [source])
+                if succ not in visited and self._ord[succ] < upper:
+                    visited[succ] = node
+                    stack.append(succ)
+        return list(visited)
+
+    def _search_backward(self, start, lower):
+        visited = {start}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for pred in self._pred[node]:
+                if pred not in visited and self._ord[pred] > lower:
+                    visited.add(pred)
+                    stack.append(pred)
+        return list(visited)
+
+    def _reorder(self, forward, backward):
+        # Everything upstream of the new edge's source moves ahead of the target's region
+        forward.sort(key=self._ord.__getitem__)
+        backward.sort(key=self._ord.__getitem__)
+        slots = sorted(self._ord[node] for node in backward + forward)
+        for node, slot in zip(backward + forward, slots):
+            self._ord[node] = slot
+
+    def _closure(self, node, direction, adjacency):
+        key = (direction, node)
+        cached = self._closure_cache.get(key)
+        if cached is not None:
+            return cached
+        seen = set()
+        queue = deque(adjacency.get(node, ()))
+        while queue:
+            current = queue.popleft()
+            if current in seen:
+                continue
+            seen.add(current)
+            queue.extend(n for n in adjacency[current] if n not in seen)
+        seen.discard(node)
+        result = frozenset(seen)
+        self._closure_cache[key] = result
+        return result
+
+
+def build_topology(node_rows, edge_rows):
+    """Build a topology from node-table and edge-table row data"""
+    topology = FlowTopology()
+    for row in node_rows:
+        topology.add_node(row["id"])
+    for row in edge_rows:
+        topology.set_edge(row["id"], row["source"], row["target"])
+    return topology
+
+
+_topologies = OrderedDict()
+_topologies_lock = threading.Lock()
+
+
+def get_topology(token, node_rows, edge_rows, signature=None):
+    """
+    Return the cached topology for a session, rebuilding it if missing or stale.
+
+    signature is the one last returned to the browser with these rows; when it
+    differs from the cached topology's (another worker changed the graph), the
+    topology is rebuilt from the rows.
+    """
+    with _topologies_lock:
+        topology = _topologies.get(token)
+        if topology is not None:
+            _topologies.move_to_end(token)
+    if (topology is None or topology.node_count != len(node_rows)
+            or topology.edge_count != len(edge_rows)
+            or (signature is not None and topology.signature != signature)):
+        topology = build_topology(node_rows, edge_rows)
+        with _topologies_lock:
+            _topologies[token] = topology
+            while len(_topologies) > MAX_TOPOLOGIES:
+                _topologies.popitem(last=False)
+    return topology
+
+
+def drop_topology(token):
+    with _topologies_lock:
+        _topologies.pop(token, None)